@@ -8,39 +8,61 @@
 # Este arquivo é o coração do backend e serve como o ponto de entrada principal para a aplicação
 # FastAPI. Suas responsabilidades incluem:
 #
-# 1. Inicialização da Aplicação: Cria e configura a instância principal do FastAPI.
+# 1. Inicialização da Aplicação: Cria e configura a instância principal do FastAPI. Importar
+#    este módulo não abre conexões: no ciclo de vida (`lifespan`), as etapas de aquecimento
+#    (banco, sessões, schema, partições, dashboard, nomes de clientes, LLMs) rodam em paralelo,
+#    via `app/core/startup.py`, antes de a API aceitar requisições. No desligamento, encerra as
+#    tarefas em segundo plano, grava as sessões pendentes e fecha os pools de conexões.
 #
 # 2. Configuração de CORS: Define as regras de Cross-Origin Resource Sharing, permitindo
 #    que o frontend (rodando em http://localhost:3000) se comunique com este backend.
 #
 # 3. Carregamento do Modelo de IA: Invoca a função `create_master_chain()` do módulo de RAG
-#    para carregar a cadeia de IA com memória uma única vez durante a inicialização do servidor.
-#    Isso é uma otimização crucial de performance.
+#    no `lifespan`, para carregar a cadeia de IA com memória uma única vez por worker (em
+#    `app.state`). Isso é uma otimização crucial de performance.
 #
 # 4. Definição de Endpoints (Rotas):
 #    - `/chat` (POST): O endpoint principal que recebe as perguntas do usuário, gerencia os
 #      IDs de sessão e retorna as respostas geradas pela cadeia de IA.
-#    - `/` (GET): Um endpoint de "health check" para verificar se a API está no ar.
-#    - `/api/dashboard`: Registra todas as rotas relacionadas ao dashboard.
+#    - `/` (GET): Um endpoint de "health check" para verificar se a API está no ar.
+#    - `/ready` (GET): Prontidão: 200 só quando as etapas críticas do aquecimento deram certo
+#      e o banco responde; 503 caso contrário (para o balanceador não enviar tráfego).
+#    - `/sessoes/metricas` (GET): Métricas do armazenamento de sessões e da concorrência por sessão.
+#    - `/api/dashboard`: Registra todas as rotas relacionadas ao dashboard.
+#    - `/api/indices`: Consultor de índices baseado no SQL executado pelo chat.
 #
 # 5. Gerenciamento de Sessão: Implementa a lógica para criar um novo ID de sessão para
-#    novas conversas ou reutilizar um ID existente para conversas contínuas.
+#    novas conversas ou reutilizar um ID existente para conversas contínuas, e coordena
+#    requisições simultâneas de uma mesma sessão (`SessionConcurrencyGuard`).
 #
 # =================================================================================================
 # =================================================================================================
 
+import asyncio
 import logging
 import json
 import time
 import uuid  # Importa a biblioteca para gerar IDs de sessão únicos.
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel # Usado para definir os modelos de dados das requisições.
 
 # Importa a função que constrói a cadeia de IA principal.
-from app.chains.sql_rag_chain import create_master_chain
+from app.chains.sql_rag_chain import (
+    create_master_chain, create_summary_chain, update_conversation_summary, store as session_store,
+    get_session_backend, close_session_backend, get_session_data,
+)
 # Importa o roteador que contém os endpoints do dashboard.
-from app.api import dashboard
+from app.api import dashboard, indices
+from app.core.config import settings
+from app.core.database import db
+from app.core.entity_resolver import client_resolver
+from app.core.llm import ping_llms
+from app.core.schema_catalog import schema_catalog
+from app.core.session_concurrency import SessionConcurrencyGuard, SupersededRequestError
+from app.core.startup import StartupState, StartupStep
 
 # Configura o sistema de logging para toda a aplicação.
 # Define o nível mínimo de log a ser exibido (INFO) e o formato das mensagens.
@@ -52,11 +74,57 @@ logging.basicConfig(
 # Cria um logger específico para este arquivo, facilitando a identificação da origem dos logs.
 logger = logging.getLogger(__name__)
 
+# Resultado do aquecimento de cada etapa, consultado pela rota `/ready`.
+startup_state = StartupState(
+    timeout=settings.STARTUP_WARMUP_TIMEOUT_SECONDS,
+    retry_interval=settings.READY_RETRY_INTERVAL_SECONDS,
+)
+
+def _ensure_partitions():
+    # Garante as partições dos próximos meses (complementa o agendamento via pg_cron, quando existe).
+    created = db.ensure_partitions()
+    if created:
+        logger.info(f"{created} partição(ões) de operacoes_logisticas criada(s).")
+
+# Ciclo de vida da aplicação: o código antes do `yield` roda uma vez, antes de a API aceitar requisições,
+# e o código depois dele roda no desligamento do worker.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega as cadeias de IA UMA VEZ por worker (e não na importação do módulo).
+    # Isso evita o custo de recriar a cadeia a cada nova requisição, melhorando a performance.
+    app.state.rag_chain = create_master_chain()
+    # Cadeia que mantém o resumo acumulado das conversas, executada em segundo plano.
+    app.state.summary_chain = create_summary_chain()
+    # Aquecimento em paralelo, para que a primeira requisição não pague handshakes, a leitura do
+    # schema ou a agregação do dashboard. Só "banco" e "schema" são críticas (definem `/ready`):
+    # sem partições novas, a partição padrão recebe as linhas; sem as demais, só o primeiro acesso fica lento.
+    await startup_state.run([
+        StartupStep("banco", db.warm_up, critical=True),
+        # Com um backend persistente, o chat não funciona sem ele.
+        StartupStep("sessoes", get_session_backend, critical=settings.SESSION_BACKEND.lower() != "memory"),
+        StartupStep("schema", schema_catalog.warm_up, critical=True),
+        StartupStep("particoes", _ensure_partitions, enabled=settings.DB_MANAGE_PARTITIONS),
+        StartupStep("dashboard", dashboard.warm_up_cache, enabled=settings.DASHBOARD_WARMUP_ON_STARTUP),
+        StartupStep("clientes", client_resolver.warm_up, enabled=settings.ENTITY_RESOLVER_ENABLED),
+        StartupStep("llm", ping_llms, enabled=settings.LLM_WARMUP_ON_STARTUP),
+    ])
+    yield
+    # Desligamento: encerra as tarefas em segundo plano, grava as sessões pendentes e só então
+    # fecha as conexões (uma falha em uma etapa não impede as seguintes).
+    await dashboard.broadcaster.stop()
+    for name, close in (("schema", schema_catalog.close), ("sessoes", close_session_backend), ("banco", db.close)):
+        try:
+            await asyncio.to_thread(close)
+        except Exception as e:
+            logger.warning(f"Falha ao encerrar '{name}': {e}")
+    logger.info("API encerrada.")
+
 # Cria a instância principal da aplicação FastAPI com metadados para a documentação automática.
 app = FastAPI(
     title="DataChat RAG API",
     description="API para interagir com o chatbot de logística",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configura o Middleware de CORS.
@@ -69,15 +137,18 @@ app.add_middleware(
     allow_credentials=True, # Permite o envio de credenciais (cookies, etc.).
     allow_methods=["*"], # Permite todos os métodos HTTP (GET, POST, etc.).
     allow_headers=["*"], # Permite todos os cabeçalhos HTTP.
+    expose_headers=["ETag"], # Permite que o frontend leia o ETag do dashboard (GET condicional).
 )
 
 # Anexa as rotas definidas no arquivo `dashboard.py` à aplicação principal.
 # Todas as rotas do dashboard serão acessíveis sob o prefixo "/api/dashboard".
 app.include_router(dashboard.router, prefix="/api/dashboard")
+# Rotas do consultor de índices (carga de SQL do chat, sugestões e criação opcional).
+app.include_router(indices.router, prefix="/api/indices")
 
-# Carrega a cadeia de IA com memória UMA VEZ, quando a aplicação é iniciada.
-# Isso evita o custo de recriar a cadeia a cada nova requisição, melhorando a performance.
-rag_chain = create_master_chain()
+# Coordena requisições simultâneas de uma mesma sessão (duplo envio, retentativas do frontend):
+# perguntas idênticas em andamento (ou na fila) são deduplicadas e as demais serializadas ou canceladas.
+session_guard = SessionConcurrencyGuard(settings.CHAT_SESSION_CONCURRENCY)
 
 # Define o formato esperado para o corpo (body) de uma requisição para o endpoint /chat.
 class ChatRequest(BaseModel):
@@ -86,7 +157,7 @@ class ChatRequest(BaseModel):
 
 # Registra a função `chat_endpoint` para lidar com requisições POST no endpoint /chat.
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks, http_request: Request):
     """
     Recebe uma pergunta e um session_id, processa na cadeia com memória
     e retorna a resposta formatada para o frontend.
@@ -103,19 +174,28 @@ async def chat_endpoint(request: ChatRequest):
     # Se o frontend enviou um `session_id`, usa ele.
     # Se não (é uma nova conversa), gera um novo UUID (ID único universal).
     session_id = request.session_id or str(uuid.uuid4())
-    
+    rag_chain = http_request.app.state.rag_chain
+
+    async def answer():
+        # Carrega (ou revalida) a sessão em uma thread ANTES da cadeia: a consulta ao backend
+        # de sessões é bloqueante, e o getter de histórico da cadeia roda no event loop.
+        await asyncio.to_thread(get_session_data, session_id)
+        return await rag_chain.ainvoke(
+            {"question": request.question},
+            config={"configurable": {"session_id": session_id}}
+        )
+
     try:
-        # Invoca a cadeia de IA principal.
+        # Invoca a cadeia de IA principal de forma assíncrona (sem bloquear o event loop),
+        # sob o controle de concorrência da sessão.
         # Passa a pergunta do usuário como input principal.
         # Passa o `session_id` dentro do objeto `config`, que é a forma padrão do LangChain
         # de fornecer dados de configuração para cadeias que gerenciam histórico.
-        full_chain_output = rag_chain.invoke(
-            {"question": request.question},
-            config={"configurable": {"session_id": session_id}}
-        )
+        full_chain_output = await session_guard.run(session_id, request.question, answer)
         
-        # Extrai o dicionário de resposta formatado pela cadeia.
-        response_dict = full_chain_output.get("api_response", {})
+        # Extrai uma CÓPIA do dicionário de resposta, pois ele pode ser compartilhado
+        # com uma requisição duplicada da mesma pergunta.
+        response_dict = dict(full_chain_output.get("api_response", {}))
         
         # Calcula a duração total do processamento.
         end_time = time.monotonic()
@@ -126,8 +206,25 @@ async def chat_endpoint(request: ChatRequest):
         # Devolve o `session_id` para o frontend, para que ele possa armazená-lo e
         # enviá-lo de volta na próxima pergunta da mesma conversa.
         response_dict['session_id'] = session_id
+
+        # Agenda a atualização do resumo da conversa para DEPOIS do envio da resposta,
+        # sem somar a latência de mais uma chamada ao LLM ao tempo percebido pelo usuário.
+        background_tasks.add_task(update_conversation_summary, session_id, http_request.app.state.summary_chain)
         
         return response_dict
+
+    except SupersededRequestError:
+        # No modo "latest_wins", esta pergunta foi substituída por uma mais recente da mesma sessão.
+        logger.info(f"Requisição da sessão {session_id} substituída por uma pergunta mais recente.")
+        return JSONResponse(
+            status_code=409,
+            content={
+                "type": "text",
+                "content": "Esta pergunta foi substituída por uma mais recente.",
+                "superseded": True,
+                "session_id": session_id,
+            }
+        )
         
     except Exception as e:
         # Em caso de qualquer erro inesperado durante a execução da cadeia,
@@ -146,6 +243,33 @@ def read_root():
     return {"status": "DataChat API is running"}
 
 
+# Registra a função `read_ready` para lidar com requisições GET no endpoint /ready.
+@app.get("/ready")
+async def read_ready():
+    """
+    Verificação de prontidão (readiness): 200 quando as etapas críticas do aquecimento deram
+    certo e o banco responde agora; 503 caso contrário. Etapas críticas que falharam são
+    tentadas de novo aqui (no máximo a cada READY_RETRY_INTERVAL_SECONDS).
+    """
+    await startup_state.retry_failed()
+    banco_disponivel = await asyncio.to_thread(db.ping)
+    ready = startup_state.ready and banco_disponivel
+    content = {**startup_state.snapshot(), "pronto": ready, "banco_disponivel": banco_disponivel,
+               "schema": schema_catalog.stats()}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
+
+# Registra a função `read_session_metrics` para lidar com requisições GET no endpoint /sessoes/metricas.
+@app.get("/sessoes/metricas")
+def read_session_metrics():
+    """
+    Retorna as métricas do armazenamento de sessões do chat: sessões ativas, memória
+    estimada, acertos/faltas e quantos despejos ocorreram por LRU, TTL ou memória,
+    além dos contadores do controle de concorrência por sessão e da resolução de nomes de clientes.
+    """
+    return {**session_store.stats(), "concorrencia": session_guard.stats(), "resolucao_clientes": client_resolver.stats()}
+
+
 """
 --- Exemplos de Saída do Endpoint /chat ---
 
@@ -4,18 +4,40 @@
 # Este arquivo contém os endpoints da API para o dashboard.
 # Padrões de arquitetura aplicados:
 # 1. Connection Pooling: Para reutilizar conexões com o banco de dados e melhorar a performance.
+#    Usa o pool principal do `DatabaseManager` (app/core/database.py), compartilhado com o resto
+#    da aplicação: thread-safe, com SSL e, quando esgotado, espera (com timeout) por uma conexão.
 # 2. Cache: Para armazenar em memória os resultados de queries lentas, tornando recargas rápidas.
-# 3. Dependency Injection: Padrão do FastAPI para gerenciar recursos (como conexões) de forma segura.
+#    A chave é o widget + parâmetros e o cache é consultado ANTES de pegar uma conexão do pool.
+# 3. Context Manager: Garante que a conexão emprestada do pool SEMPRE seja devolvida.
+# 4. Rollups: As agregações leem a tabela `operacoes_rollup_diario`, mantida por triggers,
+#    em vez de varrer toda a `operacoes_logisticas` a cada consulta.
+# 5. GET condicional: Cada resposta leva um `ETag`; se o frontend reenviar o mesmo valor em
+#    `If-None-Match` e os dados não mudaram, a resposta é um `304 Not Modified` sem corpo.
+# 6. Push (SSE): Em `/stream`, uma única tarefa recalcula os widgets e envia apenas os que
+#    mudaram a todos os navegadores conectados (ver `app/core/broadcaster.py`).
+# 7. Filtros: Todas as rotas de widgets aceitam filtros opcionais (período, UF, status, tipo e
+#    cliente), aplicados com SQL parametrizado e com uma entrada de cache por combinação.
 # =============================================================================
 
 # --- Bloco de Importações ---
+import json
 import logging
+import threading
+import time
+from datetime import date
+from enum import Enum
+from typing import Annotated
 import psycopg2
-import psycopg2.extras  # Importa funcionalidades extras, como o RealDictCursor
-from psycopg2.pool import SimpleConnectionPool # A classe para o pool de conexões
-from fastapi import APIRouter, HTTPException, status, Depends # Componentes do FastAPI
+from contextlib import contextmanager
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status # Componentes do FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator # Validação dos filtros
 from app.core.config import settings # Nossas configurações (URL do banco, etc.)
-from cachetools import cached, TTLCache # A biblioteca para o cache em memória
+from app.core.cache import ResultCache # Cache em memória com TTL, LRU e métricas
+from app.core.broadcaster import ChangeBroadcaster # Tarefa única que envia os widgets alterados
+from app.core.database import db # Gerenciador único de acesso ao banco (pools, SSL, timeouts e métricas)
+from app.core.db_pool import PoolTimeoutError # Lançado quando nenhuma conexão fica livre a tempo
 
 # --- Configuração Inicial ---
 # Configura um logger para este arquivo, para podermos ver mensagens no terminal.
@@ -24,100 +46,269 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # --- 1. POOL DE CONEXÕES ---
-# O pool é criado UMA ÚNICA VEZ quando a aplicação inicia.
-try:
-    connection_pool = SimpleConnectionPool(
-        minconn=1,       # Manter pelo menos 1 conexão sempre aberta e pronta para uso.
-        maxconn=10,      # Permitir no máximo 10 conexões simultâneas para não sobrecarregar o banco.
-        host=settings.DB_HOST,
-        dbname=settings.DB_NAME,
-        user=settings.DB_USER,
-        password=settings.DB_PASS,
-        port=settings.DB_PORT
-    )
-    logger.info("Pool de conexões do dashboard criado com sucesso.")
-except Exception as e:
-    # Se a conexão com o banco falhar na inicialização, logamos o erro.
-    logger.error(f"Falha ao criar o pool de conexões do dashboard: {e}", exc_info=True)
-    connection_pool = None
+# O dashboard não tem mais um pool próprio: usa o pool principal do `DatabaseManager` (`db`),
+# criado UMA ÚNICA VEZ e compartilhado com o schema do chat e as sessões. Ele é seguro para as
+# threads das rotas síncronas e abre as conexões sob demanda (a API sobe mesmo com o banco fora do ar).
 
 # --- 2. CACHE ---
 # O cache também é criado UMA ÚNICA VEZ.
-# TTLCache: "Time To Live" Cache, onde cada item tem um tempo de vida.
-cache = TTLCache(
-    maxsize=10,  # O cache armazenará no máximo 10 resultados diferentes.
-    ttl=300      # ttl (Time To Live) = 300 segundos (5 minutos). Após 5 min, o dado é considerado "velho" e será buscado novamente no banco.
+# A chave de cada entrada é o nome do widget + seus parâmetros (ver `_cached_widget`), e ele é
+# consultado ANTES de pegar uma conexão do pool: um acerto não toca no banco de dados.
+cache = ResultCache(
+    maxsize=settings.DASHBOARD_CACHE_MAXSIZE,  # Espaço para vários widgets e combinações de parâmetros.
+    ttl=settings.DASHBOARD_CACHE_TTL_SECONDS,  # Após o TTL, o dado é considerado "velho" e será buscado novamente no banco.
+    stale_ttl=settings.DASHBOARD_CACHE_STALE_SECONDS  # ...mas, nessa janela, o valor velho é servido enquanto a busca roda em segundo plano.
 )
 
-# --- 3. DEPENDÊNCIA DO FASTAPI PARA GERENCIAR CONEXÕES ---
-# Esta função é a peça central que conecta o Pool com os Endpoints.
+# --- 3. GERENCIADOR DE CONEXÕES ---
+# Esta função é a peça central que conecta o Pool com as consultas.
+# Ela só é chamada em caso de CACHE MISS, então acertos nunca retiram uma conexão do pool.
+@contextmanager
 def get_db_cursor():
-    # Verifica se o pool foi criado com sucesso na inicialização.
-    if not connection_pool:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de banco de dados indisponível.")
-    
-    conn = None # Inicializa a variável de conexão
     try:
-        # Pega uma conexão "emprestada" do pool. Se não houver nenhuma disponível, espera por uma.
-        conn = connection_pool.getconn()
-        
-        # O `yield` é a mágica da injeção de dependência: ele "entrega" o cursor para a função do endpoint
-        # e pausa a execução desta função aqui.
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        # Pega uma conexão "emprestada" do pool, esperando (com timeout) se todas estiverem em uso.
+        # O `with` devolve a conexão SEMPRE ao final (conexões que caíram são descartadas pelo pool).
+        with db.cursor(dict_rows=True) as cursor:
+            _verificar_rollup(cursor)
             yield cursor
-            
-    finally:
-        # Quando o endpoint termina (com sucesso ou erro), a execução desta função continua após o `yield`.
-        # O bloco `finally` GARANTE que a conexão SEMPRE será devolvida ao pool, evitando vazamentos.
-        if conn:
-            connection_pool.putconn(conn)
-
-# --- 4. ENDPOINTS ---
-# Cada endpoint agora usa a estrutura:
-# @cached(cache): Aplica o cache. Se o resultado estiver na memória, retorna-o imediatamente sem executar a função.
-# Depends(get_db_cursor): Recebe um cursor pronto para uso da função de dependência.
+    except PoolTimeoutError as e:
+        # Pool esgotado: a requisição esperou na fila, mas nenhuma conexão ficou livre a tempo.
+        logger.warning(f"Pool de conexões do dashboard esgotado: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Banco de dados ocupado. Tente novamente em instantes.")
+    except psycopg2.OperationalError as e:
+        logger.error(f"Falha ao conectar ao banco de dados do dashboard: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de banco de dados indisponível.")
 
-@router.get("/kpis")
-@cached(cache)
-def get_dashboard_kpis(cur = Depends(get_db_cursor)):
-    # Esta mensagem só aparecerá no log se o resultado não estiver no cache.
-    logger.info("Buscando KPIs do banco (CACHE MISS)...")
-    sql = "SELECT COUNT(*) as total_operacoes, SUM(CASE WHEN status = 'ENTREGUE' THEN 1 ELSE 0 END) as operacoes_entregues, SUM(CASE WHEN status = 'EM_TRANSITO' THEN 1 ELSE 0 END) as operacoes_em_transito, SUM(valor_mercadoria) as valor_total_mercadorias FROM operacoes_logisticas;"
+def _cached_widget(widget: str, query, **params):
+    """
+    Retorna `(dados, etag)` de um widget do dashboard, consultando o cache ANTES do banco.
+    A chave do cache é o nome do widget + os parâmetros da consulta.
+    Em caso de falta, retira uma conexão do pool e executa `query(cur, **params)`.
+    """
+    key = (widget, tuple(sorted(params.items())))
+
+    def compute():
+        # Esta mensagem só aparecerá no log se o resultado não estiver no cache.
+        logger.info(f"Buscando {widget} do banco (CACHE MISS)...")
+        with get_db_cursor() as cur:
+            return query(cur, **params)
+
+    return cache.get_or_compute_with_etag(key, compute)
+
+# Contadores de respostas completas x `304 Not Modified`, expostos em `/metricas`.
+_respostas = {"completas": 0, "nao_modificadas": 0}
+_respostas_lock = threading.Lock()
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # O cabeçalho pode trazer vários ETags separados por vírgula, fracos (W/"...") ou "*".
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _widget_response(request: Request, widget: str, query, **params) -> Response:
+    """
+    Responde um widget com suporte a GET condicional: se o `If-None-Match` enviado pelo
+    cliente for igual ao ETag atual, devolve `304` sem corpo (nada é serializado nem enviado).
+    """
+    data, etag = _cached_widget(widget, query, **params)
+    # `no-cache` = o navegador pode guardar a resposta, mas deve revalidá-la (via ETag) a cada uso.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    nao_modificado = _etag_matches(request.headers.get("if-none-match"), etag)
+    with _respostas_lock:
+        _respostas["nao_modificadas" if nao_modificado else "completas"] += 1
+    if nao_modificado:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=jsonable_encoder(data), headers=headers)
+
+# --- 4. FILTROS E FONTE DAS AGREGAÇÕES ---
+
+class StatusOperacao(str, Enum):
+    SOLICITADO = "SOLICITADO"
+    AGUARDANDO_COLETA = "AGUARDANDO_COLETA"
+    EM_TRANSITO = "EM_TRANSITO"
+    ARMAZENADO = "ARMAZENADO"
+    EM_ROTA_DE_ENTREGA = "EM_ROTA_DE_ENTREGA"
+    ENTREGUE = "ENTREGUE"
+    CANCELADO = "CANCELADO"
+
+class TipoOperacao(str, Enum):
+    TRANSPORTE = "TRANSPORTE"
+    ARMAZENAGEM = "ARMAZENAGEM"
+
+class DashboardFiltros(BaseModel):
+    """
+    Filtros opcionais aceitos (via query string) por todas as rotas de widgets do dashboard.
+    O modelo é imutável (`frozen`) para poder compor a chave do cache: cada combinação de
+    filtros tem sua própria entrada.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    data_inicio: date | None = None   # Data de emissão inicial (inclusive).
+    data_fim: date | None = None      # Data de emissão final (inclusive).
+    uf_destino: str | None = Field(default=None, pattern=r"^[A-Za-z]{2}$")
+    status: StatusOperacao | None = None
+    tipo: TipoOperacao | None = None
+    cliente_id: int | None = Field(default=None, gt=0)
+
+    @field_validator("uf_destino")
+    @classmethod
+    def _uf_maiuscula(cls, value: str | None) -> str | None:
+        return value.upper() if value else value
+
+    @model_validator(mode="after")
+    def _intervalo_valido(self):
+        if self.data_inicio and self.data_fim and self.data_inicio > self.data_fim:
+            raise ValueError("data_inicio não pode ser posterior a data_fim.")
+        return self
+
+    def ativos(self) -> dict:
+        """Retorna apenas os filtros preenchidos."""
+        return self.model_dump(exclude_none=True)
+
+class Granularidade(str, Enum):
+    # Os valores são as unidades aceitas pelo `date_trunc` do PostgreSQL.
+    DIA = "day"
+    SEMANA = "week"
+    MES = "month"
+
+class Metrica(str, Enum):
+    QUANTIDADE = "count"
+    VALOR_FRETE = "valor_frete"
+    VALOR_MERCADORIA = "valor_mercadoria"
+
+class SerieTemporalParams(DashboardFiltros):
+    """Parâmetros de `/serie_temporal`: os filtros do dashboard + granularidade e métrica."""
+    granularidade: Granularidade = Granularidade.DIA
+    metrica: Metrica = Metrica.QUANTIDADE
+
+    def filtros(self) -> DashboardFiltros:
+        return DashboardFiltros(**self.model_dump(exclude={"granularidade", "metrica"}))
+
+# As consultas são escritas uma única vez sobre expressões "por linha" e podem ler de duas fontes:
+# - "rollup": a tabela `operacoes_rollup_diario` (criada e mantida por triggers em `criar_tabelas.py`),
+#   com uma linha por dia x status x UF x cliente. O custo depende do número de combinações,
+#   não do número de operações, então o tempo de resposta se mantém estável conforme a base cresce.
+# - "fatos": a própria `operacoes_logisticas`, usada se DASHBOARD_USE_ROLLUPS=false, se a tabela de
+#   rollup não existe no banco ou quando há filtro por `tipo` (dimensão que o rollup não guarda).
+# As expressões são constantes do código (nunca entrada do usuário), por isso podem ser interpoladas no SQL;
+# os VALORES dos filtros são sempre passados como parâmetros (`%(nome)s`) para o psycopg2.
+# O "dia" de uma operação é sempre o do fuso DASHBOARD_TIMEZONE (`%(fuso_horario)s`), o mesmo do rollup
+# (`dia_operacao()` em `criar_tabelas.py`), e nunca o TimeZone da sessão.
+# - "emissao": a data de emissão como horário local (sem fuso), para o `date_trunc` da série temporal.
+# - "desde": filtro "a partir do dia {}" (uma expressão de data/horário local) sobre a coluna crua.
+_FONTES = {
+    "rollup": {
+        "tabela": "operacoes_rollup_diario",
+        "qtd": "total_operacoes",               # Quantas operações a linha representa.
+        "mercadoria": "soma_valor_mercadoria",
+        "frete": "soma_valor_frete",
+        "dia": "o.dia",
+        "emissao": "CAST(o.dia AS TIMESTAMP)",
+        "desde": "o.dia >= CAST({} AS DATE)",
+        "ultimos_30_dias": "o.dia >= CAST(NOW() AT TIME ZONE %(fuso_horario)s - INTERVAL '30 days' AS DATE)",
+        "data_inicio": "o.dia >= %(data_inicio)s",
+        "data_fim": "o.dia <= %(data_fim)s",
+    },
+    "fatos": {
+        "tabela": "operacoes_logisticas",
+        "qtd": "1",
+        "mercadoria": "valor_mercadoria",
+        "frete": "valor_frete",
+        "dia": "CAST(o.data_emissao AT TIME ZONE %(fuso_horario)s AS DATE)",
+        "emissao": "(o.data_emissao AT TIME ZONE %(fuso_horario)s)",
+        # Comparações diretas com `data_emissao` (o limite é que é convertido para o fuso) para que os
+        # índices sejam usados.
+        "desde": "o.data_emissao >= CAST(CAST({} AS DATE) AS TIMESTAMP) AT TIME ZONE %(fuso_horario)s",
+        "ultimos_30_dias": "o.data_emissao >= CAST(CAST(NOW() AT TIME ZONE %(fuso_horario)s - INTERVAL '30 days' AS DATE) AS TIMESTAMP) AT TIME ZONE %(fuso_horario)s",
+        "data_inicio": "o.data_emissao >= CAST(CAST(%(data_inicio)s AS DATE) AS TIMESTAMP) AT TIME ZONE %(fuso_horario)s",
+        "data_fim": "o.data_emissao < CAST(CAST(%(data_fim)s AS DATE) + 1 AS TIMESTAMP) AT TIME ZONE %(fuso_horario)s",
+    },
+}
+
+# Filtros de igualdade: nome do filtro -> coluna (presente nas duas fontes, exceto `tipo`).
+_FILTROS_IGUALDADE = {
+    "uf_destino": "o.uf_destino",
+    "status": "o.status",
+    "tipo": "o.tipo",
+    "cliente_id": "o.cliente_id",
+}
+
+# Se a tabela de rollup existe neste banco: verificado na primeira conexão (o pré-aquecimento da
+# inicialização, se ativo). Sem ela (ex: deploy antigo sem rodar `criar_tabelas.py`), o dashboard
+# lê dos fatos em vez de responder 500. None = ainda não verificado (usa os fatos até lá).
+_rollup_disponivel: bool | None = None
+
+def _verificar_rollup(cur):
+    global _rollup_disponivel
+    if _rollup_disponivel is not None or not settings.DASHBOARD_USE_ROLLUPS:
+        return
+    cur.execute("SELECT to_regclass('operacoes_rollup_diario') IS NOT NULL AS existe")
+    _rollup_disponivel = cur.fetchone()["existe"]
+    if not _rollup_disponivel:
+        logger.warning("DASHBOARD_USE_ROLLUPS está ativo, mas a tabela operacoes_rollup_diario não existe: "
+                       "o dashboard vai ler de operacoes_logisticas. Rode `db_scripts/criar_tabelas.py` para criá-la.")
+
+def _fonte(filtros: DashboardFiltros | None) -> dict:
+    if not settings.DASHBOARD_USE_ROLLUPS or not _rollup_disponivel or (filtros and filtros.tipo):
+        return _FONTES["fatos"]
+    return _FONTES["rollup"]
+
+def _where(fonte: dict, filtros: DashboardFiltros | None, *extra: str) -> tuple[str, dict]:
+    """Monta a cláusula WHERE parametrizada (e seus parâmetros) a partir dos filtros ativos."""
+    condicoes, params = list(extra), {"fuso_horario": settings.DASHBOARD_TIMEZONE}
+    for nome, valor in (filtros.ativos() if filtros else {}).items():
+        condicoes.append(fonte[nome] if nome in ("data_inicio", "data_fim") else f"{_FILTROS_IGUALDADE[nome]} = %({nome})s")
+        params[nome] = valor.value if isinstance(valor, Enum) else valor
+    return ("WHERE " + " AND ".join(condicoes)) if condicoes else "", params
+
+def _janela_por_dia(fonte: dict, filtros: DashboardFiltros | None) -> tuple[str, ...]:
+    # Sem filtro de data, o gráfico diário mostra os últimos 30 dias; com filtro, o intervalo pedido.
+    if filtros and (filtros.data_inicio or filtros.data_fim):
+        return ()
+    return (fonte['ultimos_30_dias'],)
+
+# --- 5. CONSULTAS ---
+# Cada função recebe um cursor pronto para uso (e os filtros opcionais) e devolve os dados já no
+# formato do frontend. Os `HAVING SUM(qtd) > 0` descartam combinações do rollup zeradas após exclusões.
+
+def _query_kpis(cur, filtros: DashboardFiltros | None = None):
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros)
+    sql = f"SELECT CAST(COALESCE(SUM({fonte['qtd']}), 0) AS BIGINT) as total_operacoes, CAST(COALESCE(SUM(CASE WHEN o.status = 'ENTREGUE' THEN {fonte['qtd']} ELSE 0 END), 0) AS BIGINT) as operacoes_entregues, CAST(COALESCE(SUM(CASE WHEN o.status = 'EM_TRANSITO' THEN {fonte['qtd']} ELSE 0 END), 0) AS BIGINT) as operacoes_em_transito, SUM({fonte['mercadoria']}) as valor_total_mercadorias FROM {fonte['tabela']} o {where};"
     try:
-        cur.execute(sql)
+        cur.execute(sql, params)
         kpis = cur.fetchone() # Pega a única linha de resultado. `kpis` será um dicionário.
-        
+
         # O banco retorna o tipo 'Decimal' para somas, que não é compatível com JSON. Convertemos para float.
         if kpis and kpis.get('valor_total_mercadorias'):
             kpis['valor_total_mercadorias'] = float(kpis['valor_total_mercadorias'])
-            
+
         # Retorna o dicionário de kpis, ou um dicionário vazio se a tabela estiver vazia.
         return kpis or {}
     except Exception as e:
         logger.error(f"Erro ao buscar KPIs do dashboard: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar KPIs.")
 
-@router.get("/operacoes_por_status")
-@cached(cache)
-def get_operacoes_por_status(cur = Depends(get_db_cursor)):
-    logger.info("Buscando operações por status do banco (CACHE MISS)...")
+def _query_operacoes_por_status(cur, filtros: DashboardFiltros | None = None):
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros)
     # A query já renomeia as colunas para "name" e "value", simplificando o trabalho do frontend.
-    sql = "SELECT status as name, COUNT(*) as value FROM operacoes_logisticas GROUP BY status ORDER BY value DESC;"
+    sql = f"SELECT o.status as name, CAST(SUM({fonte['qtd']}) AS BIGINT) as value FROM {fonte['tabela']} o {where} GROUP BY o.status HAVING SUM({fonte['qtd']}) > 0 ORDER BY value DESC;"
     try:
-        cur.execute(sql)
+        cur.execute(sql, params)
         # fetchall() busca todas as linhas do resultado e já retorna uma lista de dicionários.
         return cur.fetchall()
     except Exception as e:
         logger.error(f"Erro ao buscar operações por status: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar operações por status.")
 
-@router.get("/valor_frete_por_uf")
-@cached(cache)
-def get_valor_frete_por_uf(cur = Depends(get_db_cursor)):
-    logger.info("Buscando valor de frete por UF do banco (CACHE MISS)...")
-    sql = "SELECT uf_destino as name, SUM(valor_frete) as value FROM operacoes_logisticas WHERE valor_frete IS NOT NULL GROUP BY name ORDER BY value DESC LIMIT 10;"
+def _query_valor_frete_por_uf(cur, filtros: DashboardFiltros | None = None):
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros)
+    sql = f"SELECT o.uf_destino as name, SUM({fonte['frete']}) as value FROM {fonte['tabela']} o {where} GROUP BY name HAVING SUM({fonte['qtd']}) > 0 AND SUM({fonte['frete']}) IS NOT NULL ORDER BY value DESC LIMIT 10;"
     try:
-        cur.execute(sql)
+        cur.execute(sql, params)
         data = cur.fetchall()
         # Itera sobre os resultados para converter o tipo 'Decimal' para 'float'.
         for row in data:
@@ -127,13 +318,12 @@ def get_valor_frete_por_uf(cur = Depends(get_db_cursor)):
         logger.error(f"Erro ao buscar valor de frete por UF: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar valor de frete por UF.")
 
-@router.get("/operacoes_por_dia")
-@cached(cache)
-def get_operacoes_por_dia(cur = Depends(get_db_cursor)):
-    logger.info("Buscando operações por dia do banco (CACHE MISS)...")
-    sql = "SELECT CAST(data_emissao AS DATE) as name, COUNT(*) as value FROM operacoes_logisticas WHERE data_emissao >= NOW() - INTERVAL '30 days' GROUP BY name ORDER BY name ASC;"
+def _query_operacoes_por_dia(cur, filtros: DashboardFiltros | None = None):
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros, *_janela_por_dia(fonte, filtros))
+    sql = f"SELECT {fonte['dia']} as name, CAST(SUM({fonte['qtd']}) AS BIGINT) as value FROM {fonte['tabela']} o {where} GROUP BY name HAVING SUM({fonte['qtd']}) > 0 ORDER BY name ASC;"
     try:
-        cur.execute(sql)
+        cur.execute(sql, params)
         data = cur.fetchall()
         # Itera sobre os resultados para formatar a data (que vem como objeto `datetime.date`) para o formato 'dd/mm'.
         for row in data:
@@ -143,13 +333,50 @@ def get_operacoes_por_dia(cur = Depends(get_db_cursor)):
         logger.error(f"Erro ao buscar operações por dia: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Erro interno ao processar operações por dia.")
 
-@router.get("/top_clientes_por_valor")
-@cached(cache)
-def get_top_clientes_por_valor(cur = Depends(get_db_cursor)):
-    logger.info("Buscando top clientes do banco (CACHE MISS)...")
-    sql = "SELECT c.nome_razao_social as name, SUM(o.valor_mercadoria) as value FROM operacoes_logisticas o JOIN clientes c ON o.cliente_id = c.id WHERE o.valor_mercadoria IS NOT NULL GROUP BY name ORDER BY value DESC LIMIT 5;"
+# Período padrão da série temporal quando nenhum filtro de data é informado. O início é alinhado ao
+# começo do balde (`date_trunc`), para que o primeiro ponto não represente um período parcial.
+_SERIE_JANELA_PADRAO = {
+    Granularidade.DIA: "29 days",
+    Granularidade.SEMANA: "25 weeks",
+    Granularidade.MES: "11 months",
+}
+
+def _query_serie_temporal(cur, filtros: DashboardFiltros | None = None,
+                          granularidade: Granularidade = Granularidade.DIA,
+                          metrica: Metrica = Metrica.QUANTIDADE):
+    fonte = _fonte(filtros)
+    # O filtro de período compara a coluna "crua" (`dia` no rollup, `data_emissao` nos fatos), então a
+    # busca usa o índice da coluna; o `date_trunc` só é aplicado no agrupamento.
+    janela = ()
+    if not (filtros and (filtros.data_inicio or filtros.data_fim)):
+        janela = (fonte['desde'].format("date_trunc(%(granularidade)s, NOW() AT TIME ZONE %(fuso_horario)s) - CAST(%(janela)s AS INTERVAL)"),)
+    where, params = _where(fonte, filtros, *janela)
+    params.update(granularidade=granularidade.value, janela=_SERIE_JANELA_PADRAO[granularidade])
+    valor = {
+        Metrica.QUANTIDADE: f"CAST(SUM({fonte['qtd']}) AS BIGINT)",
+        Metrica.VALOR_FRETE: f"SUM({fonte['frete']})",
+        Metrica.VALOR_MERCADORIA: f"SUM({fonte['mercadoria']})",
+    }[metrica]
+    sql = f"SELECT CAST(date_trunc(%(granularidade)s, {fonte['emissao']}) AS DATE) as name, {valor} as value FROM {fonte['tabela']} o {where} GROUP BY name HAVING SUM({fonte['qtd']}) > 0 ORDER BY name ASC;"
+    try:
+        cur.execute(sql, params)
+        data = cur.fetchall()
+        # `name` é o primeiro dia do balde (dia, segunda-feira da semana ou dia 1 do mês), em ISO 8601.
+        for row in data:
+            row['name'] = row['name'].isoformat()
+            if metrica != Metrica.QUANTIDADE and row.get('value') is not None:
+                row['value'] = float(row['value'])
+        return data
+    except Exception as e:
+        logger.error(f"Erro ao buscar série temporal: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro interno ao processar série temporal.")
+
+def _query_top_clientes_por_valor(cur, filtros: DashboardFiltros | None = None):
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros)
+    sql = f"SELECT c.nome_razao_social as name, SUM({fonte['mercadoria']}) as value FROM {fonte['tabela']} o JOIN clientes c ON o.cliente_id = c.id {where} GROUP BY name HAVING SUM({fonte['qtd']}) > 0 ORDER BY value DESC LIMIT 5;"
     try:
-        cur.execute(sql)
+        cur.execute(sql, params)
         data = cur.fetchall()
         # Converte o tipo 'Decimal' para 'float'.
         for row in data:
@@ -157,4 +384,207 @@ def get_top_clientes_por_valor(cur = Depends(get_db_cursor)):
         return data
     except Exception as e:
         logger.error(f"Erro ao buscar top clientes: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Erro interno ao processar top clientes.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Erro interno ao processar top clientes.")
+
+def _query_summary(cur, filtros: DashboardFiltros | None = None):
+    """
+    Calcula TODOS os widgets do dashboard em uma única ida ao banco e uma única
+    leitura da fonte (rollup ou tabela de fatos): o `GROUPING SETS` produz, na mesma
+    passada, o total geral e os agrupamentos por status, UF de destino, cliente e dia.
+    """
+    fonte = _fonte(filtros)
+    where, params = _where(fonte, filtros)
+    janela = " AND ".join(_janela_por_dia(fonte, filtros)) or "TRUE"
+    sql = f"""
+        WITH base AS (
+            SELECT o.status, o.uf_destino, o.cliente_id, {fonte['qtd']} AS qtd,
+                   {fonte['mercadoria']} AS valor_mercadoria, {fonte['frete']} AS valor_frete,
+                   CASE WHEN {janela} THEN {fonte['dia']} END AS dia
+            FROM {fonte['tabela']} o
+            {where}
+        ),
+        agregado AS (
+            SELECT GROUPING(status) AS g_status, GROUPING(uf_destino) AS g_uf,
+                   GROUPING(cliente_id) AS g_cliente, GROUPING(dia) AS g_dia,
+                   status, uf_destino, cliente_id, dia,
+                   CAST(SUM(qtd) AS BIGINT) AS total, SUM(valor_mercadoria) AS soma_mercadoria, SUM(valor_frete) AS soma_frete
+            FROM base
+            GROUP BY GROUPING SETS ((), (status), (uf_destino), (cliente_id), (dia))
+            HAVING SUM(qtd) > 0
+        )
+        SELECT a.*, c.nome_razao_social
+        FROM agregado a
+        LEFT JOIN clientes c ON c.id = a.cliente_id AND a.g_cliente = 0;
+    """
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    except Exception as e:
+        logger.error(f"Erro ao buscar o resumo do dashboard: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro interno ao processar o resumo do dashboard.")
+
+    total = {"total": 0, "soma_mercadoria": None}
+    por_status, por_uf, por_dia, por_cliente = [], [], [], {}
+    for row in rows:
+        if row['g_status'] and row['g_uf'] and row['g_cliente'] and row['g_dia']:
+            total = row
+        elif not row['g_status']:
+            por_status.append({"name": row['status'], "value": row['total']})
+        elif not row['g_uf']:
+            # Equivalente ao `WHERE valor_frete IS NOT NULL` da rota individual.
+            if row['soma_frete'] is not None:
+                por_uf.append({"name": row['uf_destino'], "value": float(row['soma_frete'])})
+        elif not row['g_cliente']:
+            # A rota individual agrupa por nome; clientes homônimos são somados aqui.
+            if row['soma_mercadoria'] is not None:
+                nome = row['nome_razao_social']
+                por_cliente[nome] = por_cliente.get(nome, 0.0) + float(row['soma_mercadoria'])
+        elif row['dia'] is not None:
+            # Linhas com `dia` nulo são as operações fora da janela do gráfico diário.
+            por_dia.append((row['dia'], row['total']))
+
+    contagem_status = {item['name']: item['value'] for item in por_status}
+    return {
+        "kpis": {
+            "total_operacoes": total['total'],
+            "operacoes_entregues": contagem_status.get('ENTREGUE', 0),
+            "operacoes_em_transito": contagem_status.get('EM_TRANSITO', 0),
+            "valor_total_mercadorias": float(total['soma_mercadoria']) if total['soma_mercadoria'] is not None else None,
+        },
+        "operacoes_por_status": sorted(por_status, key=lambda item: item['value'], reverse=True),
+        "valor_frete_por_uf": sorted(por_uf, key=lambda item: item['value'], reverse=True)[:10],
+        "operacoes_por_dia": [{"name": dia.strftime('%d/%m'), "value": qtd} for dia, qtd in sorted(por_dia)],
+        "top_clientes_por_valor": [
+            {"name": nome, "value": valor}
+            for nome, valor in sorted(por_cliente.items(), key=lambda item: item[1], reverse=True)[:5]
+        ],
+    }
+
+# --- 6. DIFUSÃO (PUSH) E PRÉ-AQUECIMENTO ---
+# Uma única tarefa por processo recalcula o resumo (uma consulta) e o divide por widget. Ela também
+# atualiza o cache, então quem ainda usa polling passa a receber os dados novos sem esperar o TTL.
+
+_WIDGETS = ("kpis", "operacoes_por_status", "valor_frete_por_uf", "operacoes_por_dia", "top_clientes_por_valor")
+_SSE_KEEPALIVE_SECONDS = 20
+
+def _refresh_all_widgets() -> dict:
+    """Recalcula todos os widgets com UMA consulta (a do resumo) e grava cada um no cache."""
+    with get_db_cursor() as cur:
+        summary = _query_summary(cur)
+    cache.set(("summary", ()), summary)
+    for widget in _WIDGETS:
+        cache.set((widget, ()), summary[widget])
+    return summary
+
+def _compute_widgets_for_stream() -> dict:
+    logger.info("Recalculando widgets para a difusão do dashboard...")
+    return _refresh_all_widgets()
+
+def warm_up_cache():
+    """
+    Pré-calcula todos os widgets na inicialização da API, para que o primeiro acesso ao
+    dashboard após um deploy já encontre o cache preenchido. Falhas são propagadas para
+    o registro da inicialização (`app/core/startup.py`), que não as considera críticas.
+    """
+    start_time = time.monotonic()
+    db.pool().warm()
+    _refresh_all_widgets()
+    logger.info(f"Cache do dashboard pré-aquecido em {time.monotonic() - start_time:.2f}s.")
+
+def _connect_listener():
+    # Conexão dedicada (fora do pool, mas com o mesmo SSL): fica aberta escutando o canal enquanto houver assinantes.
+    conn = db.open_dedicated_connection(autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute("LISTEN operacoes_alteradas;")
+    return conn
+
+broadcaster = ChangeBroadcaster(
+    compute=_compute_widgets_for_stream,
+    interval=settings.DASHBOARD_STREAM_INTERVAL_SECONDS,
+    min_interval=settings.DASHBOARD_STREAM_MIN_INTERVAL_SECONDS,
+    connect_listener=_connect_listener if settings.DASHBOARD_STREAM_LISTEN else None,
+)
+
+# --- 7. ENDPOINTS ---
+# Cada endpoint apenas delega para `_widget_response`, que consulta o cache antes do banco
+# e responde `304 Not Modified` quando o cliente já tem a versão atual.
+# Os filtros chegam pela query string (ex: `?uf_destino=SP&data_inicio=2025-01-01`).
+
+Filtros = Annotated[DashboardFiltros, Query()]
+
+def _params(filtros: DashboardFiltros) -> dict:
+    # Sem filtros, a chave do cache é a mesma usada pelo pré-aquecimento e pela difusão.
+    return {"filtros": filtros} if filtros.ativos() else {}
+
+@router.get("/kpis")
+def get_dashboard_kpis(request: Request, filtros: Filtros):
+    return _widget_response(request, "kpis", _query_kpis, **_params(filtros))
+
+@router.get("/operacoes_por_status")
+def get_operacoes_por_status(request: Request, filtros: Filtros):
+    return _widget_response(request, "operacoes_por_status", _query_operacoes_por_status, **_params(filtros))
+
+@router.get("/valor_frete_por_uf")
+def get_valor_frete_por_uf(request: Request, filtros: Filtros):
+    return _widget_response(request, "valor_frete_por_uf", _query_valor_frete_por_uf, **_params(filtros))
+
+@router.get("/operacoes_por_dia")
+def get_operacoes_por_dia(request: Request, filtros: Filtros):
+    return _widget_response(request, "operacoes_por_dia", _query_operacoes_por_dia, **_params(filtros))
+
+@router.get("/top_clientes_por_valor")
+def get_top_clientes_por_valor(request: Request, filtros: Filtros):
+    return _widget_response(request, "top_clientes_por_valor", _query_top_clientes_por_valor, **_params(filtros))
+
+@router.get("/serie_temporal")
+def get_serie_temporal(request: Request, params: Annotated[SerieTemporalParams, Query()]):
+    """
+    Série temporal de uma métrica (quantidade, valor de frete ou de mercadoria) agrupada por
+    dia, semana ou mês, em qualquer período (`data_inicio`/`data_fim`) e com os mesmos filtros
+    das demais rotas.
+    """
+    return _widget_response(request, "serie_temporal", _query_serie_temporal, **_params(params.filtros()),
+                            granularidade=params.granularidade, metrica=params.metrica)
+
+@router.get("/summary")
+def get_dashboard_summary(request: Request, filtros: Filtros):
+    """
+    Retorna todos os widgets do dashboard em um único payload (uma requisição HTTP,
+    uma conexão do pool e uma leitura da tabela). As rotas individuais continuam
+    disponíveis por compatibilidade.
+    """
+    return _widget_response(request, "summary", _query_summary, **_params(filtros))
+
+@router.get("/stream")
+async def stream_dashboard(request: Request):
+    """
+    Envia atualizações do dashboard via Server-Sent Events (SSE).
+    Ao conectar, o cliente recebe todos os widgets; depois, apenas os que mudaram.
+    Cada evento `widgets` traz um JSON `{widget: dados}` no mesmo formato de `/summary`.
+    """
+    subscription = broadcaster.subscribe()
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                changed = await subscription.next(timeout=_SSE_KEEPALIVE_SECONDS)
+                if changed is None:
+                    # Comentário SSE: mantém a conexão viva através de proxies e detecta desconexões.
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: widgets\ndata: {json.dumps(jsonable_encoder(changed))}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/metricas")
+def get_dashboard_metricas():
+    """Métricas operacionais do dashboard: cache, respostas completas x 304, difusão e banco (pools e operações)."""
+    with _respostas_lock:
+        respostas = dict(_respostas)
+    return {"cache": cache.stats(), "respostas": respostas, "stream": broadcaster.stats(), "banco": db.stats()}
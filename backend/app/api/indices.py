@@ -0,0 +1,61 @@
+# =============================================================================
+# API ROUTER PARA O CONSULTOR DE ÍNDICES
+
+# Expõe o consultor de índices (`app/core/index_advisor.py`), alimentado pelo SQL
+# que o chat realmente executa:
+# 1. `/carga`: as queries registradas (normalizadas), com execuções e tempos.
+# 2. `/sugestoes`: índices que mais reduziriam o custo dessas queries, estimado
+#    com índices hipotéticos (HypoPG) — nada é criado no banco.
+# 3. `/aplicar`: cria os índices escolhidos com `CREATE INDEX CONCURRENTLY`.
+#    Desativado por padrão: exige INDEX_ADVISOR_ALLOW_APPLY=true.
+# =============================================================================
+
+import logging
+import psycopg2
+from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.core.db_pool import PoolTimeoutError
+from app.core.index_advisor import advisor
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+class AplicarIndicesRequest(BaseModel):
+    # Nomes das sugestões retornadas por `/sugestoes` (ex: "idx_operacoes_codigo_rastreio").
+    indices: list[str] = Field(min_length=1)
+
+@router.get("/carga")
+def get_carga():
+    """Queries registradas pelo chat, das que acumularam mais tempo de execução para as que acumularam menos."""
+    carga = advisor.workload()
+    for item in carga:
+        item.pop("exemplo", None)  # Só a versão normalizada: os literais podem conter dados dos clientes.
+    return {"queries": carga}
+
+@router.get("/sugestoes")
+def get_sugestoes(beneficio_minimo: float | None = None):
+    """
+    Analisa a carga registrada e sugere índices, com o benefício estimado pelo planejador.
+    `beneficio_minimo` (em %) substitui INDEX_ADVISOR_MIN_BENEFIT_PCT nesta consulta.
+    """
+    try:
+        return advisor.suggest(min_benefit_pct=beneficio_minimo)
+    except (PoolTimeoutError, psycopg2.OperationalError) as e:
+        logger.warning(f"Banco indisponível para a análise de índices: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de banco de dados indisponível.")
+    except Exception as e:
+        logger.error(f"Erro ao analisar índices: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro interno ao analisar índices.")
+
+@router.post("/aplicar")
+def aplicar_indices(request: AplicarIndicesRequest):
+    """Cria (concorrentemente) os índices escolhidos entre as últimas sugestões de `/sugestoes`."""
+    if not settings.INDEX_ADVISOR_ALLOW_APPLY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Criação de índices desativada (INDEX_ADVISOR_ALLOW_APPLY=false).")
+    try:
+        return {"resultados": advisor.apply(request.indices)}
+    except psycopg2.OperationalError as e:
+        logger.error(f"Falha ao conectar ao banco para criar índices: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de banco de dados indisponível.")
@@ -10,8 +10,10 @@
 # inteligente que processa cada pergunta do usuário através dos seguintes estágios:
 #
 # 1. Gerenciamento de Memória (`RunnableWithMessageHistory`):
-#    - No início de cada turno, carrega o histórico da conversa da sessão atual.
-#    - No final, salva a nova pergunta e resposta, tornando a conversa contínua.
+#    - No início de cada turno, carrega o histórico da conversa da sessão atual.
+#    - Envia aos LLMs apenas o resumo acumulado da conversa + os últimos turnos.
+#    - No final, salva a nova pergunta e resposta, tornando a conversa contínua.
+#    - Depois da resposta, o resumo é atualizado em segundo plano (`update_conversation_summary`).
 #
 # 2. Roteamento (`router_chain`):
 #    - O primeiro passo lógico. Analisa a intenção da pergunta para decidir se é uma
@@ -24,8 +26,11 @@
 # 4. A Sub-Cadeia SQL (`sql_chain`):
 #    a. Reescrita da Pergunta (`rephrasing_chain`): Resolve o contexto do histórico,
 #        transformando perguntas ambíguas em perguntas claras e autônomas.
-#    b. Geração de SQL (`sql_generation_chain`): Traduz a pergunta clara em uma query SQL.
-#    c. Execução Segura da Query: Roda a query no banco com mecanismos de segurança.
+#    b. Geração de SQL (`sql_generation_chain`): Traduz a pergunta clara em uma query SQL.
+#       Os clientes citados na pergunta são antes resolvidos para ids (`client_resolver`).
+#    c. Execução Segura da Query: Roda a query no banco com mecanismos de segurança, em uma
+#       transação somente-leitura e em um pool de conexões separado do dashboard. Cada query
+#       executada alimenta o consultor de índices (`app/core/index_advisor.py`).
 #    d. Geração da Resposta Final (`final_response_chain`): Formata o resultado do
 #        banco em uma resposta JSON amigável (texto ou gráfico).
 #
@@ -36,54 +41,143 @@
 # =================================================================================================
 
 import logging
+import threading
+import time
 # Componentes principais do LangChain para construir e gerenciar cadeias de conversação.
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.runnables import Runnable, RunnablePassthrough, RunnableBranch, RunnableLambda
 
 # Módulos internos para acesso ao LLM e ao banco de dados.
 from app.core.llm import get_llm, get_answer_llm
-from app.core.database import db_instance, get_compact_db_schema
+from app.core.database import db
+from app.core.schema_catalog import get_compact_db_schema
+from app.core.index_advisor import advisor as index_advisor
+from app.core.entity_resolver import client_resolver
+from app.core.config import settings
+from app.core.session_store import SessionStore
+from app.core.session_backends import SessionBackend, create_session_backend
 
 # Importa todos os prompts especializados do arquivo de prompts.
-from app.prompts.sql_prompts import SQL_PROMPT, FINAL_ANSWER_PROMPT, ROUTER_PROMPT, REPHRASER_PROMPT
+from app.prompts.sql_prompts import SQL_PROMPT, FINAL_ANSWER_PROMPT, ROUTER_PROMPT, REPHRASER_PROMPT, SUMMARY_PROMPT
 
 # Configura o logger para este módulo.
 logger = logging.getLogger(__name__)
 
-# Dicionário global que funciona como um armazenamento em memória para as sessões de chat.
+# Armazenamento em memória, LIMITADO, para as sessões de chat.
 # Para cada `session_id`, ele guarda o histórico de mensagens e a última query SQL executada.
-store = {}
+# Sessões ociosas expiram e as menos usadas são descartadas ao atingir os limites de
+# quantidade ou de memória (ver `app/core/session_store.py`).
+# Com um backend persistente configurado, este armazenamento funciona como cache
+# read-through: sessões ausentes (ou alteradas por outro worker) são lidas do backend.
+store = SessionStore(
+    max_sessions=settings.SESSION_MAX_COUNT,
+    idle_ttl_seconds=settings.SESSION_IDLE_TTL_SECONDS,
+    max_bytes=settings.SESSION_MAX_BYTES,
+)
+
+# Backend de persistência das sessões ("memory", "sqlite" ou "postgres"), definido no .env.
+# Criado no primeiro uso (ou na etapa "sessoes" da inicialização), NUNCA na importação: o backend
+# PostgreSQL executa DDL e inicia a thread escritora ao ser construído.
+_session_backend: SessionBackend | None = None
+_session_backend_lock = threading.Lock()
+
+def get_session_backend() -> SessionBackend:
+    """Retorna o backend de sessões, criando-o na primeira chamada (uma falha não fica guardada)."""
+    global _session_backend
+    if _session_backend is None:
+        with _session_backend_lock:
+            if _session_backend is None:
+                _session_backend = create_session_backend(settings)
+    return _session_backend
+
+def close_session_backend():
+    """Grava as escritas pendentes e encerra o backend de sessões (ex: no desligamento da API)."""
+    global _session_backend
+    with _session_backend_lock:
+        backend, _session_backend = _session_backend, None
+    if backend is not None:
+        backend.close()
 
 def get_session_data(session_id: str) -> dict:
     """
     Recupera ou cria o dicionário de dados para uma sessão de usuário específica no `store`.
+    Se a sessão não estiver no cache, ou se outro worker a tiver alterado, ela é (re)carregada
+    do backend persistente.
     """
-    if session_id not in store:
-        store[session_id] = {
-            "history": ChatMessageHistory(),
-            "last_sql": "Nenhuma query foi executada ainda."
-        }
-    return store[session_id]
+    session = store.get(session_id)
+    session_backend = get_session_backend()
+    if session is None or not session_backend.is_current(session_id, session):
+        session = session_backend.load(session_id) or session_backend.new_session(session_id)
+        store.put(session_id, session)
+    return session
 
-def get_session_history(session_id: str) -> ChatMessageHistory:
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """
     Função "getter" exigida pelo `RunnableWithMessageHistory`.
     Ela fornece o objeto de histórico de mensagens para uma sessão específica.
+    Roda no event loop: apenas lê a sessão já carregada pelo `/chat` (via `get_session_data`
+    em uma thread); só a carrega aqui se ela tiver saído do cache nesse meio-tempo.
     """
-    return get_session_data(session_id)["history"]
+    session = store.get(session_id)
+    if session is None:
+        session = get_session_data(session_id)
+    return session["history"]
 
 def update_last_sql(session_id: str, sql: str):
     """
     Atualiza a última query SQL executada para uma sessão.
     Isso é útil para depuração e lógicas de contexto futuras.
     """
-    if session_id in store:
+    session = store.get(session_id)
+    if session is not None:
         if sql and "erro:" not in sql.lower():
             logger.info(f"Atualizando last_sql para a sessão {session_id}: {sql}")
-            store[session_id]["last_sql"] = sql
+            get_session_backend().save_last_sql(session_id, session, sql)
+
+
+def create_summary_chain() -> Runnable:
+    """
+    Cria a cadeia do "Redator de Resumos", que atualiza o resumo acumulado da conversa.
+    """
+    return SUMMARY_PROMPT | get_answer_llm() | StrOutputParser()
+
+async def update_conversation_summary(session_id: str, summary_chain: Runnable):
+    """
+    Compacta no resumo da sessão as mensagens que saíram da janela de histórico recente.
+    É executada em segundo plano, DEPOIS que a resposta já foi enviada ao usuário, e só
+    chama o LLM quando há um lote completo de mensagens novas para resumir.
+    """
+    session = store.get(session_id)
+    if session is None:
+        return
+
+    messages = session["history"].messages
+    covered = session["resumo_ate"]
+    cutoff = len(messages) - settings.CHAT_HISTORY_WINDOW
+    if cutoff - covered < settings.CHAT_SUMMARY_BATCH:
+        return
+
+    new_messages = "\n".join(
+        f"{'Human' if m.type == 'human' else 'AI'}: {m.content}" for m in messages[covered:cutoff]
+    )
+    try:
+        summary = await summary_chain.ainvoke({
+            "summary": session["resumo"] or "(nenhum)",
+            "new_messages": new_messages,
+        })
+    except Exception as e:
+        # Sem resumo novo, o histórico recente continua sendo enviado normalmente.
+        logger.error(f"Erro ao atualizar o resumo da sessão {session_id}: {e}")
+        return
+
+    # Limite rígido de tamanho, para manter o prompt constante mesmo se o LLM se estender.
+    summary = summary.strip()[:settings.CHAT_SUMMARY_MAX_CHARS]
+    logger.info(f"Resumo da sessão {session_id} atualizado (cobre {cutoff} mensagens).")
+    get_session_backend().save_summary(session_id, session, summary, cutoff)
 
 
 def create_master_chain() -> Runnable:
@@ -92,15 +186,24 @@ def create_master_chain() -> Runnable:
     Esta função é o coração da lógica de orquestração.
     """
 
-    def trim_history(data):
+    def trim_history(data, config):
         """
-        Função interna para limitar o histórico de chat a um número `k` de mensagens.
-        Isso é crucial para evitar exceder o limite de tokens do LLM.
+        Função interna que monta o histórico enviado aos LLMs com tamanho constante:
+        o resumo acumulado da conversa (se existir) seguido das mensagens mais recentes
+        que ainda não foram resumidas. Isso evita exceder o limite de tokens do LLM
+        sem perder abruptamente o contexto das mensagens mais antigas.
         """
         history = data.get("chat_history", [])
-        k = 6
-        if len(history) > k:
-            data["chat_history"] = history[-k:]
+        session = store.get(config["configurable"]["session_id"]) or {}
+        summary = session.get("resumo", "")
+        covered = session.get("resumo_ate", 0)
+
+        # Mantém literais as mensagens ainda não resumidas, limitadas à janela + um lote do resumidor.
+        k = settings.CHAT_HISTORY_WINDOW
+        start = max(covered, len(history) - (k + settings.CHAT_SUMMARY_BATCH))
+        recent = history[start:]
+
+        data["chat_history"] = ([SystemMessage(content=f"Resumo da conversa até aqui: {summary}")] if summary else []) + recent
         return data
 
     def execute_sql_query(query: str) -> str:
@@ -127,8 +230,12 @@ def create_master_chain() -> Runnable:
                 logger.warning(f"Query modificada para incluir LIMIT: {query}")
                 
         try:
-            # Executa a query usando a integração do LangChain com o banco.
-            result = db_instance.run(query, include_columns=True)
+            # Executa a query pela rota somente-leitura (pool próprio, `SET TRANSACTION READ ONLY`).
+            started = time.monotonic()
+            result = db.run_query(query)
+            # Alimenta o consultor de índices com a carga real do chat (apenas queries bem-sucedidas).
+            if settings.INDEX_ADVISOR_ENABLED:
+                index_advisor.record(query, (time.monotonic() - started) * 1000)
             
             # Formata o resultado para o LLM em caso de não encontrar dados.
             if not result or result == '[]':
@@ -183,9 +290,17 @@ def create_master_chain() -> Runnable:
         | StrOutputParser()
     )
 
+    # Clientes citados na pergunta, resolvidos para ids ANTES da geração do SQL (ver
+    # `app/core/entity_resolver.py`): a query passa a filtrar pela coluna indexada `cliente_id`.
+    def resolve_clients(question: str) -> str:
+        return client_resolver.prompt_hint(question) if settings.ENTITY_RESOLVER_ENABLED else ""
+
     # 2. Define a cadeia do "Engenheiro de Banco de Dados", que traduz uma pergunta clara em SQL.
     sql_generation_chain = (
-        RunnablePassthrough.assign(schema=lambda _: get_compact_db_schema())
+        RunnablePassthrough.assign(
+            schema=lambda _: get_compact_db_schema(),
+            clientes=lambda x: resolve_clients(x["question"]),
+        )
         | SQL_PROMPT
         | get_llm()
         | StrOutputParser()
@@ -360,18 +475,18 @@ def create_master_chain() -> Runnable:
 # query SQL válida.
 # Fluxo Detalhado:
 #   1. Recebe a pergunta já reescrita (autônoma).
-#   2. O RunnablePassthrough.assign adiciona o schema do banco de dados ao contexto.
-#   3. Monta o SQL_PROMPT com a pergunta e o schema.
+#   2. O RunnablePassthrough.assign adiciona ao contexto o schema do banco de dados e os
+#      clientes citados na pergunta, já resolvidos para ids pelo `client_resolver`.
+#   3. Monta o SQL_PROMPT com a pergunta, o schema e os clientes identificados.
 #   4. Envia para um LLM (geralmente um modelo mais poderoso) para gerar o código SQL.
 #   5. O StrOutputParser extrai a query SQL como uma string.
 # Exemplo de Entrada:
 #   {
 #     "question": "Qual o valor total de mercadorias do cliente 'Porto'?"
 #   }
-# Exemplo de Saída:
+# Exemplo de Saída (com 'Porto' resolvido para os clientes 12 e 57):
 #   SELECT SUM(o.valor_mercadoria) FROM operacoes_logisticas o
-#   JOIN clientes c ON o.cliente_id = c.id
-#   WHERE c.nome_razao_social = 'Porto'
+#   WHERE o.cliente_id IN (12, 57)
 #
 # -------------------------------------------------------------------------------------------------
 #
@@ -427,7 +542,7 @@ def create_master_chain() -> Runnable:
 # até a formatação final da saída.
 # Fluxo Detalhado:
 #   1. Entrada: Recebe a pergunta original e o histórico.
-#   2. Invoca trim_history para encurtar o histórico.
+#   2. Invoca trim_history para trocar as mensagens antigas pelo resumo acumulado da conversa.
 #   3. Invoca router_chain para obter o topic.
 #   4. Invoca o branch que, com base no topic, escolhe entre sql_chain ou simple_chat_chain.
 #   5. Passa a saída da cadeia escolhida para a função format_final_output.
@@ -0,0 +1,200 @@
+# =============================================================================
+# DIFUSÃO DE ATUALIZAÇÕES (PUSH) PARA VÁRIOS CLIENTES
+#
+# Com polling, cada navegador com o dashboard aberto dispara suas próprias
+# consultas: a carga no banco cresce com o número de usuários.
+#
+# O `ChangeBroadcaster` inverte o fluxo:
+# 1. Uma ÚNICA tarefa de atualização (por processo) recalcula os widgets, seja
+#    em intervalo fixo, seja quando o banco avisa que os dados mudaram
+#    (`LISTEN/NOTIFY` do PostgreSQL).
+# 2. O ETag de cada widget é comparado com o da rodada anterior e apenas os
+#    widgets que MUDARAM são enviados aos assinantes.
+# 3. A tarefa só existe enquanto houver assinantes: ela é iniciada pelo primeiro
+#    e encerrada quando o último se desconecta.
+#
+# Assim, a carga no banco independe de quantas pessoas estão com o dashboard aberto.
+# =============================================================================
+
+import asyncio
+import logging
+from typing import Any, Callable
+
+from app.core.cache import content_etag
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Assinatura de um cliente. Atualizações ainda não entregues são MESCLADAS
+    (widget -> dados mais recentes), então um cliente lento nunca acumula uma fila.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, Any] = {}
+        self._ready = asyncio.Event()
+
+    def _push(self, changed: dict[str, Any]):
+        self._pending.update(changed)
+        self._ready.set()
+
+    async def next(self, timeout: float) -> dict[str, Any] | None:
+        """Aguarda a próxima atualização; retorna `None` se o `timeout` expirar antes."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        changed, self._pending = self._pending, {}
+        return changed
+
+
+class ChangeBroadcaster:
+    """
+    Recalcula um conjunto de widgets com uma única tarefa e envia só os que mudaram.
+
+    Args:
+        compute: Função SÍNCRONA que retorna `{widget: dados}`; roda em uma thread.
+        interval: Intervalo máximo (s) entre recálculos, mesmo sem notificações.
+        min_interval: Intervalo mínimo (s) entre recálculos; agrupa rajadas de notificações.
+        connect_listener: Função opcional que abre uma conexão psycopg2 em autocommit
+            e já executou `LISTEN`. Sem ela (ou se falhar), usa apenas o intervalo.
+    """
+
+    def __init__(self, compute: Callable[[], dict[str, Any]], interval: float,
+                 min_interval: float, connect_listener: Callable[[], Any] | None = None):
+        self.compute = compute
+        self.interval = interval
+        self.min_interval = min_interval
+        self.connect_listener = connect_listener
+
+        self._subscribers: set[Subscription] = set()
+        self._snapshot: dict[str, Any] = {}
+        self._etags: dict[str, str] = {}
+        self._task: asyncio.Task | None = None
+        self._changed: asyncio.Event | None = None
+        self._listener = None
+        self._stats = {"recalculos": 0, "notificacoes": 0, "widgets_enviados": 0}
+
+    # --- Assinaturas ---
+
+    def subscribe(self) -> Subscription:
+        """Registra um assinante, já com o último retrato conhecido, e inicia a tarefa se necessário."""
+        subscription = Subscription()
+        if self._snapshot:
+            subscription._push(dict(self._snapshot))
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove o assinante; a tarefa de atualização termina sozinha quando não houver mais nenhum."""
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._changed is not None:
+            self._changed.set()  # Acorda a tarefa para que ela perceba que pode encerrar.
+
+    def stats(self) -> dict:
+        """Retorna as métricas da difusão."""
+        return {
+            "assinantes": len(self._subscribers),
+            "ativo": self._task is not None and not self._task.done(),
+            "escutando_banco": self._listener is not None,
+            **self._stats,
+        }
+
+    async def stop(self):
+        """Encerra a tarefa de atualização (ex: no desligamento da API), fechando a conexão de LISTEN."""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # --- Tarefa de atualização ---
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        await self._start_listener(loop)
+        try:
+            while self._subscribers:
+                self._changed.clear()
+                try:
+                    widgets = await asyncio.to_thread(self.compute)
+                except Exception as e:
+                    # Falhas não derrubam a tarefa: os clientes mantêm os dados atuais até a próxima rodada.
+                    logger.error(f"Falha ao recalcular os widgets para difusão: {e}", exc_info=True)
+                    widgets = {}
+                self._publish(widgets)
+
+                # Espera o próximo gatilho (notificação do banco ou intervalo), respeitando o intervalo mínimo.
+                await asyncio.sleep(self.min_interval)
+                if self._listener is None and self.connect_listener is not None:
+                    await self._start_listener(loop)
+                try:
+                    await asyncio.wait_for(self._changed.wait(), max(self.interval - self.min_interval, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stop_listener(loop)
+            logger.info("Difusão do dashboard encerrada (sem assinantes).")
+
+    def _publish(self, widgets: dict[str, Any]):
+        self._stats["recalculos"] += 1
+        changed = {}
+        for name, data in widgets.items():
+            etag = content_etag(data)
+            if self._etags.get(name) != etag:
+                self._etags[name] = etag
+                changed[name] = data
+        if not changed:
+            return
+        self._snapshot.update(changed)
+        self._stats["widgets_enviados"] += len(changed) * len(self._subscribers)
+        for subscription in self._subscribers:
+            subscription._push(changed)
+
+    # --- LISTEN/NOTIFY ---
+
+    async def _start_listener(self, loop: asyncio.AbstractEventLoop):
+        if self.connect_listener is None:
+            return
+        try:
+            self._listener = await asyncio.to_thread(self.connect_listener)
+            # O socket da conexão é integrado ao event loop: nenhuma thread fica bloqueada esperando.
+            loop.add_reader(self._listener.fileno(), self._on_listener_readable, loop)
+            logger.info("Difusão do dashboard escutando notificações do banco.")
+        except Exception as e:
+            logger.warning(f"LISTEN indisponível; a difusão usará apenas o intervalo: {e}")
+            self._listener = None
+
+    def _on_listener_readable(self, loop: asyncio.AbstractEventLoop):
+        try:
+            self._listener.poll()
+        except Exception as e:
+            logger.warning(f"Conexão de LISTEN perdida; tentando reconectar na próxima rodada: {e}")
+            self._stop_listener(loop)
+            return
+        if self._listener.notifies:
+            self._stats["notificacoes"] += len(self._listener.notifies)
+            self._listener.notifies.clear()
+            self._changed.set()
+
+    def _stop_listener(self, loop: asyncio.AbstractEventLoop):
+        if self._listener is None:
+            return
+        try:
+            loop.remove_reader(self._listener.fileno())
+        except Exception:
+            pass
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        self._listener = None
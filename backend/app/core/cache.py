@@ -0,0 +1,148 @@
+# =============================================================================
+# CACHE DE RESULTADOS EM MEMÓRIA
+#
+# Cache genérico usado pelo dashboard para guardar o resultado das agregações.
+#
+# Diferente do `@cached(cache)` aplicado diretamente nas rotas (que usava os
+# argumentos da função, incluindo o cursor injetado, como chave e por isso quase
+# nunca acertava), aqui a chave é montada EXPLICITAMENTE pelo chamador
+# (ex: nome do widget + filtros) e o cache é consultado ANTES de qualquer
+# conexão ser retirada do pool: um acerto não toca no banco de dados.
+#
+# Características:
+# - Tamanho máximo com descarte LRU (biblioteca `cachetools`).
+# - Tempo de vida (TTL) por entrada.
+# - Seguro para uso concorrente (as rotas síncronas rodam em um threadpool).
+# - Métricas de acertos, faltas e taxa de acerto.
+# - ETag por entrada: um hash do conteúdo calculado UMA vez, quando a entrada é
+#   preenchida, usado pelas rotas para responder `304 Not Modified`.
+# - Stale-while-revalidate: depois do TTL, e por até `stale_ttl` segundos, o valor
+#   vencido é servido NA HORA enquanto UMA única atualização por chave roda em
+#   segundo plano. Assim, nenhuma requisição "azarada" paga a consulta completa.
+# =============================================================================
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+from cachetools import LRUCache
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+
+def content_etag(value: Any) -> str:
+    """
+    Gera um ETag forte a partir do conteúdo serializado em JSON (chaves ordenadas).
+    Conteúdos iguais geram o mesmo ETag, mesmo após o TTL expirar e o valor ser recalculado.
+    """
+    payload = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+class _CacheEntry:
+    """Valor armazenado, seu ETag e o instante em que foi calculado."""
+    __slots__ = ("value", "etag", "stored_at")
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.etag = content_etag(value)
+        self.stored_at = time.monotonic()
+
+
+class ResultCache:
+    """
+    Cache LRU com TTL, stale-while-revalidate e métricas, consultado antes de
+    executar a função de cálculo. Com `stale_ttl=0`, entradas vencidas são
+    simplesmente recalculadas na requisição (comportamento clássico de TTL).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale_hits = 0
+        self._background_refreshes = 0
+        # Chaves com atualização em segundo plano em andamento (no máximo uma por chave).
+        self._refreshing: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Retorna o valor em cache para `key` ou, em caso de falta (ou expiração),
+        executa `compute()`, armazena e retorna o resultado.
+        Exceções de `compute()` são propagadas e NUNCA são armazenadas.
+        """
+        return self.get_or_compute_with_etag(key, compute)[0]
+
+    def get_or_compute_with_etag(self, key: Hashable, compute: Callable[[], Any]) -> tuple[Any, str]:
+        """Igual a `get_or_compute`, mas retorna também o ETag do valor: `(valor, etag)`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.stored_at
+                if age < self.ttl:
+                    self._hits += 1
+                    return entry.value, entry.etag
+                if age < self.ttl + self.stale_ttl:
+                    # Vencido, mas ainda servível: responde já e atualiza em segundo plano.
+                    self._stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._background_refreshes += 1
+                        self._executor.submit(self._refresh, key, compute)
+                    return entry.value, entry.etag
+            self._misses += 1
+
+        # O cálculo (e o hash do ETag) roda fora do lock para não bloquear os acertos de outras chaves.
+        entry = _CacheEntry(compute())
+        with self._lock:
+            self._entries[key] = entry
+        return entry.value, entry.etag
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Any]):
+        # Roda em uma thread do executor. Em caso de falha, o valor vencido continua sendo servido
+        # até a próxima tentativa (ou até sair da janela de `stale_ttl`).
+        try:
+            self.set(key, compute())
+        except Exception as e:
+            logger.warning(f"Falha ao atualizar em segundo plano a chave {key!r}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key: Hashable, value: Any) -> str:
+        """Armazena um valor já calculado (ex: pela tarefa de difusão) e retorna seu ETag."""
+        entry = _CacheEntry(value)
+        with self._lock:
+            self._entries[key] = entry
+        return entry.etag
+
+    def clear(self):
+        """Descarta todas as entradas do cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Retorna as métricas atuais do cache."""
+        with self._lock:
+            total = self._hits + self._stale_hits + self._misses
+            return {
+                "entradas": len(self._entries),
+                "tamanho_maximo": self.maxsize,
+                "ttl_segundos": self.ttl,
+                "janela_vencida_segundos": self.stale_ttl,
+                "acertos": self._hits,
+                "acertos_vencidos": self._stale_hits,
+                "faltas": self._misses,
+                "atualizacoes_em_segundo_plano": self._background_refreshes,
+                "taxa_de_acerto": round((self._hits + self._stale_hits) / total, 4) if total else 0.0,
+            }
@@ -3,142 +3,317 @@
 #
 # Este módulo centraliza toda a interação com o banco de dados PostgreSQL.
 # Ele é responsável por:
-# 1. Criar uma instância de conexão que o LangChain pode usar para EXECUTAR queries.
-# 2. Gerar uma representação de texto compacta do schema do banco para ser
-#    enviada como CONTEXTO para o LLM, evitando erros de requisição muito grande.
+# 1. Manter o `DatabaseManager`, o ÚNICO ponto de acesso ao banco da aplicação.
+#    Ele mantém dois pools de conexões com a mesma configuração de SSL, timeout
+#    de instrução e métricas:
+#    - "principal": usado pelo dashboard, pela leitura do schema e pelas sessões.
+#    - "leitura": SOMENTE-LEITURA, exclusivo para as queries geradas pelo LLM
+#      (opcionalmente apontando para uma réplica de leitura).
+# 2. Executar o SQL gerado pelo LLM e formatar o resultado como texto.
+#    (O schema enviado como CONTEXTO ao LLM fica em `schema_catalog.py`.)
 # =============================================================================
 
 import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-from langchain_community.utilities import SQLDatabase
-# Necessário para criar a engine e usar variáveis separadas.
-from sqlalchemy import create_engine 
+import psycopg2.extensions
+import psycopg2.extras
 from .config import settings
+from .db_pool import BlockingConnectionPool
 
 # Obtém um logger específico para este módulo.
 logger = logging.getLogger(__name__)
 
-# Variável global para armazenar o schema em cache, evitando múltiplas chamadas ao DB.
-_cached_schema: str | None = None
+# Tamanho máximo de cada valor textual no resultado enviado ao LLM (mesmo limite do SQLDatabase do LangChain).
+_MAX_STRING_LENGTH = 300
+
+
+def _truncate(value, length: int = _MAX_STRING_LENGTH, suffix: str = "..."):
+    if not isinstance(value, str) or len(value) <= length:
+        return value
+    return value[:length - len(suffix)].rsplit(" ", 1)[0] + suffix
+
+
+# --- Validação do SQL gerado pelo LLM ---
+# `SET TRANSACTION READ ONLY` sozinho não basta: uma string com várias instruções
+# (`SELECT 1; COMMIT; SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE; DELETE ...`)
+# roda inteira pelo protocolo simples e ainda devolve ao pool uma conexão de escrita.
+
+class UnsafeQueryError(ValueError):
+    """SQL recusado antes de chegar ao banco: não é uma única consulta de leitura (SELECT/WITH)."""
+
+# Trechos que não são código: literais (com `E'...'` aceitando `\'`), identificadores entre aspas,
+# dollar-quoting e comentários. São removidos antes da análise, para que um `;` ou uma palavra-chave
+# dentro deles não conte. Pressupõe `standard_conforming_strings=on` (forçado nas conexões de leitura).
+# O `E` e o `$` de abertura não podem vir grudados em uma palavra: em `LIKE'x\'` ou `coluna$$`,
+# o PostgreSQL lê um identificador seguido de um literal comum (sem escape por barra invertida).
+_SQL_NON_CODE = re.compile(r"""
+      (?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'
+    | '(?:[^']|'')*'
+    | "(?:[^"]|"")*"
+    | (?<![\w$])\$((?:[A-Za-z_]\w*)?)\$.*?\$\1\$
+    | --[^\n]*
+    | /\*.*?\*/
+""", re.S | re.X)
+# Com uma única instrução (e em transação somente-leitura), só preocupa o que cabe DENTRO de um
+# SELECT: `SELECT ... INTO` (cria tabela), `FOR UPDATE/SHARE` (trava linhas), CTEs que modificam
+# dados (`WITH d AS (DELETE ...)`) e funções (seguidas de `(`) com efeito na sessão, no servidor ou
+# em arquivos. Palavras soltas como `start`, `set` ou `end` podem ser apelidos ou colunas e passam.
+_SQL_FORBIDDEN = re.compile(
+    r"\b(into|for\s+(?:no\s+key\s+)?update|for\s+(?:key\s+)?share)\b"
+    r"|\(\s*(insert|update|delete|merge)\s"
+    r"|\b(set_config|dblink\w*|lo_\w+|pg_read_\w+|pg_ls_\w+|pg_stat_file|pg_notify|pg_sleep\w*|"
+    r"pg_terminate_backend|pg_cancel_backend|pg_reload_conf|pg_rotate_logfile|pg_advisory\w*|"
+    r"query_to_xml\w*|nextval|setval)\s*\(",
+    re.I,
+)
+
 
-def get_db_connection() -> SQLDatabase:
+def validate_readonly_query(query: str) -> str:
     """
-    Cria a conexão principal do LangChain, que será usada para EXECUTAR as queries SQL
-    geradas pela IA.
-    
-    Esta função foi modificada para montar a URI a partir das variáveis separadas do .env
-    e adicionar o parâmetro SSL obrigatório via connect_args.
-
-    Returns:
-        Uma instância de SQLDatabase configurada para o banco de dados do projeto.
-    
-    Raises:
-        Exception: Se a conexão com o banco de dados falhar.
+    Garante que `query` é UMA única consulta SELECT (ou WITH ... SELECT), sem instruções
+    encadeadas por `;`, controle de transação, `SET` ou escrita. Retorna a query sem o `;`
+    final; lança `UnsafeQueryError` caso contrário.
     """
-    
-    # 1. Monta a URI completa a partir das variáveis do .env
-    DATABASE_URI_FULL = (
-        f"postgresql://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
-    )
-    # 2. Argumento necessário para conexão SSL/TLS com serviços em nuvem como Render
-    SSL_ARGS = {"sslmode": "require"}
-    
-    try:
-        # 3. Criamos a Engine explicitamente, passando os argumentos de conexão (SSL)
-        engine = create_engine(
-            DATABASE_URI_FULL,
-            connect_args=SSL_ARGS
-        )
-        
-        # 4. Criamos a instância SQLDatabase do LangChain usando a Engine customizada.
-        db = SQLDatabase(
-            engine=engine,
-            include_tables=['operacoes_logisticas', 'clientes'],
-            sample_rows_in_table_info=0
-        )
-        
-        logger.info("Conexão com o banco de dados (LangChain) estabelecida com sucesso.")
-        return db
-    
-    except Exception as e:
-        logger.error(f"Falha ao conectar com o banco de dados (LangChain): {e}")
-        raise
-
-def _generate_compact_db_schema() -> str:
+    code = _SQL_NON_CODE.sub(" ", query)
+    if re.search(r"['\"]|\$(?:[A-Za-z_]\w*)?\$|/\*", code):
+        raise UnsafeQueryError("Literal, identificador ou comentário não fechado.")
+    body = code.strip().rstrip(";").strip()
+    if ";" in body:
+        raise UnsafeQueryError("A query contém mais de uma instrução.")
+    if not re.match(r"\(*\s*(select|with)\b", body, re.I):
+        raise UnsafeQueryError("Apenas consultas SELECT (ou WITH ... SELECT) são permitidas.")
+    forbidden = _SQL_FORBIDDEN.search(body)
+    if forbidden:
+        word = " ".join(next(group for group in forbidden.groups() if group).split()).upper()
+        raise UnsafeQueryError(f"Construção não permitida em uma consulta de leitura: {word}.")
+    return query.strip().rstrip(";").rstrip()
+
+
+class DatabaseManager:
     """
-    Gera uma string de schema muito compacta, incluindo os valores
-    possíveis para os tipos ENUM, para guiar melhor a IA.
-    Esta função se conecta ao banco e faz o trabalho pesado.
+    Acesso unificado ao PostgreSQL: pools thread-safe com espera limitada, SSL,
+    `statement_timeout` e métricas compartilhados por todos os módulos.
 
-    Returns:
-        Uma string formatada com o esquema do banco de dados.
+    Antes, havia três mecanismos independentes (engine do SQLAlchemy para o chat,
+    `psycopg2.connect` avulso para o schema e um pool próprio no dashboard, este
+    último sem SSL), cada um com suas conexões e handshakes TLS.
+
+    As conexões são abertas sob demanda: criar o gerenciador não acessa o banco.
     """
-    conn = None
-    try:
-        logger.info("Gerando schema compacto do banco de dados a partir do DB...")
-        
-        # ADIÇÃO DO PARÂMETRO SSL AQUI: Resolve erro SSL/TLS no psycopg2 direto.
-        conn = psycopg2.connect(
-            host=settings.DB_HOST,
-            dbname=settings.DB_NAME,
-            user=settings.DB_USER,
-            password=settings.DB_PASS,
-            port=settings.DB_PORT,
-            sslmode='require' # <--- A correção de segurança
-        )
-        cur = conn.cursor()
-        
-        schema_parts = []
-        tables = ['clientes', 'operacoes_logisticas']
-        
-        for table in tables:
-            # Consulta as colunas e tipos de dados de cada tabela.
-            cur.execute(f"""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = '{table}'
+
+    def __init__(self):
+        self._pools = {
+            "principal": BlockingConnectionPool(
+                connect=lambda: self._connect(readonly=False),
+                minconn=settings.DB_POOL_MIN_SIZE,
+                maxconn=settings.DB_POOL_MAX_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                ping_after=settings.DB_POOL_PING_AFTER_SECONDS,
+                name="principal",
+            ),
+            # Pool próprio para o SQL do LLM: uma rajada de consultas pesadas no chat
+            # não esgota as conexões do dashboard (e vice-versa).
+            "leitura": BlockingConnectionPool(
+                connect=lambda: self._connect(readonly=True),
+                minconn=0,
+                maxconn=settings.DB_READONLY_POOL_SIZE + settings.DB_READONLY_MAX_OVERFLOW,
+                timeout=settings.DB_READONLY_POOL_TIMEOUT,
+                ping_after=settings.DB_POOL_PING_AFTER_SECONDS,
+                name="leitura",
+            ),
+        }
+        self._lock = threading.Lock()
+        self._metrics = {name: {"operacoes": 0, "erros": 0, "tempo_total_ms": 0.0, "mais_lenta_ms": 0.0}
+                         for name in self._pools}
+
+    # --- Conexões ---
+
+    def _connect(self, readonly: bool, autocommit: bool = False):
+        # Parâmetros comuns a TODAS as conexões da aplicação.
+        options = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        if readonly:
+            # Toda transação da sessão começa somente-leitura. `standard_conforming_strings`
+            # garante que a barra invertida só escapa em `E'...'`, como supõe `validate_readonly_query`.
+            options += " -c default_transaction_read_only=on -c standard_conforming_strings=on"
+        common = {
+            "sslmode": settings.DB_SSLMODE,
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+            "application_name": "datachat-bi",
+            "options": options,
+        }
+        if readonly and settings.DB_READONLY_DSN:
+            conn = psycopg2.connect(settings.DB_READONLY_DSN, **common)
+        else:
+            conn = psycopg2.connect(
+                host=settings.DB_HOST,
+                dbname=settings.DB_NAME,
+                user=settings.DB_USER,
+                password=settings.DB_PASS,
+                port=settings.DB_PORT,
+                **common,
+            )
+        if autocommit:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def pool(self, readonly: bool = False) -> BlockingConnectionPool:
+        """Retorna o pool principal ou o somente-leitura (ex: para quem gerencia getconn/putconn)."""
+        return self._pools["leitura" if readonly else "principal"]
+
+    @contextmanager
+    def connection(self, readonly: bool = False):
+        """Empresta uma conexão do pool, devolvendo-a SEMPRE ao final (e registrando as métricas)."""
+        name = "leitura" if readonly else "principal"
+        start_time = time.monotonic()
+        failed = False
+        try:
+            with self._pools[name].connection() as conn:
+                yield conn
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.monotonic() - start_time, failed)
+
+    @contextmanager
+    def cursor(self, readonly: bool = False, dict_rows: bool = False):
+        """Atalho para `connection()` + cursor (com `dict_rows=True`, as linhas vêm como dicionários)."""
+        factory = psycopg2.extras.RealDictCursor if dict_rows else None
+        with self.connection(readonly) as conn:
+            with conn.cursor(cursor_factory=factory) as cur:
+                yield cur
+
+    def open_dedicated_connection(self, autocommit: bool = True):
+        """
+        Abre uma conexão FORA dos pools, com os mesmos parâmetros (SSL, timeout), para usos
+        de longa duração como `LISTEN`. Quem abre é responsável por fechá-la.
+        """
+        return self._connect(readonly=False, autocommit=autocommit)
+
+    # --- Aquecimento e prontidão ---
+
+    def warm_up(self):
+        """
+        Abre antecipadamente as conexões dos dois pools (o mínimo do principal e uma do somente-leitura),
+        para que a primeira requisição não pague o handshake TLS. Lança exceção se o banco estiver fora do ar.
+        """
+        self._pools["principal"].warm()
+        for readonly in (False, True):
+            with self.cursor(readonly=readonly) as cur:
+                cur.execute("SELECT 1")
+        self.check_readonly_role()
+
+    def check_readonly_role(self):
+        """
+        Verifica se a rota somente-leitura usa de fato um papel sem permissão de escrita (ou uma
+        réplica). Sem isso, a proteção do SQL do LLM depende só da validação e do modo da transação:
+        registra um erro ou, com DB_READONLY_REQUIRE_ROLE=true, lança exceção (a API não fica pronta).
+        """
+        with self.cursor(readonly=True) as cur:
+            cur.execute("""
+                SELECT current_user, NOT pg_is_in_recovery() AND (r.rolsuper OR EXISTS (
+                    SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = ANY(current_schemas(false)) AND c.relkind IN ('r', 'p')
+                      AND has_table_privilege(c.oid, 'INSERT, UPDATE, DELETE, TRUNCATE')
+                ))
+                FROM pg_roles r WHERE r.rolname = current_user
             """)
-            columns = []
-            for row in cur.fetchall():
-                column_name, data_type = row
-                # Para colunas ENUM, busca os valores possíveis para adicionar ao schema.
-                if data_type in ['tipo_operacao_logistica', 'status_operacao']:
-                    cur.execute(f"SELECT unnest(enum_range(NULL::{data_type}))::text")
-                    enum_values = [f"'{val[0]}'" for val in cur.fetchall()]
-                    columns.append(f"{column_name} ({data_type}, valores possíveis: {', '.join(enum_values)})")
-                else:
-                    columns.append(f"{column_name} ({data_type})")
-
-            schema_parts.append(f"Tabela: {table}\nColunas: {', '.join(columns)}")
-            
-        cur.close()
-        logger.info("Schema compacto gerado com sucesso.")
-        return "\n\n".join(schema_parts)
-    except Exception as e:
-        logger.error(f"Erro ao gerar schema compacto: {e}")
-        return "Erro ao obter schema do banco de dados."
-    finally:
-        # Fecha a conexão direta para liberar recursos.
-        if conn:
-            conn.close()
-
-def get_compact_db_schema() -> str:
-    """
-    Função pública que retorna o schema do banco de dados.
-    Ela utiliza um sistema de cache para evitar múltiplas chamadas ao banco,
-    gerando o schema apenas na primeira vez que é solicitado.
+            role, can_write = cur.fetchone()
+        if not can_write:
+            return
+        message = (f"A rota somente-leitura do SQL do LLM usa o papel '{role}', que tem permissão de escrita. "
+                   "Defina DB_READONLY_DSN com um usuário somente-leitura ou uma réplica.")
+        if settings.DB_READONLY_REQUIRE_ROLE:
+            raise RuntimeError(message)
+        logger.error(message)
 
-    Returns:
-        A string contendo o esquema do banco de dados.
-    """
-    global _cached_schema
-    # Se o cache estiver vazio, chama a função geradora.
-    if _cached_schema is None:
-        _cached_schema = _generate_compact_db_schema()
-    
-    # Retorna o schema que está em cache.
-    return _cached_schema
-
-# Cria uma instância única da conexão do LangChain quando a aplicação é iniciada.
-# Esta linha tentará se conectar ao banco imediatamente, levantando um erro se falhar.
-db_instance = get_db_connection()
\ No newline at end of file
+    def ping(self, timeout: float = 1.0) -> bool:
+        """Verificação rápida (para a rota `/ready`): há conexão utilizável no pool principal?"""
+        try:
+            with self._pools["principal"].connection(timeout=timeout) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Banco de dados indisponível na verificação de prontidão: {e}")
+            return False
+
+    # --- Manutenção ---
+
+    def ensure_partitions(self) -> int:
+        """
+        Cria as partições mensais que faltam em `operacoes_logisticas` (mês atual e os próximos),
+        usando a função `criar_particoes_operacoes()` instalada por `criar_tabelas.py`.
+        Retorna quantas partições foram criadas (0 se a tabela não for particionada).
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regproc('criar_particoes_operacoes') IS NOT NULL")
+                if not cur.fetchone()[0]:
+                    return 0
+                cur.execute("SELECT criar_particoes_operacoes()")
+                created = cur.fetchone()[0]
+            # Commit explícito: o pool desfaz transações abertas ao receber a conexão de volta.
+            conn.commit()
+        return created
+
+    # --- Execução do SQL gerado pelo LLM ---
+
+    def run_query(self, query: str) -> str:
+        """
+        Executa uma query na rota SOMENTE-LEITURA e retorna o resultado como texto para o LLM,
+        no mesmo formato de `SQLDatabase.run(..., include_columns=True)` do LangChain:
+        a representação de uma lista de dicionários (coluna -> valor), ou "" sem linhas.
+        Lança `UnsafeQueryError` (sem tocar no banco) se não for uma única consulta de leitura.
+        """
+        query = validate_readonly_query(query)
+        with self.connection(readonly=True) as conn:
+            with conn.cursor() as cur:
+                # Reforço explícito além do `default_transaction_read_only` da conexão.
+                cur.execute("SET TRANSACTION READ ONLY")
+                cur.execute(query)
+                if cur.description is None:
+                    return ""
+                columns = [column.name for column in cur.description]
+                rows = [
+                    {column: _truncate(value) for column, value in zip(columns, row)}
+                    for row in cur.fetchall()
+                ]
+        return str(rows) if rows else ""
+
+    # --- Métricas ---
+
+    def _record(self, name: str, elapsed: float, failed: bool):
+        with self._lock:
+            metrics = self._metrics[name]
+            metrics["operacoes"] += 1
+            metrics["erros"] += int(failed)
+            metrics["tempo_total_ms"] += elapsed * 1000
+            metrics["mais_lenta_ms"] = max(metrics["mais_lenta_ms"], elapsed * 1000)
+
+    def stats(self) -> dict:
+        """Métricas de cada pool (ocupação, esperas, timeouts) e das operações executadas nele."""
+        with self._lock:
+            metrics = {name: dict(values) for name, values in self._metrics.items()}
+        result = {"ssl": settings.DB_SSLMODE, "statement_timeout_ms": settings.DB_STATEMENT_TIMEOUT_MS}
+        for name, pool in self._pools.items():
+            values = metrics[name]
+            values["tempo_medio_ms"] = round(values["tempo_total_ms"] / values["operacoes"], 2) if values["operacoes"] else 0.0
+            values["tempo_total_ms"] = round(values["tempo_total_ms"], 2)
+            values["mais_lenta_ms"] = round(values["mais_lenta_ms"], 2)
+            result[name] = {"pool": pool.stats(), "operacoes": values}
+        return result
+
+    def close(self):
+        """Fecha as conexões ociosas de todos os pools (ex: no desligamento da aplicação)."""
+        for pool in self._pools.values():
+            pool.closeall()
+
+# Cria a instância única do gerenciador de banco de dados, compartilhada por toda a aplicação
+# (chat, schema, dashboard e sessões). Nenhuma conexão é aberta aqui: os pools as criam sob demanda.
+db = DatabaseManager()
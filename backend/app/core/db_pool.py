@@ -0,0 +1,249 @@
+# =============================================================================
+# POOL DE CONEXÕES THREAD-SAFE E OBSERVÁVEL
+#
+# O `SimpleConnectionPool` do psycopg2 é documentado como NÃO thread-safe, mas
+# as rotas síncronas do FastAPI rodam em paralelo em um threadpool. Além disso,
+# quando todas as conexões estão em uso, o `getconn` lança um erro em vez de
+# esperar, o que virava um HTTP 500 em picos de acesso.
+#
+# O `BlockingConnectionPool`:
+# 1. Protege todo o estado com um `threading.Condition`.
+# 2. Quando o pool está esgotado, a requisição ESPERA (com tempo máximo) por uma
+#    conexão livre; só após o timeout é lançado `PoolTimeoutError`.
+# 3. Verifica a saúde de conexões ociosas há muito tempo antes de reutilizá-las
+#    (ex: conexões SSL derrubadas pelo servidor) e descarta as quebradas.
+# 4. Cria conexões sob demanda (ou antecipadamente com `warm()`), então a API
+#    sobe mesmo com o banco fora do ar.
+# 5. Exporta métricas: em uso, ociosas, esperas, tempo de espera e timeouts.
+# =============================================================================
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import psycopg2
+import psycopg2.extensions
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo máximo de espera."""
+
+
+class BlockingConnectionPool:
+    """
+    Pool de conexões psycopg2 seguro para threads, com espera limitada e verificação de saúde.
+
+    Args:
+        connect: Função que abre uma nova conexão psycopg2.
+        minconn: Conexões abertas antecipadamente por `warm()`.
+        maxconn: Máximo de conexões abertas ao mesmo tempo (em uso + ociosas).
+        timeout: Tempo máximo (s) de espera por uma conexão livre.
+        ping_after: Conexões ociosas há mais de N segundos são testadas com `SELECT 1` antes do uso.
+        name: Nome usado nos logs.
+    """
+
+    def __init__(self, connect: Callable[[], Any], minconn: int, maxconn: int, timeout: float,
+                 ping_after: float = 30, name: str = "pool"):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._idle: list[tuple[Any, float]] = []  # (conexão, instante em que foi devolvida)
+        self._in_use: set[int] = set()            # id() das conexões emprestadas
+        self._opened = 0                          # conexões abertas (em uso + ociosas + sendo criadas)
+        self._waiting = 0
+        self._closed = False
+
+        # Contadores exportados em `stats()`.
+        self._stats = {"criadas": 0, "descartadas": 0, "esperas": 0, "timeouts": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # --- Empréstimo e devolução ---
+
+    def getconn(self, timeout: float | None = None):
+        """
+        Retorna uma conexão saudável, esperando até `timeout` segundos se o pool estiver esgotado.
+
+        Raises:
+            PoolTimeoutError: Se nenhuma conexão ficar livre a tempo.
+            psycopg2.OperationalError: Se não for possível abrir uma nova conexão.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            conn, idle_since = self._acquire_slot(deadline)
+            if conn is None:
+                # Uma vaga foi reservada: abre a conexão fora do lock.
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._cond:
+                    self._stats["criadas"] += 1
+                    self._in_use.add(id(conn))
+                return conn
+
+            if self._is_healthy(conn, idle_since):
+                with self._cond:
+                    self._in_use.add(id(conn))
+                return conn
+            # Conexão quebrada: descarta e tenta de novo (reaproveitando o prazo restante).
+            logger.warning(f"[{self.name}] Conexão ociosa quebrada descartada.")
+            self._close_quietly(conn)
+            self._release_slot(discarded=True)
+
+    def putconn(self, conn, discard: bool = False):
+        """Devolve a conexão ao pool; conexões fechadas, quebradas ou com `discard=True` são descartadas."""
+        with self._cond:
+            self._in_use.discard(id(conn))
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # Encerra transações abertas (ex: SELECTs sem commit) para não deixar "idle in transaction".
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+        if discard or conn.closed:
+            self._close_quietly(conn)
+            self._release_slot(discarded=True)
+            return
+        with self._cond:
+            keep = not self._closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if not keep:
+            self._close_quietly(conn)
+            self._release_slot()
+
+    def warm(self):
+        """Abre até `minconn` conexões antecipadamente (ex: na inicialização da API)."""
+        conns = []
+        try:
+            for _ in range(self.minconn):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """Empresta uma conexão dentro de um bloco `with`, devolvendo-a SEMPRE ao final."""
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+        except psycopg2.extensions.QueryCanceledError:
+            # statement_timeout ou cancelamento: a conexão continua válida (o `putconn` desfaz a transação).
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def closeall(self):
+        """Fecha as conexões ociosas e impede que as emprestadas voltem ao pool."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    # --- Métricas ---
+
+    def stats(self) -> dict:
+        """Retorna um retrato das métricas do pool."""
+        with self._cond:
+            esperas = self._stats["esperas"]
+            return {
+                "em_uso": len(self._in_use),
+                "ociosas": len(self._idle),
+                "abertas": self._opened,
+                "minimo": self.minconn,
+                "maximo": self.maxconn,
+                "aguardando": self._waiting,
+                "tempo_medio_espera_ms": round(self._wait_total / esperas * 1000, 2) if esperas else 0.0,
+                "tempo_max_espera_ms": round(self._wait_max * 1000, 2),
+                **self._stats,
+            }
+
+    # --- Internos ---
+
+    def _acquire_slot(self, deadline: float):
+        # Retorna (conexão ociosa, instante de devolução) ou (None, None) quando uma vaga para
+        # uma NOVA conexão foi reservada. Espera pelo `Condition` se o pool estiver esgotado.
+        with self._cond:
+            started = None
+            try:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError(f"[{self.name}] O pool foi encerrado.")
+                    if self._idle:
+                        # LIFO: a conexão usada mais recentemente tem mais chance de estar saudável.
+                        return self._idle.pop()
+                    if self._opened < self.maxconn:
+                        self._opened += 1
+                        return None, None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"[{self.name}] Nenhuma conexão livre em {self.timeout}s ({self.maxconn} em uso)."
+                        )
+                    if started is None:
+                        started = time.monotonic()
+                        self._stats["esperas"] += 1
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            finally:
+                if started is not None:
+                    waited = time.monotonic() - started
+                    self._wait_total += waited
+                    self._wait_max = max(self._wait_max, waited)
+
+    def _release_slot(self, discarded: bool = False):
+        with self._cond:
+            self._opened -= 1
+            if discarded:
+                self._stats["descartadas"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        # Ociosa há muito tempo: o servidor (ou um proxy/SSL) pode ter derrubado a conexão.
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,274 @@
+# =============================================================================
+# RESOLUÇÃO DE NOMES DE CLIENTES (TRIGRAMAS, EM MEMÓRIA)
+#
+# Perguntas como "quantas operações a Porto fez?" levavam o LLM a gerar
+# `nome_razao_social = 'Porto'` (que erra quando a razão social é "Porto Vieira
+# S/A") ou `ILIKE '%porto%'` (que varre a tabela inteira). Este módulo encontra,
+# ANTES da geração do SQL, os clientes citados na pergunta e entrega os seus ids
+# ao prompt, para que a query filtre pela coluna indexada `cliente_id`.
+#
+# Como funciona:
+# 1. Os nomes dos clientes são lidos do banco e mantidos em memória (recarregados
+#    a cada ENTITY_RESOLVER_REFRESH_SECONDS), sem acentos e em minúsculas.
+# 2. Cada nome é quebrado em "janelas" de palavras consecutivas, e cada janela em
+#    trigramas no mesmo formato do pg_trgm, com um índice invertido trigrama -> janelas.
+# 3. Os trechos da pergunta com cara de nome próprio (entre aspas ou com inicial
+#    maiúscula) são comparados às janelas pela similaridade de trigramas, o que
+#    tolera variações como "Souza"/"Sousa" ou "Camara"/"Câmara".
+# =============================================================================
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from .config import settings
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+# Palavras de uma razão social que não identificam o cliente (ex: "Pacheco S.A." ~ "Pacheco",
+# "Jesus e Filhos" ~ "Jesus").
+_LEGAL_SUFFIXES = {"ltda", "sa", "s/a", "me", "ei", "epp", "eireli", "cia", "filhos"}
+# Palavras que podem aparecer capitalizadas no início da pergunta ou entre nomes, mas não são nomes.
+_STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "para", "pela", "pelo", "com", "em", "no", "na",
+    "qual", "quais", "quanto", "quantos", "quantas", "quando", "como", "onde", "mostre", "liste", "me",
+    "cliente", "clientes", "empresa", "operacao", "operacoes", "total", "valor",
+}
+# Trechos entre aspas simples ou duplas (ex: o cliente 'Porto').
+_QUOTED = re.compile(r"['\"“”‘’]([^'\"“”‘’]{3,})['\"“”‘’]")
+_WORD = re.compile(r"[\w/]+")
+# Conectores que podem aparecer no meio de um nome ("Jesus e Filhos", "Luiz Fernando da Cunha").
+_CONNECTORS = {"e", "da", "de", "do", "dos", "das"}
+# Tamanho máximo (em palavras) de um trecho da pergunta comparado aos nomes.
+_MAX_PHRASE_WORDS = 4
+# Só entram os clientes com similaridade próxima da do melhor: "Stella Camara" resolve para
+# "Stella Câmara" (1.0), e não para todos os "Câmara" (0.54).
+_SCORE_MARGIN = 0.05
+
+
+def _normalize(text: str) -> str:
+    # Sem acentos e em minúsculas: "Câmara" e "camara" ficam iguais.
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def _words(text: str) -> list[str]:
+    # Pontos são removidos antes para que "S.A." vire "sa" (e seja reconhecido como sufixo).
+    return _WORD.findall(_normalize(text).replace(".", ""))
+
+
+def _spans(words: list[str]) -> list[tuple[int, int]]:
+    """Sequências de até _MAX_PHRASE_WORDS palavras que não começam nem terminam em um conector."""
+    return [
+        (start, end)
+        for start in range(len(words))
+        for end in range(start + 1, min(start + _MAX_PHRASE_WORDS, len(words)) + 1)
+        if words[start] not in _CONNECTORS and words[end - 1] not in _CONNECTORS
+    ]
+
+
+def trigrams(text: str) -> frozenset[str]:
+    """Trigramas no formato do pg_trgm: cada palavra recebe dois espaços antes e um depois."""
+    result = set()
+    for word in re.findall(r"[a-z0-9]+", _normalize(text)):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(result)
+
+
+class ClientNameResolver:
+    """
+    Índice de trigramas (em memória) dos nomes dos clientes, com recarga periódica.
+    Thread-safe: a recarga troca o índice inteiro de uma vez, sob um lock.
+    """
+
+    def __init__(self, min_similarity: float = 0.5, max_ids: int = 10, refresh_seconds: float = 300):
+        self._min_similarity = min_similarity
+        self._max_ids = max_ids
+        self._refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: float | None = None
+        # (id -> nome, janelas [(ids dos clientes, trigramas)], trigrama -> posições nas janelas),
+        # trocado de uma vez na recarga: quem está resolvendo continua com a versão que pegou.
+        self._index: tuple[dict, list, dict] = ({}, [], {})
+        self._stats = {"perguntas": 0, "clientes_resolvidos": 0, "recargas": 0, "falhas_recarga": 0}
+
+    # --- Índice ---
+
+    def load(self, clients: list[tuple[int, str]]):
+        """(Re)constrói o índice a partir de pares (id, nome)."""
+        names, owners = {}, {}
+        for client_id, name in clients:
+            names[client_id] = name
+            words = [word for word in _words(name) if word not in _LEGAL_SUFFIXES]
+            # Todas as sequências de palavras consecutivas: "Porto Vieira" gera "porto", "vieira" e "porto vieira".
+            # Janelas repetidas (sobrenomes comuns) são guardadas uma única vez, com todos os seus clientes.
+            for start, end in _spans(words):
+                owners.setdefault(" ".join(words[start:end]), []).append(client_id)
+        windows, postings = [], {}
+        for text, client_ids in owners.items():
+            grams = trigrams(text)
+            if not grams:
+                continue
+            for gram in grams:
+                postings.setdefault(gram, []).append(len(windows))
+            windows.append((client_ids, grams))
+        with self._lock:
+            self._index = (names, windows, postings)
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self._refresh_seconds
+        if fresh:
+            return
+        from .database import db
+        try:
+            with db.cursor() as cur:
+                cur.execute("SELECT id, nome_razao_social FROM clientes")
+                clients = cur.fetchall()
+            self.load(clients)
+            self._count("recargas")
+            logger.info(f"Índice de nomes de clientes carregado ({len(clients)} clientes).")
+        except Exception as e:
+            # Sem o índice, a pergunta segue sem ids (o LLM ainda pode filtrar pelo nome).
+            # A falha não é guardada: a próxima pergunta tenta carregar de novo.
+            self._count("falhas_recarga")
+            logger.warning(f"Não foi possível carregar os nomes dos clientes: {e}")
+
+    def warm_up(self):
+        """Carrega os nomes (ex: na inicialização da API); lança exceção se não conseguir."""
+        self._ensure_loaded()
+        with self._lock:
+            loaded = self._loaded_at is not None
+        if not loaded:
+            raise RuntimeError("Não foi possível carregar os nomes dos clientes.")
+
+    # --- Resolução ---
+
+    def _best_matches(self, phrase: str, windows: list, postings: dict) -> dict[int, float]:
+        grams = trigrams(phrase)
+        if not grams:
+            return {}
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for position in postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        best: dict[int, float] = {}
+        for position, count in shared.items():
+            client_ids, window = windows[position]
+            # Similaridade do pg_trgm: trigramas em comum / trigramas distintos dos dois textos.
+            similarity = count / (len(grams) + len(window) - count)
+            if similarity < self._min_similarity:
+                continue
+            for client_id in client_ids:
+                if similarity > best.get(client_id, 0):
+                    best[client_id] = similarity
+        return best
+
+    def _candidate_phrases(self, question: str) -> list[str]:
+        """Trechos da pergunta que parecem nomes: entre aspas ou sequências de palavras com inicial maiúscula."""
+        phrases = [match.strip() for match in _QUOTED.findall(question)]
+        outside_quotes = _QUOTED.sub(" ", question)
+        tokens = _WORD.findall(outside_quotes.replace(".", ""))
+        run: list[str] = []
+        for token in tokens + [""]:
+            capitalized = token[:1].isupper() and _normalize(token) not in _STOPWORDS
+            # Conectores dentro de nomes não interrompem a sequência.
+            connector = run and _normalize(token) in _CONNECTORS
+            if capitalized or connector:
+                run.append(token)
+                continue
+            while run and _normalize(run[-1]) in _CONNECTORS:
+                run.pop()
+            if run:
+                phrases.append(" ".join(run))
+            run = []
+        return phrases
+
+    def resolve(self, question: str) -> list[dict]:
+        """
+        Encontra os clientes citados na pergunta.
+
+        Returns:
+            Uma lista com um item por trecho resolvido: o texto da pergunta e os clientes
+            (id, nome e similaridade), do mais para o menos parecido. Trechos que casam com
+            mais de `max_ids` clientes são considerados ambíguos e ficam de fora.
+        """
+        if not question:
+            return []
+        self._ensure_loaded()
+        self._count("perguntas")
+        with self._lock:
+            names, windows, postings = self._index
+        resolved = []
+        for phrase in self._candidate_phrases(question):
+            words = [word for word in _words(phrase) if word not in _LEGAL_SUFFIXES]
+            # Avalia todas as sub-sequências do trecho e fica com as melhores que não se sobrepõem,
+            # pesando a similaridade pelo número de palavras: "Souza Pacheco" prefere "Sousa Pacheco"
+            # (0.65 x 2) a "Souza" + "Pacheco" isolados (1.0 x 1), mas "Jesus e Filhos e da Costa"
+            # ainda resolve "jesus" e "costa" separadamente.
+            scored = []
+            for start, end in _spans(words):
+                text = " ".join(words[start:end])
+                if len(text) < 3 or text in _STOPWORDS:
+                    continue
+                matches = self._best_matches(text, windows, postings)
+                if matches:
+                    best = max(matches.values())
+                    scored.append((best * (end - start), best, -start, start, end, text, matches))
+            used: set[int] = set()
+            for _, best, _, start, end, text, matches in sorted(scored, reverse=True):
+                if used & set(range(start, end)):
+                    continue
+                used.update(range(start, end))
+                clients = sorted(((client_id, score) for client_id, score in matches.items() if score >= best - _SCORE_MARGIN),
+                                 key=lambda item: (-item[1], item[0]))
+                if len(clients) > self._max_ids:
+                    logger.info(f"Trecho '{text}' ambíguo: {len(clients)} clientes parecidos.")
+                    continue
+                resolved.append({
+                    "trecho": text,
+                    "clientes": [{"id": client_id, "nome": names.get(client_id, ""), "similaridade": round(score, 2)}
+                                 for client_id, score in clients],
+                })
+                self._count("clientes_resolvidos", len(clients))
+        return resolved
+
+    def prompt_hint(self, question: str) -> str:
+        """Texto com os clientes resolvidos para o prompt de SQL (vazio se nenhum for encontrado)."""
+        try:
+            resolved = self.resolve(question)
+        except Exception as e:
+            logger.warning(f"Erro ao resolver nomes de clientes: {e}")
+            return ""
+        if not resolved:
+            return ""
+        lines = ["Clientes identificados na pergunta (se a pergunta se refere a eles, filtre por cliente_id):"]
+        for item in resolved:
+            clients = ", ".join(f"{client['id']} ({client['nome']})" for client in item["clientes"])
+            lines.append(f"- '{item['trecho']}': cliente_id IN ({', '.join(str(c['id']) for c in item['clientes'])}) -> {clients}")
+        hint = "\n".join(lines) + "\n"
+        logger.info(f"Clientes resolvidos para o SQL: {hint.strip()}")
+        return hint
+
+    # --- Métricas ---
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "clientes_indexados": len(self._index[0])}
+
+
+# Instância única, usada pela cadeia do chat antes da geração do SQL.
+client_resolver = ClientNameResolver(
+    min_similarity=settings.ENTITY_RESOLVER_MIN_SIMILARITY,
+    max_ids=settings.ENTITY_RESOLVER_MAX_IDS,
+    refresh_seconds=settings.ENTITY_RESOLVER_REFRESH_SECONDS,
+)
@@ -0,0 +1,398 @@
+# =============================================================================
+# CONSULTOR DE ÍNDICES BASEADO NA CARGA REAL DO CHAT
+#
+# As queries geradas pelo LLM filtram por colunas que o schema original não
+# indexa (ex: `codigo_rastreio`, `uf_destino`, `tipo`). Este módulo:
+# 1. Registra a carga: cada SQL executado pelo chat, normalizado (literais
+#    trocados por `?`) para que perguntas iguais com valores diferentes contem
+#    como a mesma query. O registro é limitado (LRU) e fica só em memória.
+# 2. Extrai, por expressões regulares, as colunas usadas em filtros (WHERE),
+#    junções (ON), agrupamentos (GROUP BY) e ordenações (ORDER BY), resolvendo
+#    os aliases das tabelas do FROM/JOIN a partir do catálogo do banco.
+# 3. Monta índices candidatos (uma coluna, e compostos com os filtros de uma
+#    mesma tabela), descartando os já cobertos por um índice existente.
+# 4. Estima o benefício com EXPLAIN sobre índices HIPOTÉTICOS (extensão HypoPG):
+#    nada é criado de verdade e o planejador diz quanto cada query ficaria mais
+#    barata. Sem a extensão, os candidatos são listados sem estimativa.
+# 5. Opcionalmente (INDEX_ADVISOR_ALLOW_APPLY), cria os índices sugeridos com
+#    `CREATE INDEX CONCURRENTLY`, sem bloquear as escritas na tabela.
+# =============================================================================
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .config import settings
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+# Literais trocados por `?` na normalização (texto entre aspas e números soltos).
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# `FROM` dentro de funções (`EXTRACT(YEAR FROM data_emissao)`) não inicia uma cláusula.
+_FUNCTION_FROM = re.compile(r"(\b(?:extract|substring|trim|overlay)\s*\([^()]*?)\bfrom\b", re.I)
+# Tabelas do FROM/JOIN, com alias opcional (`FROM operacoes_logisticas o`, `JOIN clientes AS c`).
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+([a-z_]\w*)(?:\s+(?:as\s+)?([a-z_]\w*))?", re.I)
+# Cláusulas que delimitam os trechos analisados; o tipo do trecho vem da palavra que o abre.
+_CLAUSE = re.compile(r"\b(select|from|join|on|where|group\s+by|order\s+by|having|limit|offset|union)\b", re.I)
+# Referências a colunas, qualificadas (`o.status`) ou não (`status`).
+_COLUMN_REF = re.compile(r"\b(?:([a-z_]\w*)\.)?([a-z_]\w*)\b(?!\s*\()", re.I)
+# Palavras que podem aparecer logo depois do nome da tabela, mas não são aliases.
+_NOT_ALIAS = {
+    "where", "join", "on", "inner", "left", "right", "full", "cross", "natural", "group", "order",
+    "having", "limit", "offset", "union", "using", "as", "and", "or",
+}
+# Tipo de uso de cada cláusula (as demais, como SELECT e LIMIT, não sugerem índices).
+_CLAUSE_USAGE = {"where": "filtro", "having": "filtro", "on": "juncao", "group by": "agrupamento", "order by": "ordenacao"}
+# Usos que entram nos índices candidatos (em ordem de prioridade).
+_CANDIDATE_USAGES = ("filtro", "juncao", "agrupamento", "ordenacao")
+
+
+def normalize_sql(sql: str) -> str:
+    """Impressão digital da query: literais viram `?`, espaços são colapsados e tudo fica minúsculo."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return " ".join(sql.lower().split()).rstrip(";").strip()
+
+
+def extract_columns(sql: str, catalog: dict[str, set[str]]) -> dict[tuple[str, str], set[str]]:
+    """
+    Extrai as colunas usadas em filtros, junções, agrupamentos e ordenações de uma query.
+
+    Args:
+        sql: A query (de preferência já normalizada, sem literais).
+        catalog: Tabelas conhecidas -> conjunto de suas colunas.
+
+    Returns:
+        Um dicionário (tabela, coluna) -> conjunto de usos ("filtro", "juncao", ...).
+        Colunas que não pertencem a nenhuma tabela do FROM/JOIN são ignoradas.
+    """
+    sql = _FUNCTION_FROM.sub(r"\1,", _STRING_LITERAL.sub("?", sql))
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        table = table.lower()
+        if table not in catalog:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias.lower()] = table
+    tables = set(aliases.values())
+
+    usages: dict[tuple[str, str], set[str]] = {}
+    parts = _CLAUSE.split(sql)
+    # `split` com grupo alterna [texto, cláusula, texto, cláusula, texto...].
+    for clause, text in zip(parts[1::2], parts[2::2]):
+        usage = _CLAUSE_USAGE.get(" ".join(clause.lower().split()))
+        if not usage:
+            continue
+        for qualifier, column in _COLUMN_REF.findall(text):
+            qualifier, column = qualifier.lower(), column.lower()
+            if qualifier:
+                owners = [aliases[qualifier]] if qualifier in aliases else []
+            else:
+                owners = [table for table in tables if column in catalog[table]]
+            # Coluna não qualificada presente em mais de uma tabela: ambígua, não dá para decidir.
+            if len(owners) == 1 and column in catalog[owners[0]]:
+                usages.setdefault((owners[0], column), set()).add(usage)
+    return usages
+
+
+class IndexAdvisor:
+    """
+    Registro (thread-safe e limitado) da carga de SQL do chat e geração de sugestões de índices.
+    O acesso ao banco é feito apenas em `suggest()` e `apply()`, pelo `DatabaseManager`.
+    """
+
+    def __init__(self, max_queries: int = 500):
+        self._max_queries = max_queries
+        self._queries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_suggestions: dict[str, dict] = {}
+
+    # --- Registro da carga ---
+
+    def record(self, sql: str, duration_ms: float):
+        """Registra uma execução de query (apenas uma única SELECT/WITH) com o seu tempo de execução."""
+        from .database import UnsafeQueryError, validate_readonly_query
+
+        try:
+            # O exemplo vai para um EXPLAIN em `suggest()`: só entra o que passaria pela rota de leitura.
+            sql = validate_readonly_query(sql or "")
+        except UnsafeQueryError:
+            return
+        fingerprint = normalize_sql(sql)
+        with self._lock:
+            entry = self._queries.pop(fingerprint, None) or {"execucoes": 0, "tempo_total_ms": 0.0}
+            entry["execucoes"] += 1
+            entry["tempo_total_ms"] += duration_ms
+            entry["exemplo"] = sql  # Última versão com literais, usada no EXPLAIN.
+            entry["ultima_execucao"] = time.time()
+            self._queries[fingerprint] = entry
+            # Descarte LRU: as queries menos recentes saem primeiro.
+            while len(self._queries) > self._max_queries:
+                self._queries.popitem(last=False)
+
+    def workload(self) -> list[dict]:
+        """Retorna a carga registrada, das queries com mais tempo acumulado para as com menos."""
+        with self._lock:
+            items = [{"query": fingerprint, **entry} for fingerprint, entry in self._queries.items()]
+        for item in items:
+            item["tempo_medio_ms"] = round(item["tempo_total_ms"] / item["execucoes"], 2)
+            item["tempo_total_ms"] = round(item["tempo_total_ms"], 2)
+        return sorted(items, key=lambda item: item["tempo_total_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+            self._last_suggestions = {}
+
+    # --- Sugestões ---
+
+    def suggest(self, min_benefit_pct: float | None = None) -> dict:
+        """
+        Analisa a carga registrada e retorna os índices sugeridos, do maior para o menor benefício.
+        O benefício é a redução (em %) do custo estimado pelo planejador, somado em todas as
+        execuções das queries afetadas, com o índice hipotético em relação ao plano atual.
+        """
+        from .database import db
+
+        if min_benefit_pct is None:
+            min_benefit_pct = settings.INDEX_ADVISOR_MIN_BENEFIT_PCT
+        queries = self.workload()
+
+        # Pool SOMENTE-LEITURA: os exemplos são SQL do LLM, com literais.
+        with db.connection(readonly=True) as conn:
+            try:
+                with conn.cursor() as cur:
+                    # Nada desta análise escreve no banco: os índices hipotéticos vivem só na sessão.
+                    cur.execute("SET TRANSACTION READ ONLY")
+                    catalog = _load_catalog(cur)
+                    existing = _load_existing_indexes(cur)
+                    candidates = _build_candidates(queries, catalog, existing)
+                    hypopg = _has_hypopg(cur)
+                    if hypopg:
+                        _estimate_benefits(cur, candidates)
+            finally:
+                # Descarta a transação (e qualquer índice hipotético) antes de devolver a conexão.
+                conn.rollback()
+
+        suggestions = sorted(candidates.values(), key=lambda c: c["beneficio_estimado_pct"] or 0, reverse=True)
+        if hypopg:
+            suggestions = [c for c in suggestions if (c["beneficio_estimado_pct"] or 0) >= min_benefit_pct]
+        with self._lock:
+            self._last_suggestions = {c["nome"]: c for c in suggestions}
+        return {
+            "queries_analisadas": len(queries),
+            "metodo": "hypopg" if hypopg else "sem_estimativa",
+            "aviso": None if hypopg else "Extensão hypopg não instalada: candidatos listados sem estimativa de benefício.",
+            "beneficio_minimo_pct": min_benefit_pct,
+            "sugestoes": [public_suggestion(c) for c in suggestions],
+        }
+
+    # --- Aplicação (opt-in) ---
+
+    def apply(self, names: list[str]) -> list[dict]:
+        """
+        Cria, com `CREATE INDEX CONCURRENTLY`, os índices de nomes informados entre as últimas
+        sugestões de `suggest()`. Roda em uma conexão dedicada (fora dos pools) e em autocommit,
+        como o CONCURRENTLY exige, e sem `statement_timeout` (a criação pode levar minutos).
+        """
+        from .database import db
+
+        with self._lock:
+            unknown = [name for name in names if name not in self._last_suggestions]
+            chosen = [self._last_suggestions[name] for name in names if name in self._last_suggestions]
+        results = [{"nome": name, "criado": False, "erro": "Índice não está entre as sugestões atuais."} for name in unknown]
+
+        conn = db.open_dedicated_connection(autocommit=True)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = 0")
+                for candidate in chosen:
+                    started = time.monotonic()
+                    try:
+                        _create_index(cur, candidate)
+                        results.append({"nome": candidate["nome"], "criado": True, "tempo_s": round(time.monotonic() - started, 2)})
+                        logger.info(f"Índice sugerido criado: {candidate['definicao']}")
+                    except Exception as e:
+                        logger.error(f"Erro ao criar o índice {candidate['nome']}: {e}")
+                        results.append({"nome": candidate["nome"], "criado": False, "erro": str(e)})
+        finally:
+            conn.close()
+        with self._lock:
+            for result in results:
+                if result["criado"]:
+                    self._last_suggestions.pop(result["nome"], None)
+        return results
+
+
+# --- Funções auxiliares (catálogo, candidatos, estimativa e criação) ---
+
+def _load_catalog(cur) -> dict[str, set[str]]:
+    cur.execute("""
+        SELECT c.relname, a.attname
+        FROM pg_class c
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE c.relnamespace = CAST(current_schema() AS regnamespace)
+          AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    """)
+    catalog: dict[str, set[str]] = {}
+    for table, column in cur.fetchall():
+        catalog.setdefault(table, set()).add(column)
+    return catalog
+
+
+def _load_existing_indexes(cur) -> dict[str, list[tuple[str, ...]]]:
+    """Tabela -> colunas (em ordem) de cada índice existente, inclusive os das chaves."""
+    cur.execute("""
+        SELECT t.relname, array_agg(a.attname ORDER BY k.ordinality)
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ordinality)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE t.relnamespace = CAST(current_schema() AS regnamespace) AND NOT t.relispartition
+        GROUP BY t.relname, i.indexrelid
+    """)
+    existing: dict[str, list[tuple[str, ...]]] = {}
+    for table, columns in cur.fetchall():
+        existing.setdefault(table, []).append(tuple(columns))
+    return existing
+
+
+def _index_name(table: str, columns: tuple[str, ...]) -> str:
+    # Mesmo padrão dos índices de `criar_tabelas.py` (ex: idx_operacoes_uf_destino_emissao).
+    prefix = table.split("_")[0]
+    return f"idx_{prefix}_{'_'.join(columns)}"[:63]
+
+
+def _build_candidates(queries: list[dict], catalog: dict, existing: dict) -> dict[str, dict]:
+    candidates: dict[str, dict] = {}
+    for query in queries:
+        usages = extract_columns(query["query"], catalog)
+        by_table: dict[str, list[str]] = {}
+        for usage in _CANDIDATE_USAGES:
+            for (table, column), kinds in usages.items():
+                if usage in kinds and column not in by_table.setdefault(table, []):
+                    by_table[table].append(column)
+        for table, columns in by_table.items():
+            filters = [column for column in columns if "filtro" in usages[(table, column)]]
+            options = [(column,) for column in columns]
+            if len(filters) > 1:
+                # Composto com os filtros da mesma tabela (até 3 colunas, na ordem em que aparecem).
+                options.append(tuple(filters[:3]))
+            for option in options:
+                # Já coberto se algum índice existente começa com estas colunas.
+                if any(index[:len(option)] == option for index in existing.get(table, [])):
+                    continue
+                name = _index_name(table, option)
+                candidate = candidates.setdefault(name, {
+                    "nome": name,
+                    "tabela": table,
+                    "colunas": list(option),
+                    "definicao": f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(option)})",
+                    "usos": sorted(set().union(*(usages[(table, column)] for column in option))),
+                    "execucoes": 0,
+                    "custo_atual": None,
+                    "custo_com_indice": None,
+                    "beneficio_estimado_pct": None,
+                    "_queries": [],
+                })
+                candidate["execucoes"] += query["execucoes"]
+                candidate["_queries"].append(query)
+    for candidate in candidates.values():
+        candidate["queries_afetadas"] = len(candidate["_queries"])
+    return candidates
+
+
+def _has_hypopg(cur) -> bool:
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'hypopg')")
+    return cur.fetchone()[0]
+
+
+def _plan_cost(cur, sql: str) -> float | None:
+    from .database import UnsafeQueryError, validate_readonly_query
+
+    try:
+        # Validada de novo aqui: o EXPLAIN não pode carregar uma segunda instrução.
+        sql = validate_readonly_query(sql)
+    except UnsafeQueryError as e:
+        logger.warning(f"Query ignorada na análise de índices: {e}")
+        return None
+    try:
+        cur.execute("SAVEPOINT advisor_explain")
+        cur.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cur.fetchone()[0]
+        cur.execute("RELEASE SAVEPOINT advisor_explain")
+        return float(plan[0]["Plan"]["Total Cost"])
+    except Exception as e:
+        # Query que deixou de ser válida (ex: coluna renomeada): fica fora da estimativa.
+        cur.execute("ROLLBACK TO SAVEPOINT advisor_explain")
+        logger.warning(f"EXPLAIN falhou durante a análise de índices: {e}")
+        return None
+
+
+def _estimate_benefits(cur, candidates: dict[str, dict]):
+    # Custo atual de cada query, calculado uma única vez (sem nenhum índice hipotético).
+    baseline: dict[str, float | None] = {}
+    for candidate in candidates.values():
+        for query in candidate["_queries"]:
+            if query["exemplo"] not in baseline:
+                baseline[query["exemplo"]] = _plan_cost(cur, query["exemplo"])
+
+    for candidate in candidates.values():
+        columns = ", ".join(candidate["colunas"])
+        # Em tabela particionada, o planejador usa os índices das partições: cria um hipotético em cada uma.
+        for relation in _relations_of(cur, candidate["tabela"]):
+            cur.execute("SELECT * FROM hypopg_create_index(%s)", (f"CREATE INDEX ON {relation} ({columns})",))
+        current = hypothetical = 0.0
+        for query in candidate["_queries"]:
+            before, after = baseline[query["exemplo"]], _plan_cost(cur, query["exemplo"])
+            if before is None or after is None:
+                continue
+            current += before * query["execucoes"]
+            hypothetical += min(after, before) * query["execucoes"]
+        cur.execute("SELECT hypopg_reset()")
+        if current > 0:
+            candidate["custo_atual"] = round(current, 2)
+            candidate["custo_com_indice"] = round(hypothetical, 2)
+            candidate["beneficio_estimado_pct"] = round(100 * (current - hypothetical) / current, 1)
+
+
+def _relations_of(cur, table: str) -> list[str]:
+    """A própria tabela ou, se particionada, cada uma de suas partições finais."""
+    cur.execute("""
+        SELECT COALESCE(array_agg(relid::text) FILTER (WHERE isleaf), ARRAY[%s])
+        FROM pg_partition_tree(CAST(%s AS regclass))
+    """, (table, table))
+    return cur.fetchone()[0]
+
+
+def _create_index(cur, candidate: dict):
+    table, columns = candidate["tabela"], ", ".join(candidate["colunas"])
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(%s AS regclass)", (table,))
+    if not cur.fetchone()[0]:
+        cur.execute(candidate["definicao"])
+        return
+    # Tabela particionada não aceita CONCURRENTLY: cria o índice (inválido) só no pai, cada partição
+    # concorrentemente e então os anexa; com todas anexadas, o índice do pai passa a ser válido.
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {candidate['nome']} ON ONLY {table} ({columns})")
+    for partition in _relations_of(cur, table):
+        child = f"{partition}_{'_'.join(candidate['colunas'])}_idx"[:63]
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({columns})")
+        cur.execute("""
+            SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(%s AS regclass))
+        """, (child,))
+        if not cur.fetchone()[0]:
+            cur.execute(f"ALTER INDEX {candidate['nome']} ATTACH PARTITION {child}")
+
+
+def public_suggestion(candidate: dict) -> dict:
+    """Sugestão sem os campos internos (queries de exemplo), para as respostas da API."""
+    return {key: value for key, value in candidate.items() if not key.startswith("_")}
+
+
+# Instância única, alimentada pela cadeia do chat e consultada pelas rotas de `/api/indices`.
+advisor = IndexAdvisor(max_queries=settings.INDEX_ADVISOR_MAX_QUERIES)
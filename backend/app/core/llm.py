@@ -4,12 +4,20 @@
 # O propósito deste arquivo é centralizar e abstrair a criação das instâncias
 # dos modelos de linguagem (LLMs). Ao invés de configurar o ChatGroq em vários
 # lugares, criamos funções "fábrica" que retornam um modelo já configurado.
+#
+# Cada fábrica cria o seu cliente UMA única vez (cache): todas as cadeias
+# compartilham o mesmo cliente HTTP e, com ele, as conexões já abertas com a
+# Groq. Criar o cliente não acessa a rede; `ping_llms()` (chamada no aquecimento
+# da API) faz uma chamada mínima para abrir essas conexões antes do 1º usuário.
 # =============================================================================
 
 # --- Bloco de Importações ---
+import asyncio
+from functools import lru_cache
 from langchain_groq import ChatGroq
 from .config import settings
 
+@lru_cache(maxsize=1)
 def get_llm() -> ChatGroq:
     """
     Retorna uma instância configurada do LLM da Groq para a tarefa pesada de
@@ -25,6 +33,7 @@ def get_llm() -> ChatGroq:
         temperature=0.0
     )
 
+@lru_cache(maxsize=1)
 def get_answer_llm() -> ChatGroq:
     """
     Retorna uma instância configurada do LLM da Groq para a tarefa mais simples de
@@ -37,4 +46,14 @@ def get_answer_llm() -> ChatGroq:
         
         # frases mais fluidas e naturais, sem se tornar aleatório ou imprevisível.
         temperature=0.3
-    )
\ No newline at end of file
+    )
+
+async def ping_llms():
+    """
+    Aquecimento: uma chamada assíncrona mínima (1 token) a cada modelo, pelo mesmo cliente
+    assíncrono usado pela cadeia do chat, abrindo as conexões TLS antes da primeira pergunta.
+    """
+    await asyncio.gather(
+        get_llm().ainvoke("ping", max_tokens=1),
+        get_answer_llm().ainvoke("ping", max_tokens=1),
+    )
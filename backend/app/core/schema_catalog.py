@@ -0,0 +1,223 @@
+# =============================================================================
+# CATÁLOGO DO SCHEMA ENVIADO AO LLM (VERSIONADO, COM SNAPSHOT EM DISCO)
+#
+# O schema compacto (tabelas, colunas, tipos e valores dos ENUMs) vai como
+# CONTEXTO no prompt de geração de SQL. Antes ele era lido com uma consulta ao
+# `information_schema` por tabela e uma por coluna ENUM, guardado para sempre
+# e, se a leitura falhasse uma vez, o texto de erro ia para o LLM até o restart.
+#
+# Como funciona:
+# 1. UMA consulta ao `pg_catalog` traz as colunas de todas as tabelas, com os
+#    valores dos ENUMs já agregados.
+# 2. O texto gerado é versionado por um hash: a revalidação (a cada
+#    SCHEMA_REFRESH_SECONDS, em segundo plano, servindo a versão atual enquanto
+#    isso) só troca o schema quando um DDL mudou o hash.
+# 3. Falhas NUNCA vão para o cache: com uma versão anterior, ela continua sendo
+#    servida; sem nenhuma, a exceção é propagada e a próxima chamada tenta de novo.
+# 4. Cada versão nova é salva em SCHEMA_SNAPSHOT_PATH: os workers sobem lendo o
+#    arquivo, sem tocar no catálogo, e o revalidam depois.
+# =============================================================================
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .config import settings
+from .database import db
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+# Tabelas descritas para o LLM, nesta ordem.
+_TABLES = ["clientes", "operacoes_logisticas"]
+
+# Colunas de todas as tabelas em uma única consulta. `format_type` devolve o nome do tipo ENUM
+# (o `information_schema` devolve apenas "USER-DEFINED"), e os valores vêm em um array por coluna.
+_CATALOG_QUERY = """
+    SELECT c.relname, a.attname, format_type(a.atttypid, NULL),
+           CASE WHEN t.typtype = 'e' THEN
+               ARRAY(SELECT e.enumlabel::text FROM pg_enum e WHERE e.enumtypid = t.oid ORDER BY e.enumsortorder)
+           END
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t ON t.oid = a.atttypid
+    WHERE n.nspname = ANY(current_schemas(false)) AND c.relname = ANY(%(tables)s)
+    ORDER BY array_position(%(tables)s, c.relname::text), a.attnum
+"""
+
+
+def _render(rows) -> str:
+    """Monta o texto compacto enviado ao LLM a partir das linhas do catálogo."""
+    tables: dict[str, list[str]] = {}
+    for table, column, data_type, enum_values in rows:
+        if enum_values:
+            values = ", ".join(f"'{value}'" for value in enum_values)
+            tables.setdefault(table, []).append(f"{column} ({data_type}, valores possíveis: {values})")
+        else:
+            tables.setdefault(table, []).append(f"{column} ({data_type})")
+    return "\n\n".join(f"Tabela: {table}\nColunas: {', '.join(columns)}" for table, columns in tables.items())
+
+
+def _version(schema: str) -> str:
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+def _origin() -> str:
+    # Um snapshot só vale para o mesmo banco (ex: não reaproveitar o de homologação em produção).
+    return f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+
+
+class SchemaCatalog:
+    """Schema compacto em memória, revalidado periodicamente e persistido em disco."""
+
+    def __init__(self, refresh_seconds: float, snapshot_path: str):
+        self._refresh_seconds = refresh_seconds
+        self._snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._schema: str | None = None
+        self._version: str | None = None
+        # Instante (relógio de parede, para valer também entre processos via snapshot) da última leitura do catálogo.
+        self._checked_at = 0.0
+        self._source: str | None = None
+        self._refreshing = False
+        self._refresh_thread: threading.Thread | None = None
+        self._closed = False
+        self._stats = {"leituras_catalogo": 0, "mudancas_de_versao": 0, "falhas": 0, "revalidacoes_em_segundo_plano": 0}
+
+    # --- Leitura do catálogo ---
+
+    def refresh(self) -> str:
+        """
+        Lê o catálogo (uma consulta) e troca o schema se a versão mudou, salvando o snapshot.
+        Lança exceção se o banco falhar; a versão anterior, se houver, é mantida.
+        """
+        start_time = time.monotonic()
+        try:
+            with db.cursor() as cur:
+                cur.execute(_CATALOG_QUERY, {"tables": _TABLES})
+                rows = cur.fetchall()
+            if not rows:
+                raise RuntimeError(f"Nenhuma das tabelas {', '.join(_TABLES)} foi encontrada no banco.")
+        except Exception:
+            with self._lock:
+                self._stats["falhas"] += 1
+            raise
+        schema = _render(rows)
+        version = _version(schema)
+        with self._lock:
+            changed = version != self._version
+            self._schema, self._version, self._checked_at = schema, version, time.time()
+            self._source = "catalogo"
+            self._stats["leituras_catalogo"] += 1
+            self._stats["mudancas_de_versao"] += int(changed)
+        if changed:
+            logger.info(f"Schema do banco carregado do catálogo (versão {version}) "
+                        f"em {(time.monotonic() - start_time) * 1000:.0f} ms.")
+            self._save_snapshot(schema, version)
+        return schema
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # A versão atual continua sendo servida; a próxima chamada após o intervalo tenta de novo.
+            logger.warning(f"Falha ao revalidar o schema do banco: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self) -> str:
+        """
+        Retorna o schema atual. Sem nenhuma versão carregada, lê o catálogo na hora (e propaga
+        a falha); com uma versão vencida, a serve e a revalida em segundo plano.
+        """
+        with self._lock:
+            schema = self._schema
+            stale = schema is not None and time.time() - self._checked_at >= self._refresh_seconds
+            if stale and not self._refreshing and not self._closed:
+                self._refreshing = True
+                self._stats["revalidacoes_em_segundo_plano"] += 1
+                self._refresh_thread = threading.Thread(target=self._background_refresh, name="schema-refresh", daemon=True)
+                self._refresh_thread.start()
+        if schema is None:
+            return self.refresh()
+        return schema
+
+    # --- Snapshot em disco ---
+
+    def _save_snapshot(self, schema: str, version: str):
+        if not self._snapshot_path:
+            return
+        snapshot = {"versao": version, "origem": _origin(), "tabelas": _TABLES,
+                    "verificado_em": self._checked_at, "schema": schema}
+        # Escrita atômica: outro worker nunca lê um arquivo pela metade.
+        temp_path = f"{self._snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_path, self._snapshot_path)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o snapshot do schema em {self._snapshot_path}: {e}")
+
+    def load_snapshot(self) -> bool:
+        """Carrega o schema do snapshot em disco, se existir e for deste banco. Não toca no catálogo."""
+        if not self._snapshot_path or not os.path.exists(self._snapshot_path):
+            return False
+        try:
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            schema, version = snapshot["schema"], snapshot["versao"]
+            valid = (snapshot["origem"] == _origin() and snapshot["tabelas"] == _TABLES
+                     and _version(schema) == version)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Snapshot do schema ilegível ({self._snapshot_path}): {e}")
+            return False
+        if not valid:
+            logger.info(f"Snapshot do schema ignorado ({self._snapshot_path}): é de outro banco ou está corrompido.")
+            return False
+        with self._lock:
+            self._schema, self._version = schema, version
+            self._checked_at = float(snapshot.get("verificado_em", 0))
+            self._source = "snapshot"
+        logger.info(f"Schema do banco carregado do snapshot (versão {version}).")
+        return True
+
+    # --- Inicialização e métricas ---
+
+    def warm_up(self):
+        """Carrega o schema (ex: na inicialização da API): do snapshot, se houver, ou do catálogo."""
+        if not self.load_snapshot():
+            self.refresh()
+
+    def close(self, timeout: float = 5):
+        """Impede novas revalidações e aguarda a que estiver em andamento (ex: no desligamento da API)."""
+        with self._lock:
+            self._closed = True
+            thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "versao": self._version,
+                "origem": self._source,
+                "idade_segundos": round(time.time() - self._checked_at, 1) if self._schema is not None else None,
+                **self._stats,
+            }
+
+
+# Instância única usada pela cadeia de SQL (`get_compact_db_schema`) e pela inicialização da API.
+schema_catalog = SchemaCatalog(settings.SCHEMA_REFRESH_SECONDS, settings.SCHEMA_SNAPSHOT_PATH)
+
+
+def get_compact_db_schema() -> str:
+    """
+    Retorna o schema compacto do banco para o prompt de geração de SQL.
+    Lança exceção se ele ainda não pôde ser lido (nunca devolve um texto de erro ao LLM).
+    """
+    return schema_catalog.get()
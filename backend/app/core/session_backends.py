@@ -0,0 +1,462 @@
+# =============================================================================
+# BACKENDS DE PERSISTÊNCIA DAS SESSÕES DE CHAT
+#
+# Sem persistência, as conversas vivem apenas na memória do processo: não é
+# possível rodar mais de um worker do uvicorn (a pergunta de acompanhamento
+# pode cair em outro worker, que não conhece o histórico) e todo restart apaga
+# as conversas dos usuários.
+#
+# Este módulo define um backend "plugável" para as sessões:
+# 1. `MemorySessionBackend`: comportamento original, tudo apenas em memória.
+# 2. `SQLiteSessionBackend`: arquivo SQLite compartilhado pelos workers da máquina.
+# 3. `PostgresSessionBackend`: tabelas no PostgreSQL, compartilhadas entre nós.
+#
+# Os backends persistentes funcionam assim:
+# - Escritas em lote: cada turno apenas ENFILEIRA as novas mensagens/last_sql/resumo.
+#   Uma thread escritora agrupa as operações pendentes e as grava em uma única
+#   transação, sem bloquear a resposta ao usuário. Se o lote falhar, cada sessão é
+#   regravada separadamente (uma linha ruim não derruba as demais); o que ainda
+#   falhar fica pendente, é tentado de novo depois e o cache continua valendo.
+# - Cache read-through: o `SessionStore` (em memória) continua sendo o cache.
+#   Em uma falta, a sessão é carregada do backend. Em um acerto, uma consulta
+#   barata à versão da sessão detecta se outro worker a alterou desde então.
+# =============================================================================
+
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Sequence
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+# Valor inicial do campo `last_sql` de uma sessão nova.
+DEFAULT_LAST_SQL = "Nenhuma query foi executada ainda."
+
+# Tentativas imediatas de gravar as operações de uma sessão e intervalo (s) até a próxima
+# rodada de regravação das que continuaram falhando.
+_WRITE_ATTEMPTS = 3
+_RETRY_INTERVAL_SECONDS = 30
+
+
+class SessionBackend:
+    """
+    Backend em memória (padrão): não persiste nada, mantendo o comportamento original.
+    Também define a interface que os backends persistentes implementam.
+    """
+
+    def new_session(self, session_id: str) -> dict:
+        """Cria o dicionário de dados de uma sessão nova."""
+        return {
+            "history": ChatMessageHistory(),
+            "last_sql": DEFAULT_LAST_SQL,
+            "versao": 0,
+            # Resumo acumulado da conversa e quantas mensagens do histórico ele já cobre.
+            "resumo": "",
+            "resumo_ate": 0,
+        }
+
+    def load(self, session_id: str) -> dict | None:
+        """Carrega uma sessão do armazenamento persistente (ou None se não existir)."""
+        return None
+
+    def is_current(self, session_id: str, session: dict) -> bool:
+        """Indica se a cópia em cache da sessão ainda é a versão mais recente."""
+        return True
+
+    def save_last_sql(self, session_id: str, session: dict, sql: str):
+        """Registra a última query SQL executada pela sessão."""
+        session["last_sql"] = sql
+
+    def save_summary(self, session_id: str, session: dict, summary: str, covered: int):
+        """Registra o resumo acumulado da conversa e até qual mensagem ele cobre."""
+        session["resumo"] = summary
+        session["resumo_ate"] = covered
+
+    def flush(self):
+        """Aguarda a gravação de todas as escritas pendentes."""
+
+    def close(self):
+        """Libera os recursos do backend."""
+
+
+# Alias explícito para o backend padrão.
+MemorySessionBackend = SessionBackend
+
+
+class PersistentChatMessageHistory(BaseChatMessageHistory):
+    """
+    Histórico de mensagens mantido em memória (cache) e replicado para um backend
+    persistente. É compatível com o `RunnableWithMessageHistory` do LangChain.
+    """
+
+    def __init__(self, session_id: str, session: dict, backend: "_SqlSessionBackend",
+                 messages: Sequence[BaseMessage] | None = None):
+        self.session_id = session_id
+        self.messages = list(messages or [])
+        self._session = session
+        self._backend = backend
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # Atualiza o cache imediatamente e enfileira a gravação para a thread escritora.
+        self.messages.extend(messages)
+        self._backend._enqueue(self.session_id, self._session, "mensagens",
+                               [message_to_dict(m) for m in messages])
+
+    def clear(self) -> None:
+        self.messages = []
+        self._session["resumo"] = ""
+        self._session["resumo_ate"] = 0
+        self._backend._enqueue(self.session_id, self._session, "limpar", None)
+
+
+class _SqlSessionBackend(SessionBackend):
+    """
+    Base dos backends SQL: fila de escrita em lote, versionamento e carga das sessões.
+    As subclasses fornecem a conexão, o DDL e o estilo de parâmetro do driver.
+    """
+
+    # DDL das tabelas, definido pelas subclasses.
+    DDL: tuple[str, ...] = ()
+
+    def __init__(self, flush_interval_ms: int, batch_size: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        # Quantidade de operações ainda não gravadas por sessão (chaves removidas ao zerar).
+        self._pending: dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        # Operações que falharam em todas as tentativas, por sessão, na ordem original. Continuam
+        # contadas em `_pending` (o cache segue valendo) e são regravadas antes das novas da sessão.
+        self._failed: dict[str, list[tuple]] = {}
+        self._last_retry = 0.0
+
+        self._ensure_schema()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="session-writer", daemon=True)
+        self._writer.start()
+        # Garante que as escritas pendentes sejam gravadas quando o processo encerrar.
+        atexit.register(self.close)
+
+    # --- Pontos de extensão das subclasses ---
+
+    @contextmanager
+    def _connection(self):
+        raise NotImplementedError
+
+    def _sql(self, statement: str) -> str:
+        """Adapta o estilo de parâmetro (`%s`) ao driver usado."""
+        return statement
+
+    # --- Interface pública ---
+
+    def new_session(self, session_id: str) -> dict:
+        session = {"last_sql": DEFAULT_LAST_SQL, "versao": 0, "resumo": "", "resumo_ate": 0}
+        session["history"] = PersistentChatMessageHistory(session_id, session, self)
+        return session
+
+    def load(self, session_id: str) -> dict | None:
+        # Se ainda há escritas desta sessão na fila, grava antes de ler para não perdê-las.
+        if self._has_pending(session_id):
+            self.flush()
+        with self._pending_lock:
+            if session_id in self._failed:
+                logger.warning(f"Sessão {session_id} recarregada com {len(self._failed[session_id])} "
+                               "operações ainda não gravadas no backend.")
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                self._sql("SELECT last_sql, versao, resumo, resumo_ate FROM chat_sessoes WHERE session_id = %s"),
+                (session_id,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                self._sql("SELECT conteudo FROM chat_mensagens WHERE session_id = %s ORDER BY id"),
+                (session_id,)
+            )
+            messages = messages_from_dict([json.loads(r[0]) for r in cur.fetchall()])
+            cur.close()
+
+        session = {"last_sql": row[0] or DEFAULT_LAST_SQL, "versao": row[1], "resumo": row[2] or "", "resumo_ate": row[3] or 0}
+        session["history"] = PersistentChatMessageHistory(session_id, session, self, messages)
+        logger.info(f"Sessão {session_id} carregada do backend ({len(messages)} mensagens).")
+        return session
+
+    def is_current(self, session_id: str, session: dict) -> bool:
+        # Se este worker tem escritas pendentes da sessão, o cache é a cópia mais nova.
+        if self._has_pending(session_id):
+            return True
+        try:
+            with self._connection() as conn:
+                cur = conn.cursor()
+                cur.execute(self._sql("SELECT versao FROM chat_sessoes WHERE session_id = %s"), (session_id,))
+                row = cur.fetchone()
+                cur.close()
+        except Exception as e:
+            # Sem acesso ao backend, seguimos com o cache em vez de derrubar a conversa.
+            logger.error(f"Falha ao validar a versão da sessão {session_id}: {e}")
+            return True
+        # Desatualizada só se outro worker gravou mais do que esta cópia conhece.
+        return session["versao"] >= (row[0] if row else 0)
+
+    def save_last_sql(self, session_id: str, session: dict, sql: str):
+        session["last_sql"] = sql
+        self._enqueue(session_id, session, "last_sql", sql)
+
+    def save_summary(self, session_id: str, session: dict, summary: str, covered: int):
+        super().save_summary(session_id, session, summary, covered)
+        self._enqueue(session_id, session, "resumo", (summary, covered))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self.flush()
+        self._stop.set()
+        self._writer.join(timeout=5)
+        # Última tentativa para o que ficou pendente por falhas anteriores.
+        self._retry_failed(force=True)
+        if self._failed:
+            lost = sum(len(ops) for ops in self._failed.values())
+            logger.error(f"{lost} operações de sessão não puderam ser gravadas no backend antes do encerramento.")
+
+    # --- Fila de escrita ---
+
+    def _has_pending(self, session_id: str) -> bool:
+        with self._pending_lock:
+            return session_id in self._pending
+
+    def _enqueue(self, session_id: str, session: dict, kind: str, payload):
+        # Cada operação incrementa a versão local; a gravação incrementa a versão no banco.
+        with self._pending_lock:
+            session["versao"] += 1
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put((session_id, kind, payload))
+
+    def _writer_loop(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                self._retry_failed()
+                continue
+            # Espera um curto intervalo para acumular as escritas de outras sessões no mesmo lote.
+            batch = [first]
+            self._stop.wait(self.flush_interval)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                # Operações que falharam antes vão à frente das novas da mesma sessão (preserva a ordem).
+                with self._pending_lock:
+                    sessions = dict.fromkeys(session_id for session_id, _, _ in batch)
+                    retried = [op for session_id in sessions for op in self._failed.pop(session_id, [])]
+                self._write(retried + batch)
+            except Exception as e:
+                logger.error(f"Erro inesperado na thread escritora de sessões: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, ops: list[tuple]):
+        """Grava as operações em um lote; se falhar, sessão a sessão. O que falhar fica em `_failed`."""
+        try:
+            self._write_batch(ops)
+            written = ops
+        except Exception as e:
+            logger.warning(f"Falha ao gravar o lote de {len(ops)} operações de sessão; gravando sessão a sessão: {e}")
+            by_session: dict[str, list[tuple]] = {}
+            for op in ops:
+                by_session.setdefault(op[0], []).append(op)
+            written = []
+            for session_id, session_ops in by_session.items():
+                if self._write_session(session_id, session_ops):
+                    written.extend(session_ops)
+                else:
+                    with self._pending_lock:
+                        # Se outra falha da sessão chegou antes, mantém a ordem original.
+                        self._failed[session_id] = session_ops + self._failed.get(session_id, [])
+        with self._pending_lock:
+            for session_id, _, _ in written:
+                remaining = self._pending.get(session_id, 1) - 1
+                if remaining > 0:
+                    self._pending[session_id] = remaining
+                else:
+                    self._pending.pop(session_id, None)
+
+    def _write_session(self, session_id: str, ops: list[tuple]) -> bool:
+        for attempt in range(1, _WRITE_ATTEMPTS + 1):
+            try:
+                self._write_batch(ops)
+                return True
+            except Exception as e:
+                if attempt == _WRITE_ATTEMPTS:
+                    logger.error(f"Falha ao gravar {len(ops)} operações da sessão {session_id} "
+                                 f"({attempt} tentativas); mantidas para nova tentativa: {e}")
+                    return False
+                time.sleep(0.2 * 2 ** attempt)
+        return False
+
+    def _retry_failed(self, force: bool = False):
+        """Regrava as operações que falharam, no máximo a cada _RETRY_INTERVAL_SECONDS (ou já, com `force`)."""
+        with self._pending_lock:
+            if not self._failed or (not force and time.monotonic() - self._last_retry < _RETRY_INTERVAL_SECONDS):
+                return
+            self._last_retry = time.monotonic()
+            ops = [op for session_ops in self._failed.values() for op in session_ops]
+            self._failed.clear()
+        self._write(ops)
+
+    def _write_batch(self, batch: list[tuple]):
+        # Todas as operações do lote são gravadas em uma única transação.
+        upsert_session = self._sql(
+            "INSERT INTO chat_sessoes (session_id, last_sql, versao) VALUES (%s, %s, 1) "
+            "ON CONFLICT (session_id) DO UPDATE SET versao = chat_sessoes.versao + 1, "
+            "last_sql = COALESCE(%s, chat_sessoes.last_sql), atualizado_em = CURRENT_TIMESTAMP"
+        )
+        insert_message = self._sql("INSERT INTO chat_mensagens (session_id, conteudo) VALUES (%s, %s)")
+        delete_messages = self._sql("DELETE FROM chat_mensagens WHERE session_id = %s")
+        update_summary = self._sql("UPDATE chat_sessoes SET resumo = %s, resumo_ate = %s WHERE session_id = %s")
+
+        with self._connection() as conn:
+            cur = conn.cursor()
+            for session_id, kind, payload in batch:
+                last_sql = payload if kind == "last_sql" else None
+                cur.execute(upsert_session, (session_id, last_sql, last_sql))
+                if kind == "mensagens":
+                    cur.executemany(insert_message, [(session_id, json.dumps(m)) for m in payload])
+                elif kind == "limpar":
+                    cur.execute(delete_messages, (session_id,))
+                    cur.execute(update_summary, ("", 0, session_id))
+                elif kind == "resumo":
+                    cur.execute(update_summary, (payload[0], payload[1], session_id))
+            cur.close()
+            conn.commit()
+
+    def _ensure_schema(self):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            for statement in self.DDL:
+                cur.execute(statement)
+            cur.close()
+            conn.commit()
+
+
+class SQLiteSessionBackend(_SqlSessionBackend):
+    """Sessões em um arquivo SQLite, compartilhado pelos workers de uma mesma máquina."""
+
+    DDL = (
+        """CREATE TABLE IF NOT EXISTS chat_sessoes (
+            session_id TEXT PRIMARY KEY,
+            last_sql TEXT,
+            versao INTEGER NOT NULL DEFAULT 0,
+            resumo TEXT,
+            resumo_ate INTEGER NOT NULL DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS chat_mensagens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            conteudo TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_chat_mensagens_sessao ON chat_mensagens (session_id, id)",
+    )
+
+    def __init__(self, path: str, flush_interval_ms: int, batch_size: int):
+        self.path = path
+        super().__init__(flush_interval_ms, batch_size)
+
+    @contextmanager
+    def _connection(self):
+        # Conexões SQLite são baratas: cada operação abre a sua, evitando compartilhar entre threads.
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            # WAL permite leituras concorrentes enquanto outro processo escreve.
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _sql(self, statement: str) -> str:
+        return statement.replace("%s", "?")
+
+
+class PostgresSessionBackend(_SqlSessionBackend):
+    """Sessões em tabelas do PostgreSQL, compartilhadas por todos os workers e nós."""
+
+    DDL = (
+        """CREATE TABLE IF NOT EXISTS chat_sessoes (
+            session_id VARCHAR(64) PRIMARY KEY,
+            last_sql TEXT,
+            versao INTEGER NOT NULL DEFAULT 0,
+            resumo TEXT,
+            resumo_ate INTEGER NOT NULL DEFAULT 0,
+            atualizado_em TIMESTAMPTZ DEFAULT NOW()
+        )""",
+        """CREATE TABLE IF NOT EXISTS chat_mensagens (
+            id BIGSERIAL PRIMARY KEY,
+            session_id VARCHAR(64) NOT NULL,
+            conteudo TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_chat_mensagens_sessao ON chat_mensagens (session_id, id)",
+    )
+
+    def __init__(self, connection_pool, flush_interval_ms: int, batch_size: int):
+        self._pool = connection_pool
+        super().__init__(flush_interval_ms, batch_size)
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Leituras também abrem transação no psycopg2; encerramos antes de devolver ao pool.
+            if not conn.closed:
+                conn.rollback()
+            self._pool.putconn(conn)
+
+
+def create_session_backend(settings) -> SessionBackend:
+    """
+    Cria o backend de sessões configurado em `SESSION_BACKEND` ("memory", "sqlite" ou "postgres").
+    """
+    kind = settings.SESSION_BACKEND.lower()
+    if kind == "sqlite":
+        logger.info(f"Sessões do chat persistidas em SQLite: {settings.SESSION_SQLITE_PATH}")
+        return SQLiteSessionBackend(
+            settings.SESSION_SQLITE_PATH,
+            flush_interval_ms=settings.SESSION_FLUSH_INTERVAL_MS,
+            batch_size=settings.SESSION_WRITE_BATCH_SIZE,
+        )
+    if kind == "postgres":
+        # Reutiliza o pool principal do `DatabaseManager` (mesmo SSL e timeout) em vez de abrir um pool próprio.
+        from app.core.database import db
+        logger.info("Sessões do chat persistidas no PostgreSQL.")
+        return PostgresSessionBackend(
+            db.pool(),
+            flush_interval_ms=settings.SESSION_FLUSH_INTERVAL_MS,
+            batch_size=settings.SESSION_WRITE_BATCH_SIZE,
+        )
+    if kind != "memory":
+        logger.warning(f"SESSION_BACKEND desconhecido ('{settings.SESSION_BACKEND}'). Usando memória.")
+    return MemorySessionBackend()
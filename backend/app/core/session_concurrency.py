@@ -0,0 +1,141 @@
+# =============================================================================
+# CONTROLE DE CONCORRÊNCIA POR SESSÃO DE CHAT
+#
+# Quando o usuário envia a mesma pergunta duas vezes (duplo clique) ou o frontend
+# refaz a requisição, duas chamadas ao `/chat` com o mesmo `session_id` rodavam em
+# paralelo sobre o MESMO histórico: chamadas ao LLM desperdiçadas e mensagens do
+# histórico intercaladas.
+#
+# O `SessionConcurrencyGuard` coordena as requisições de uma mesma sessão:
+# 1. Deduplicação: uma pergunta idêntica a outra que já está em andamento (ou na fila)
+#    na mesma sessão não é executada de novo; ela aguarda e recebe o mesmo resultado.
+# 2. Modo "serialize" (padrão): perguntas diferentes da mesma sessão são executadas
+#    uma de cada vez, na ordem de chegada.
+# 3. Modo "latest_wins": uma pergunta nova CANCELA a que estava em andamento na
+#    sessão, que termina com `SupersededRequestError` sem gravar nada no histórico.
+#
+# O controle é por processo. Com vários workers, recomenda-se roteamento "sticky"
+# por sessão no balanceador para que a garantia valha para toda a aplicação.
+# =============================================================================
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+
+class SupersededRequestError(Exception):
+    """A requisição foi cancelada por uma pergunta mais recente da mesma sessão."""
+
+
+class _SessionSlot:
+    """Estado de coordenação de uma sessão enquanto ela tem requisições ativas."""
+    __slots__ = ("lock", "task", "question", "superseded", "queued", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.task: asyncio.Task | None = None
+        self.question: str | None = None
+        # Tarefa cancelada por uma requisição mais nova (modo "latest_wins").
+        self.superseded: asyncio.Task | None = None
+        # Perguntas na fila (aguardando o lock) -> futuro com a tarefa, resolvido quando ela começa.
+        self.queued: dict[str, asyncio.Future] = {}
+        self.users = 0
+
+
+class SessionConcurrencyGuard:
+    """
+    Serializa (ou cancela, no modo "latest_wins") requisições concorrentes de uma
+    mesma sessão e deduplica perguntas idênticas em andamento ou na fila.
+    """
+
+    MODES = ("serialize", "latest_wins")
+
+    def __init__(self, mode: str = "serialize"):
+        if mode not in self.MODES:
+            logger.warning(f"Modo de concorrência desconhecido ('{mode}'). Usando 'serialize'.")
+            mode = "serialize"
+        self.mode = mode
+        self._slots: dict[str, _SessionSlot] = {}
+        self._stats = {"deduplicadas": 0, "canceladas": 0, "aguardaram_fila": 0}
+
+    async def run(self, session_id: str, question: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa `factory()` sob o controle de concorrência da sessão e retorna seu resultado.
+
+        Raises:
+            SupersededRequestError: Se a execução foi cancelada por uma pergunta mais nova.
+        """
+        slot = self._slots.setdefault(session_id, _SessionSlot())
+        slot.users += 1
+        key = " ".join(question.lower().split())
+        try:
+            running = slot.task if slot.task and not slot.task.done() else None
+
+            # 1. Pergunta idêntica já em andamento: reaproveita o resultado em vez de repetir o trabalho.
+            if running and slot.question == key:
+                self._stats["deduplicadas"] += 1
+                logger.info(f"Pergunta duplicada na sessão {session_id}; aguardando a execução em andamento.")
+                return await self._await(slot, running)
+
+            # Pergunta idêntica ainda na fila: aguarda ela começar e reaproveita a mesma execução.
+            queued = slot.queued.get(key)
+            if queued is not None:
+                self._stats["deduplicadas"] += 1
+                logger.info(f"Pergunta duplicada na sessão {session_id}; aguardando a execução na fila.")
+                try:
+                    return await self._await(slot, await asyncio.shield(queued))
+                except asyncio.CancelledError:
+                    # Se a requisição original desistiu antes de começar, esta segue o fluxo normal.
+                    if not queued.cancelled():
+                        raise
+                    self._stats["deduplicadas"] -= 1
+                running = slot.task if slot.task and not slot.task.done() else None
+
+            # 2. No modo "latest_wins", a pergunta nova substitui a que estava em andamento.
+            if running and self.mode == "latest_wins":
+                self._stats["canceladas"] += 1
+                slot.superseded = running
+                running.cancel()
+                logger.info(f"Requisição anterior da sessão {session_id} cancelada por uma pergunta mais nova.")
+            elif slot.lock.locked():
+                self._stats["aguardaram_fila"] += 1
+
+            # 3. Apenas uma execução por sessão de cada vez.
+            started = asyncio.get_running_loop().create_future()
+            slot.queued.setdefault(key, started)
+            try:
+                async with slot.lock:
+                    task = asyncio.ensure_future(factory())
+                    slot.task, slot.question = task, key
+                    if slot.queued.get(key) is started:
+                        del slot.queued[key]
+                    if not started.done():
+                        started.set_result(task)
+                    return await self._await(slot, task)
+            finally:
+                # Desistiu (ex: cliente desconectou) antes de começar: libera as duplicatas na fila.
+                if not started.done():
+                    started.cancel()
+                    if slot.queued.get(key) is started:
+                        del slot.queued[key]
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                self._slots.pop(session_id, None)
+
+    def stats(self) -> dict:
+        """Retorna as métricas do controle de concorrência."""
+        return {"modo": self.mode, "sessoes_em_andamento": len(self._slots), **self._stats}
+
+    @staticmethod
+    async def _await(slot: _SessionSlot, task: asyncio.Task) -> Any:
+        # `shield` evita que o cancelamento de UM dos interessados cancele a tarefa compartilhada.
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled() and slot.superseded is task:
+                raise SupersededRequestError() from None
+            raise
@@ -0,0 +1,197 @@
+# =============================================================================
+# ARMAZENAMENTO LIMITADO DAS SESSÕES DE CHAT (SESSION STORE)
+#
+# Este módulo substitui o antigo dicionário global `store = {}` que guardava,
+# para sempre, o histórico e a última query de cada `session_id` já visto.
+# Sob tráfego real, isso fazia a memória do worker crescer sem limite.
+#
+# O `SessionStore` mantém as sessões em ordem de uso (LRU) e aplica três limites:
+# 1. Quantidade máxima de sessões: a sessão usada há mais tempo é descartada.
+# 2. Tempo ocioso (TTL): sessões sem atividade há mais de N segundos expiram.
+# 3. Memória aproximada: o tamanho de cada sessão (histórico + last_sql + resumo)
+#    é estimado a cada acesso e o total é mantido abaixo de um teto.
+#
+# Também expõe métricas (sessões ativas, bytes estimados, acertos e despejos)
+# para acompanhar o comportamento do cache em produção.
+# =============================================================================
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+# Custo fixo estimado (em bytes) de uma sessão vazia: dicionário, objeto de histórico, etc.
+_SESSION_OVERHEAD_BYTES = 512
+
+
+def estimate_session_bytes(session: dict) -> int:
+    """
+    Estima, de forma aproximada, quantos bytes uma sessão ocupa em memória.
+    Considera o texto de todas as mensagens do histórico e a última query SQL.
+    """
+    size = _SESSION_OVERHEAD_BYTES
+    history = session.get("history")
+    for message in getattr(history, "messages", []):
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        size += len(content.encode("utf-8")) + 64  # +64: objeto da mensagem em si.
+    for key in ("last_sql", "resumo"):
+        size += len((session.get(key) or "").encode("utf-8"))
+    return size
+
+
+class _SessionEntry:
+    """Envelope interno com os dados da sessão e sua contabilidade."""
+    __slots__ = ("data", "last_access", "size_bytes")
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.last_access = time.monotonic()
+        self.size_bytes = estimate_session_bytes(data)
+
+
+class SessionStore:
+    """
+    Armazenamento de sessões em memória com despejo por LRU, TTL ocioso e memória.
+    Seguro para uso concorrente (as rotas podem rodar em threads diferentes).
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl_seconds: float, max_bytes: int):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._total_bytes = 0
+
+        # Contadores exportados em `stats()`.
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {"lru": 0, "ttl": 0, "memoria": 0}
+
+    # --- Acesso ---
+
+    def get_or_create(self, session_id: str, factory: Callable[[], dict]) -> dict:
+        """
+        Retorna os dados da sessão, criando-os com `factory()` se ainda não existirem.
+        Cada acesso renova o TTL da sessão e recalcula seu tamanho estimado.
+        """
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self._misses += 1
+                entry = _SessionEntry(factory())
+                self._entries[session_id] = entry
+                self._total_bytes += entry.size_bytes
+            else:
+                self._hits += 1
+                self._entries.move_to_end(session_id)
+                self._touch(entry)
+            self._enforce_limits(keep=session_id)
+            return entry.data
+
+    def put(self, session_id: str, data: dict):
+        """Insere (ou substitui) os dados de uma sessão, ex: recém-carregada de um backend persistente."""
+        with self._lock:
+            self._evict_expired()
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._total_bytes -= old.size_bytes
+            entry = _SessionEntry(data)
+            self._entries[session_id] = entry
+            self._total_bytes += entry.size_bytes
+            self._enforce_limits(keep=session_id)
+
+    def get(self, session_id: str) -> dict | None:
+        """Retorna os dados da sessão se ela existir (e não tiver expirado), sem criá-la."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(session_id)
+            self._touch(entry)
+            return entry.data
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._evict_expired()
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def pop(self, session_id: str) -> dict | None:
+        """Remove a sessão explicitamente (ex: usuário iniciou uma nova conversa)."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry.size_bytes
+            return entry.data
+
+    # --- Métricas ---
+
+    def stats(self) -> dict:
+        """Retorna um retrato das métricas do armazenamento de sessões."""
+        with self._lock:
+            self._evict_expired()
+            return {
+                "sessoes_ativas": len(self._entries),
+                "bytes_estimados": self._total_bytes,
+                "max_sessoes": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_ocioso_segundos": self.idle_ttl_seconds,
+                "acertos": self._hits,
+                "faltas": self._misses,
+                "despejos": dict(self._evictions),
+            }
+
+    # --- Internos (sempre chamados com o lock adquirido) ---
+
+    def _touch(self, entry: _SessionEntry):
+        # Atualiza o horário de uso e a estimativa de tamanho, já que o histórico pode ter crescido.
+        entry.last_access = time.monotonic()
+        new_size = estimate_session_bytes(entry.data)
+        self._total_bytes += new_size - entry.size_bytes
+        entry.size_bytes = new_size
+
+    def _evict(self, session_id: str, reason: str):
+        entry = self._entries.pop(session_id)
+        self._total_bytes -= entry.size_bytes
+        self._evictions[reason] += 1
+        logger.info(f"Sessão {session_id} despejada do armazenamento (motivo: {reason}).")
+
+    def _evict_expired(self):
+        # Como o OrderedDict está em ordem de uso, as sessões mais antigas ficam no início:
+        # basta remover do começo até encontrar uma sessão ainda dentro do TTL.
+        if self.idle_ttl_seconds <= 0:
+            return
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.last_access > deadline:
+                break
+            self._evict(session_id, "ttl")
+
+    def _enforce_limits(self, keep: str):
+        # Remove as sessões menos usadas até respeitar os limites de quantidade e memória.
+        # A sessão em uso (`keep`) nunca é despejada pela própria requisição.
+        while len(self._entries) > self.max_sessions:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._evict(oldest, "lru")
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._evict(oldest, "memoria")
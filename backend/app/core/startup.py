@@ -0,0 +1,107 @@
+# =============================================================================
+# INICIALIZAÇÃO (AQUECIMENTO) DA API E PRONTIDÃO
+#
+# Importar a aplicação não abre conexões nem chama serviços externos: todo o
+# trabalho de rede é feito no `lifespan` do FastAPI, por meio deste módulo.
+#
+# 1. Etapas de aquecimento (`StartupStep`) rodam EM PARALELO (as síncronas em
+#    threads), cada uma com tempo máximo: pool de conexões, schema do banco,
+#    cache do dashboard, nomes de clientes, ping nos LLMs etc.
+# 2. O resultado de cada etapa (ok, tempo, erro) fica em `StartupState`, usado
+#    pela rota `/ready`. Só as etapas CRÍTICAS definem a prontidão: sem elas, o
+#    worker não deve receber tráfego; as demais apenas deixam o primeiro acesso
+#    mais lento.
+# 3. Etapas críticas que falharam (ex: banco fora do ar no deploy) são
+#    tentadas de novo pela própria `/ready`, no máximo uma vez a cada
+#    READY_RETRY_INTERVAL_SECONDS, e o worker fica pronto quando voltarem.
+# =============================================================================
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable
+
+# Obtém um logger específico para este módulo.
+logger = logging.getLogger(__name__)
+
+
+class StartupStep:
+    """Uma etapa de aquecimento: função (síncrona ou `async`) sem argumentos."""
+    __slots__ = ("name", "func", "critical", "enabled")
+
+    def __init__(self, name: str, func: Callable[[], Any], critical: bool = False, enabled: bool = True):
+        self.name = name
+        self.func = func
+        self.critical = critical
+        self.enabled = enabled
+
+
+class StartupState:
+    """Resultado das etapas de aquecimento e controle das novas tentativas das etapas críticas."""
+
+    def __init__(self, timeout: float = 30, retry_interval: float = 10):
+        self._timeout = timeout
+        self._retry_interval = retry_interval
+        self._steps: dict[str, StartupStep] = {}
+        self._results: dict[str, dict] = {}
+        self._finished = False
+        self._last_retry = 0.0
+        self._retry_lock = asyncio.Lock()
+
+    async def _run_step(self, step: StartupStep):
+        start_time = time.monotonic()
+        try:
+            if inspect.iscoroutinefunction(step.func):
+                await asyncio.wait_for(step.func(), self._timeout)
+            else:
+                # A thread não é interrompida no timeout, mas a inicialização deixa de esperar por ela.
+                await asyncio.wait_for(asyncio.to_thread(step.func), self._timeout)
+            result = {"ok": True}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "erro": f"Tempo esgotado ({self._timeout:.0f}s)."}
+        except Exception as e:
+            # Só a primeira linha: a mensagem vai para a resposta de `/ready`.
+            result = {"ok": False, "erro": (str(e).strip().splitlines() or [type(e).__name__])[0]}
+        result["critica"] = step.critical
+        result["tempo_ms"] = round((time.monotonic() - start_time) * 1000, 1)
+        self._results[step.name] = result
+        if result["ok"]:
+            logger.info(f"Aquecimento '{step.name}' concluído em {result['tempo_ms']:.0f} ms.")
+        else:
+            log = logger.error if step.critical else logger.warning
+            log(f"Aquecimento '{step.name}' falhou: {result['erro']}")
+
+    async def run(self, steps: list[StartupStep]):
+        """Executa todas as etapas habilitadas em paralelo e registra os resultados."""
+        start_time = time.monotonic()
+        enabled = [step for step in steps if step.enabled]
+        self._steps = {step.name: step for step in enabled}
+        await asyncio.gather(*(self._run_step(step) for step in enabled))
+        self._finished = True
+        self._last_retry = time.monotonic()
+        logger.info(f"Inicialização concluída em {time.monotonic() - start_time:.2f}s "
+                    f"({'pronto' if self.ready else 'NÃO pronto'}).")
+
+    @property
+    def ready(self) -> bool:
+        """Pronto quando a inicialização terminou e todas as etapas críticas deram certo."""
+        return self._finished and all(
+            result["ok"] for result in self._results.values() if result["critica"]
+        )
+
+    async def retry_failed(self):
+        """Tenta de novo as etapas críticas que falharam (no máximo uma vez por intervalo)."""
+        if not self._finished or self.ready:
+            return
+        async with self._retry_lock:
+            if self.ready or time.monotonic() - self._last_retry < self._retry_interval:
+                return
+            self._last_retry = time.monotonic()
+            failed = [self._steps[name] for name, result in self._results.items()
+                      if result["critica"] and not result["ok"]]
+            await asyncio.gather(*(self._run_step(step) for step in failed))
+
+    def snapshot(self) -> dict:
+        return {"pronto": self.ready, "inicializacao_concluida": self._finished,
+                "etapas": {name: dict(result) for name, result in self._results.items()}}
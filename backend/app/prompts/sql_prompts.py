@@ -40,6 +40,11 @@
 #    - Ação: Transforma o resultado bruto do banco de dados em uma resposta amigável,
 #      seja em texto ou em um JSON estruturado para gráficos.
 #
+# 5. O Redator de Resumos (`SUMMARY_PROMPT`):
+#    - Responsabilidade: Manter o resumo acumulado de conversas longas.
+#    - Ação: Compacta as mensagens antigas em um resumo de tamanho fixo, enviado junto
+#      com os últimos turnos no lugar do histórico completo.
+#
 # Este design modular torna o sistema mais robusto, previsível e fácil de depurar.
 #
 # =================================================================================================
@@ -101,6 +106,7 @@ Você é um assistente especialista em PostgreSQL. Sua única tarefa é gerar um
 - Sua tarefa é simplesmente traduzir a pergunta para uma query SQL válida.
 - A query deve ser sintaticamente correta para PostgreSQL.
 - Siga as regras gerais: não inclua explicações ou ```sql``` na saída, apenas o código da query.
+- Se a pergunta vier acompanhada de "Clientes identificados na pergunta", filtre esses clientes por `cliente_id` com os ids informados (ex: `o.cliente_id IN (12, 57)`), e NÃO por `nome_razao_social` com `=` ou `ILIKE`.
 
 **Sua Resposta Final DEVE SER APENAS O CÓDIGO SQL.**
 ---
@@ -118,8 +124,8 @@ SQL_PROMPT = FewShotPromptTemplate(
     examples=FEW_SHOT_EXAMPLES,
     example_prompt=EXAMPLE_PROMPT_TEMPLATE,
     prefix=SQL_GENERATION_SYSTEM_PROMPT,
-    suffix="User question: {question}\nSQL query:",
-    input_variables=["question", "schema"],
+    suffix="User question: {question}\n{clientes}SQL query:",
+    input_variables=["question", "schema", "clientes"],
     example_separator="\n\n"
 )
 
@@ -129,11 +135,12 @@ SQL_PROMPT = FewShotPromptTemplate(
 INPUT (O que a cadeia fornece a este prompt):
 {
   "question": "Qual o número total de operações para o cliente 'Porto'?",
-  "schema": "CREATE TABLE clientes (id INTEGER, nome_razao_social VARCHAR) CREATE TABLE operacoes_logisticas (id INTEGER, cliente_id INTEGER)"
+  "schema": "CREATE TABLE clientes (id INTEGER, nome_razao_social VARCHAR) CREATE TABLE operacoes_logisticas (id INTEGER, cliente_id INTEGER)",
+  "clientes": "Clientes identificados na pergunta (se a pergunta se refere a eles, filtre por cliente_id):\n- 'porto': cliente_id IN (12, 57) -> 12 (Porto), 57 (Porto Vieira S/A)\n"
 }
 
 SAÍDA GERADA PELO LLM:
-SELECT COUNT(o.id) FROM operacoes_logisticas o JOIN clientes c ON o.cliente_id = c.id WHERE c.nome_razao_social = 'Porto';
+SELECT COUNT(o.id) FROM operacoes_logisticas o WHERE o.cliente_id IN (12, 57);
 """
 
 
@@ -336,4 +343,42 @@ INPUT (O que a cadeia fornece a este prompt):
 
 SAÍDA GERADA PELO LLM:
 Qual o valor total de todas as mercadorias cadastradas?
-"""
\ No newline at end of file
+"""
+
+# --- Bloco 5: O Redator de Resumos (SUMMARY_PROMPT) ---
+
+# Define as instruções para o LLM que mantém o resumo acumulado da conversa.
+# Em vez de descartar abruptamente as mensagens antigas, elas são "compactadas" neste
+# resumo, que é atualizado de forma incremental (resumo anterior + mensagens novas)
+# em segundo plano, depois que a resposta já foi enviada ao usuário.
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    """
+    Sua tarefa é manter um resumo curto de uma conversa entre um usuário e um assistente de dados de logística.
+
+    Regras:
+    - Combine o resumo anterior com as novas mensagens em um ÚNICO resumo atualizado.
+    - Preserve apenas fatos úteis para perguntas futuras: clientes, códigos, estados, períodos, filtros e resultados citados.
+    - Escreva em português, em no máximo 80 palavras, sem introduções ou explicações.
+
+    Resumo anterior:
+    {summary}
+
+    Novas mensagens:
+    {new_messages}
+
+    Resumo atualizado:
+    """
+)
+
+"""
+--- Exemplo de Uso e Saída (SUMMARY_PROMPT) ---
+
+INPUT:
+{
+  "summary": "O usuário perguntou qual cliente tem o maior valor de mercadorias; a resposta foi 'Porto'.",
+  "new_messages": "Human: e quantas operações ele tem?\nAI: O cliente 'Porto' possui 2.134 operações."
+}
+
+SAÍDA GERADA PELO LLM:
+O cliente com maior valor de mercadorias é 'Porto', que possui 2.134 operações.
+"""
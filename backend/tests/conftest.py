@@ -0,0 +1,14 @@
+# Configuração mínima para importar os módulos de `app.core` sem um `.env`:
+# nenhum teste daqui conecta ao banco nem chama os LLMs.
+import os
+
+for name, value in {
+    "GROQ_API_KEY": "teste",
+    "GROQ_SQL_MODEL": "teste",
+    "GROQ_ANSWER_MODEL": "teste",
+    "DB_HOST": "localhost",
+    "DB_NAME": "teste",
+    "DB_USER": "teste",
+    "DB_PASS": "teste",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,38 @@
+from langchain_core.messages import HumanMessage
+
+from app.core import session_backends
+from app.core.session_backends import SQLiteSessionBackend
+
+
+def test_failed_writes_are_kept_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_backends, "_RETRY_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(session_backends.time, "sleep", lambda seconds: None)
+    backend = SQLiteSessionBackend(str(tmp_path / "sessoes.db"), 10, 50)
+    write_batch = backend._write_batch
+    failing = {"ativo": True}
+
+    def flaky_write_batch(batch):
+        if failing["ativo"] and any(session_id == "ruim" for session_id, _, _ in batch):
+            raise RuntimeError("falha simulada")
+        write_batch(batch)
+
+    backend._write_batch = flaky_write_batch
+    try:
+        good, bad = backend.new_session("boa"), backend.new_session("ruim")
+        good["history"].add_messages([HumanMessage("b1")])
+        bad["history"].add_messages([HumanMessage("r1")])
+        backend.flush()
+        # Uma sessão ruim não derruba o lote das demais, e o cache dela continua valendo.
+        assert [m.content for m in backend.load("boa")["history"].messages] == ["b1"]
+        assert backend.is_current("ruim", bad)
+
+        bad["history"].add_messages([HumanMessage("r2")])
+        backend.flush()
+        failing["ativo"] = False
+        backend.close()
+
+        reloaded = backend.load("ruim")
+        assert [m.content for m in reloaded["history"].messages] == ["r1", "r2"]
+        assert reloaded["versao"] == bad["versao"]
+    finally:
+        backend.close()
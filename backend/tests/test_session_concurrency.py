@@ -0,0 +1,45 @@
+import asyncio
+
+from app.core.session_concurrency import SessionConcurrencyGuard
+
+
+def _answer(calls: list, question: str, delay: float = 0.05):
+    async def factory():
+        calls.append(question)
+        await asyncio.sleep(delay)
+        return f"resposta: {question}"
+    return factory
+
+
+def test_identical_queued_questions_run_once():
+    async def scenario():
+        guard, calls = SessionConcurrencyGuard("serialize"), []
+        first = asyncio.create_task(guard.run("s1", "pergunta A", _answer(calls, "A")))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(guard.run("s1", question, _answer(calls, "B")))
+                  for question in ("Pergunta  B", "pergunta b")]
+        results = await asyncio.gather(first, *queued)
+        return calls, results, guard.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == ["A", "B"]
+    assert results == ["resposta: A", "resposta: B", "resposta: B"]
+    assert stats["deduplicadas"] == 1
+
+
+def test_duplicate_runs_if_queued_original_gives_up():
+    async def scenario():
+        guard, calls = SessionConcurrencyGuard("serialize"), []
+        first = asyncio.create_task(guard.run("s1", "A", _answer(calls, "A")))
+        await asyncio.sleep(0)
+        original = asyncio.create_task(guard.run("s1", "B", _answer(calls, "B")))
+        await asyncio.sleep(0)
+        duplicate = asyncio.create_task(guard.run("s1", "B", _answer(calls, "B")))
+        await asyncio.sleep(0)
+        original.cancel()
+        return calls, await asyncio.gather(first, duplicate), original.cancelled()
+
+    calls, results, cancelled = asyncio.run(scenario())
+    assert cancelled
+    assert calls == ["A", "B"]
+    assert results == ["resposta: A", "resposta: B"]
@@ -0,0 +1,39 @@
+import pytest
+
+from app.core.database import UnsafeQueryError, validate_readonly_query
+
+CHAINED = "; COMMIT; SET default_transaction_read_only = off; DELETE FROM clientes; --'"
+
+
+@pytest.mark.parametrize("query", [
+    # Palavra terminada em "e" grudada na aspa: é um literal comum, não um E'...'.
+    "SELECT * FROM clientes WHERE cidade LIKE'x\\'" + CHAINED,
+    "SELECT * FROM clientes WHERE some_col'x\\'" + CHAINED,
+    # Identificador com `$` seguido de `$$`: não abre dollar-quoting.
+    "SELECT a$$; DELETE FROM clientes; SELECT b$$",
+    "SELECT 1; COMMIT; SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE; DELETE FROM operacoes_logisticas",
+    "DELETE FROM clientes",
+    "WITH d AS (DELETE FROM clientes RETURNING *) SELECT * FROM d",
+    "SELECT * INTO copia FROM clientes",
+    "SELECT * FROM clientes FOR UPDATE",
+    "SELECT * FROM clientes FOR NO KEY UPDATE",
+    "SELECT set_config('default_transaction_read_only', 'off', false)",
+    "SELECT 'aberta",
+])
+def test_rejects_unsafe_queries(query):
+    with pytest.raises(UnsafeQueryError):
+        validate_readonly_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    # E'...' de verdade: `\'` é uma aspa escapada dentro do literal.
+    "SELECT E'it\\'s; DELETE FROM clientes' AS texto",
+    "SELECT * FROM clientes WHERE cidade LIKE 'x; DELETE'",
+    "SELECT CASE WHEN status = 'ENTREGUE' THEN 1 ELSE 0 END AS start FROM operacoes_logisticas",
+    "SELECT data_emissao AS begin, valor_frete AS set, 1 AS lock, 2 AS refresh FROM operacoes_logisticas;",
+    "WITH ultimos AS (SELECT * FROM operacoes_logisticas LIMIT 10) SELECT count(*) FROM ultimos",
+    "SELECT $$a;b$$, $t$ ; $t$ -- comentário; DROP\n",
+    "(SELECT 1) UNION (SELECT 2)",
+])
+def test_accepts_single_read_queries(query):
+    assert validate_readonly_query(query) == query.strip().rstrip(";").rstrip()
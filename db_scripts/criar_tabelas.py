@@ -4,6 +4,20 @@
 # Este script é responsável por construir todo o alicerce do banco de dados
 # PostgreSQL. Ele cria as tabelas 'clientes' e 'operacoes_logisticas', 
 # os tipos de dados customizados (ENUMs) e os índices de performance.
+# Também cria a tabela de agregados 'operacoes_rollup_diario' (usada pelo
+# dashboard) e os triggers que a mantêm atualizada a cada escrita, além do
+# aviso (NOTIFY) usado para enviar atualizações em tempo real ao dashboard.
+#
+# Com `--particionada`, 'operacoes_logisticas' é criada particionada por mês
+# (RANGE em 'data_emissao'): consultas de períodos recentes leem apenas as
+# partições do período, e dados antigos podem ser arquivados partição a partição.
+# As partições futuras são criadas por `criar_particoes_operacoes()`, chamada
+# aqui, na inicialização da API e (se disponível) diariamente pelo pg_cron.
+# Para converter uma tabela existente, use `migrar_particionamento.py`.
+#
+# Uso:
+#   python criar_tabelas.py                 # tabela simples (padrão)
+#   python criar_tabelas.py --particionada  # tabela particionada por mês
 #
 # NOTA: O script é IDEMPOTENTE e NÃO DESTRUTIVO. Graças ao uso de 
 # 'IF NOT EXISTS', ele pode ser executado múltiplas vezes sem apagar
@@ -11,6 +25,7 @@
 # faltando.
 # =============================================================================
 
+import argparse
 import os
 from pathlib import Path
 import psycopg2
@@ -23,8 +38,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Carrega as variáveis do arquivo .env para o ambiente do script
 load_dotenv(BASE_DIR / "backend" / ".env")
 
+# Fuso horário que define o "dia" de uma operação no rollup. O mesmo valor (DASHBOARD_TIMEZONE do
+# .env) é usado pelo dashboard ao filtrar e agrupar por dia; sem ele, o dia dependeria do
+# TimeZone da sessão que fez a escrita.
+FUSO_HORARIO = os.getenv("DASHBOARD_TIMEZONE", "America/Sao_Paulo")
+
 # --- SCRIPT SQL COMPLETO PARA CRIAÇÃO DO BANCO DE DADOS ---
-SQL_SETUP_SCRIPT = """
+# O script é montado em partes para que a Etapa 3 possa criar a tabela de operações
+# no layout simples ou no particionado; todo o resto (índices, rollup, triggers) é comum.
+_SQL_TIPOS_E_CLIENTES = """
 -- Etapa 1: Criação dos tipos ENUM (se não existirem)
 DO $$
 BEGIN
@@ -55,10 +77,10 @@ CREATE TABLE IF NOT EXISTS clientes (
     data_cadastro TIMESTAMPTZ DEFAULT NOW()
 );
 
--- Etapa 3: Criação da tabela principal 'operacoes_logisticas' (se não existir)
-CREATE TABLE IF NOT EXISTS operacoes_logisticas (
-    id BIGSERIAL PRIMARY KEY,
-    codigo_operacao VARCHAR(20) UNIQUE NOT NULL,
+"""
+
+# Colunas de 'operacoes_logisticas' após `id` e `codigo_operacao`, comuns aos dois layouts.
+_SQL_COLUNAS_OPERACOES = """
     tipo tipo_operacao_logistica NOT NULL,
     status status_operacao NOT NULL DEFAULT 'SOLICITADO',
     
@@ -86,30 +108,344 @@ CREATE TABLE IF NOT EXISTS operacoes_logisticas (
     
     CONSTRAINT check_peso_positivo CHECK (peso_kg > 0),
     CONSTRAINT check_quantidade_positiva CHECK (quantidade_volumes > 0),
-    CONSTRAINT check_valor_mercadoria_positivo CHECK (valor_mercadoria >= 0)
+    CONSTRAINT check_valor_mercadoria_positivo CHECK (valor_mercadoria >= 0)"""
+
+SQL_TABELA_OPERACOES = f"""
+-- Etapa 3: Criação da tabela principal 'operacoes_logisticas' (se não existir)
+CREATE TABLE IF NOT EXISTS operacoes_logisticas (
+    id BIGSERIAL PRIMARY KEY,
+    codigo_operacao VARCHAR(20) UNIQUE NOT NULL,{_SQL_COLUNAS_OPERACOES}
 );
+"""
+
+# Em uma tabela particionada, toda chave primária/única precisa conter a coluna de partição:
+# a unicidade de `codigo_operacao` passa a ser garantida por (codigo_operacao, data_emissao).
+SQL_TABELA_OPERACOES_PARTICIONADA = f"""
+-- Etapa 3: Criação da tabela principal 'operacoes_logisticas', particionada por mês (se não existir)
+CREATE TABLE IF NOT EXISTS operacoes_logisticas (
+    id BIGSERIAL NOT NULL,
+    codigo_operacao VARCHAR(20) NOT NULL,{_SQL_COLUNAS_OPERACOES},
+    PRIMARY KEY (id, data_emissao),
+    UNIQUE (codigo_operacao, data_emissao)
+) PARTITION BY RANGE (data_emissao);
+"""
 
+_SQL_INDICES_ROLLUP_E_AVISOS = """
 -- Etapa 4: Criação dos índices para performance (se não existirem)
 CREATE INDEX IF NOT EXISTS idx_status ON operacoes_logisticas (status);
 CREATE INDEX IF NOT EXISTS idx_cliente_id ON operacoes_logisticas (cliente_id);
 CREATE INDEX IF NOT EXISTS idx_codigo_operacao ON operacoes_logisticas (codigo_operacao);
 CREATE INDEX IF NOT EXISTS idx_cnpj_cpf_cliente ON clientes (cnpj_cpf);
+
+-- Índices compostos para os filtros do dashboard (coluna filtrada + período de emissão).
+-- Atendem tanto o filtro isolado quanto o filtro combinado com um intervalo de datas.
+CREATE INDEX IF NOT EXISTS idx_operacoes_uf_destino_emissao ON operacoes_logisticas (uf_destino, data_emissao);
+CREATE INDEX IF NOT EXISTS idx_operacoes_cliente_emissao ON operacoes_logisticas (cliente_id, data_emissao);
+CREATE INDEX IF NOT EXISTS idx_operacoes_status_emissao ON operacoes_logisticas (status, data_emissao);
+CREATE INDEX IF NOT EXISTS idx_operacoes_tipo_emissao ON operacoes_logisticas (tipo, data_emissao);
+-- Índice só do período, para séries temporais e intervalos de datas sem outros filtros.
+CREATE INDEX IF NOT EXISTS idx_operacoes_data_emissao ON operacoes_logisticas (data_emissao);
+
+-- Índice de trigramas (pg_trgm) no nome do cliente: atende buscas aproximadas geradas pelo chat
+-- (`ILIKE '%porto%'`, `similarity()`, operador `%`), que um índice B-tree não consegue usar.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_clientes_nome_trgm ON clientes USING GIN (nome_razao_social gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'Extensão pg_trgm indisponível: índice de trigramas de clientes não criado.';
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'Sem permissão para criar a extensão pg_trgm.';
+END$$;
+
+-- Etapa 5: Tabela de agregados (rollup) usada pelo dashboard (se não existir)
+-- Uma linha por dia x status x UF de destino x cliente. As consultas do dashboard leem
+-- esta tabela em vez de agregar toda a 'operacoes_logisticas', então o tempo de resposta
+-- depende do número de combinações, e não do número de operações.
+CREATE TABLE IF NOT EXISTS operacoes_rollup_diario (
+    dia DATE NOT NULL,
+    status status_operacao NOT NULL,
+    uf_destino VARCHAR(2) NOT NULL,
+    cliente_id INTEGER NOT NULL,
+    total_operacoes BIGINT NOT NULL DEFAULT 0,
+    soma_valor_mercadoria NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    soma_valor_frete NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, status, uf_destino, cliente_id)
+);
+-- A chave primária (que começa por `dia`) atende os filtros de período; estes, os demais filtros.
+CREATE INDEX IF NOT EXISTS idx_rollup_uf_destino_dia ON operacoes_rollup_diario (uf_destino, dia);
+CREATE INDEX IF NOT EXISTS idx_rollup_cliente_dia ON operacoes_rollup_diario (cliente_id, dia);
+CREATE INDEX IF NOT EXISTS idx_rollup_status_dia ON operacoes_rollup_diario (status, dia);
+
+-- Etapa 6: Manutenção incremental do rollup
+-- O dia de cada operação vem de `dia_operacao()` (criada em `montar_script_setup`), com fuso fixo.
+-- Triggers por INSTRUÇÃO (não por linha) com tabelas de transição: um COPY ou UPDATE
+-- em massa gera UM único upsert já agregado, em vez de um por linha alterada.
+-- Em um UPDATE, os valores antigos entram subtraídos e os novos somados, na MESMA instrução.
+-- As chaves do rollup são sempre travadas na mesma ordem (ORDER BY da chave primária): duas
+-- instruções concorrentes (simulador, workers de COPY, a aplicação) não se bloqueiam em ordem
+-- cruzada, o que causaria deadlock.
+CREATE OR REPLACE FUNCTION atualizar_operacoes_rollup() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO operacoes_rollup_diario AS r
+            (dia, status, uf_destino, cliente_id, total_operacoes, soma_valor_mercadoria, soma_valor_frete)
+        SELECT dia, status, uf_destino, cliente_id, SUM(total), SUM(mercadoria), SUM(frete)
+        FROM (
+            SELECT dia_operacao(data_emissao) AS dia, status, uf_destino, cliente_id,
+                   -1 AS total, -valor_mercadoria AS mercadoria, -COALESCE(valor_frete, 0) AS frete
+            FROM antigas
+            UNION ALL
+            SELECT dia_operacao(data_emissao), status, uf_destino, cliente_id,
+                   1, valor_mercadoria, COALESCE(valor_frete, 0)
+            FROM novas
+        ) AS alteracoes
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (dia, status, uf_destino, cliente_id) DO UPDATE SET
+            total_operacoes = r.total_operacoes + EXCLUDED.total_operacoes,
+            soma_valor_mercadoria = r.soma_valor_mercadoria + EXCLUDED.soma_valor_mercadoria,
+            soma_valor_frete = r.soma_valor_frete + EXCLUDED.soma_valor_frete;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO operacoes_rollup_diario AS r
+            (dia, status, uf_destino, cliente_id, total_operacoes, soma_valor_mercadoria, soma_valor_frete)
+        SELECT dia_operacao(data_emissao), status, uf_destino, cliente_id,
+               -COUNT(*), -SUM(valor_mercadoria), -COALESCE(SUM(valor_frete), 0)
+        FROM antigas
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (dia, status, uf_destino, cliente_id) DO UPDATE SET
+            total_operacoes = r.total_operacoes + EXCLUDED.total_operacoes,
+            soma_valor_mercadoria = r.soma_valor_mercadoria + EXCLUDED.soma_valor_mercadoria,
+            soma_valor_frete = r.soma_valor_frete + EXCLUDED.soma_valor_frete;
+    ELSE
+        INSERT INTO operacoes_rollup_diario AS r
+            (dia, status, uf_destino, cliente_id, total_operacoes, soma_valor_mercadoria, soma_valor_frete)
+        SELECT dia_operacao(data_emissao), status, uf_destino, cliente_id,
+               COUNT(*), SUM(valor_mercadoria), COALESCE(SUM(valor_frete), 0)
+        FROM novas
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (dia, status, uf_destino, cliente_id) DO UPDATE SET
+            total_operacoes = r.total_operacoes + EXCLUDED.total_operacoes,
+            soma_valor_mercadoria = r.soma_valor_mercadoria + EXCLUDED.soma_valor_mercadoria,
+            soma_valor_frete = r.soma_valor_frete + EXCLUDED.soma_valor_frete;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recalcula o rollup do zero (ex: após cargas em massa com os triggers desabilitados).
+CREATE OR REPLACE FUNCTION reconstruir_operacoes_rollup() RETURNS void AS $$
+BEGIN
+    TRUNCATE operacoes_rollup_diario;
+    INSERT INTO operacoes_rollup_diario
+        (dia, status, uf_destino, cliente_id, total_operacoes, soma_valor_mercadoria, soma_valor_frete)
+    SELECT dia_operacao(data_emissao), status, uf_destino, cliente_id,
+           COUNT(*), SUM(valor_mercadoria), COALESCE(SUM(valor_frete), 0)
+    FROM operacoes_logisticas
+    GROUP BY 1, 2, 3, 4;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TRUNCATE não dispara os triggers de linha/instrução acima; limpa o rollup junto.
+CREATE OR REPLACE FUNCTION limpar_operacoes_rollup() RETURNS trigger AS $$
+BEGIN
+    TRUNCATE operacoes_rollup_diario;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Uma tabela de transição por evento: o PostgreSQL não permite REFERENCING com múltiplos eventos.
+DROP TRIGGER IF EXISTS trg_rollup_insert ON operacoes_logisticas;
+CREATE TRIGGER trg_rollup_insert AFTER INSERT ON operacoes_logisticas
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_operacoes_rollup();
+
+DROP TRIGGER IF EXISTS trg_rollup_update ON operacoes_logisticas;
+CREATE TRIGGER trg_rollup_update AFTER UPDATE ON operacoes_logisticas
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_operacoes_rollup();
+
+DROP TRIGGER IF EXISTS trg_rollup_delete ON operacoes_logisticas;
+CREATE TRIGGER trg_rollup_delete AFTER DELETE ON operacoes_logisticas
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_operacoes_rollup();
+
+DROP TRIGGER IF EXISTS trg_rollup_truncate ON operacoes_logisticas;
+CREATE TRIGGER trg_rollup_truncate AFTER TRUNCATE ON operacoes_logisticas
+    FOR EACH STATEMENT EXECUTE FUNCTION limpar_operacoes_rollup();
+
+-- Etapa 7: Aviso de alteração para o dashboard em tempo real
+-- Um NOTIFY por instrução (não por linha) no canal 'operacoes_alteradas'. O PostgreSQL
+-- agrupa avisos idênticos da mesma transação, e o backend agrupa rajadas em um só recálculo.
+CREATE OR REPLACE FUNCTION notificar_operacoes_alteradas() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('operacoes_alteradas', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_operacoes ON operacoes_logisticas;
+CREATE TRIGGER trg_notificar_operacoes AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON operacoes_logisticas
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_operacoes_alteradas();
+
+-- Em um banco que já possui operações, popula o rollup na primeira execução.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM operacoes_rollup_diario)
+       AND EXISTS (SELECT 1 FROM operacoes_logisticas) THEN
+        PERFORM reconstruir_operacoes_rollup();
+    END IF;
+END$$;
+
+-- Etapa 8: Partições mensais (apenas quando 'operacoes_logisticas' é particionada)
+-- Cria as partições que cobrem [inicio, fim) (por padrão, o mês atual e os 3 seguintes) e a
+-- partição padrão, que recebe linhas fora de qualquer partição para que nenhuma escrita falhe.
+-- Se a partição padrão já tiver linhas de um mês novo, elas são movidas para a partição criada
+-- diretamente entre as partições: os triggers (definidos na tabela principal) não disparam
+-- e o rollup continua correto. Em tabelas não particionadas, a função não faz nada.
+-- Para arquivar um mês antigo: ALTER TABLE operacoes_logisticas DETACH PARTITION operacoes_logisticas_AAAA_MM;
+-- (o rollup mantém os agregados do mês até a próxima reconstrução).
+CREATE OR REPLACE FUNCTION criar_particoes_operacoes(
+    inicio DATE DEFAULT CURRENT_DATE,
+    fim DATE DEFAULT CAST(date_trunc('month', CURRENT_DATE) + INTERVAL '4 months' AS DATE)
+) RETURNS INTEGER AS $$
+DECLARE
+    mes DATE := CAST(date_trunc('month', inicio) AS DATE);
+    proximo DATE;
+    nome TEXT;
+    criadas INTEGER := 0;
+BEGIN
+    -- Roda na inicialização de cada worker da API e pelo pg_cron: chamadas simultâneas são
+    -- serializadas (até o fim da transação), em vez de disputarem o CREATE TABLE das partições
+    -- e a movimentação das linhas da partição padrão.
+    PERFORM pg_advisory_xact_lock(hashtext('criar_particoes_operacoes'));
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table
+                   WHERE partrelid = to_regclass('operacoes_logisticas')) THEN
+        RETURN 0;
+    END IF;
+    IF to_regclass('operacoes_logisticas_padrao') IS NULL THEN
+        CREATE TABLE operacoes_logisticas_padrao PARTITION OF operacoes_logisticas DEFAULT;
+    END IF;
+
+    WHILE mes < fim LOOP
+        proximo := CAST(mes + INTERVAL '1 month' AS DATE);
+        nome := 'operacoes_logisticas_' || to_char(mes, 'YYYY_MM');
+        IF to_regclass(nome) IS NULL THEN
+            CREATE TEMP TABLE _operacoes_movidas (LIKE operacoes_logisticas) ON COMMIT DROP;
+            WITH movidas AS (
+                DELETE FROM operacoes_logisticas_padrao
+                WHERE data_emissao >= mes AND data_emissao < proximo
+                RETURNING *
+            )
+            INSERT INTO _operacoes_movidas SELECT * FROM movidas;
+
+            EXECUTE format('CREATE TABLE %I PARTITION OF operacoes_logisticas FOR VALUES FROM (%L) TO (%L)',
+                           nome, mes, proximo);
+            EXECUTE format('INSERT INTO %I SELECT * FROM _operacoes_movidas', nome);
+            DROP TABLE _operacoes_movidas;
+            criadas := criadas + 1;
+        END IF;
+        mes := proximo;
+    END LOOP;
+    RETURN criadas;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT criar_particoes_operacoes();
+
+-- Com o pg_cron instalado, garante as partições futuras diariamente (às 03:00).
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron')
+       AND EXISTS (SELECT 1 FROM pg_partitioned_table
+                   WHERE partrelid = to_regclass('operacoes_logisticas')) THEN
+        EXECUTE $cron$SELECT cron.schedule('datachat-particoes-operacoes', '0 3 * * *',
+                                           'SELECT criar_particoes_operacoes()')$cron$;
+    END IF;
+END$$;
+
+-- Etapa 9: Índices hipotéticos (HypoPG) para o consultor de índices da API (opcional)
+-- Sem a extensão (ou sem permissão para criá-la), as sugestões vêm sem estimativa de benefício.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'hypopg') THEN
+        CREATE EXTENSION IF NOT EXISTS hypopg;
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'Sem permissão para criar a extensão hypopg.';
+END$$;
+"""
+
+
+def _sql_funcao_dia(fuso_horario):
+    """DDL de `dia_operacao()`: o dia (no fuso informado) de uma data de emissão, usado pelo rollup."""
+    fuso = fuso_horario.replace("'", "''")
+    return f"""
+-- Dia de uma operação no fuso do negócio, independente do TimeZone da sessão que fez a escrita.
+CREATE OR REPLACE FUNCTION dia_operacao(data_emissao TIMESTAMPTZ) RETURNS DATE AS $$
+    SELECT CAST(data_emissao AT TIME ZONE '{fuso}' AS DATE);
+$$ LANGUAGE sql IMMUTABLE;
 """
 
-def setup_database():
+
+def montar_script_setup(particionada=False, fuso_horario=FUSO_HORARIO):
+    """Monta o script de setup com 'operacoes_logisticas' simples ou particionada por mês."""
+    tabela = SQL_TABELA_OPERACOES_PARTICIONADA if particionada else SQL_TABELA_OPERACOES
+    return _SQL_TIPOS_E_CLIENTES + tabela + _sql_funcao_dia(fuso_horario) + _SQL_INDICES_ROLLUP_E_AVISOS
+
+
+SQL_SETUP_SCRIPT = montar_script_setup()
+
+
+def parametros_conexao():
+    """Parâmetros de conexão lidos do .env (compartilhados com `migrar_particionamento.py`)."""
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "database": os.getenv("DB_NAME"),       
+        "user": os.getenv("DB_USER"),      
+        "password": os.getenv("DB_PASS"),       
+        "client_encoding": "utf8",
+        "sslmode": os.getenv("DB_SSLMODE", "require")
+    }
+
+
+def definicao_dia_operacao(cur):
+    """Corpo atual de `dia_operacao()` (ou None se ela ainda não existe)."""
+    cur.execute("SELECT prosrc FROM pg_proc WHERE oid = to_regprocedure('dia_operacao(timestamptz)');")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def reconstruir_rollup_se_fuso_mudou(cur, definicao_anterior):
+    """
+    Refaz o rollup se `dia_operacao()` acabou de ser criada ou alterada (ex: DASHBOARD_TIMEZONE mudou,
+    ou o rollup veio de uma versão que usava o fuso da sessão): os dias já gravados estariam em outro fuso.
+    """
+    if definicao_dia_operacao(cur) == definicao_anterior:
+        return False
+    cur.execute("SELECT EXISTS (SELECT 1 FROM operacoes_rollup_diario);")
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute("SELECT reconstruir_operacoes_rollup();")
+    return True
+
+
+def tabela_particionada(cur):
+    """Indica se 'operacoes_logisticas' já existe como tabela particionada."""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('operacoes_logisticas'));")
+    return cur.fetchone()[0]
+
+def setup_database(particionada=False):
     """
     Função principal para conectar ao PostgreSQL e executar o script de setup.
     """
     try:
-        db_params = {
-            "host": os.getenv("DB_HOST"),
-            "port": os.getenv("DB_PORT"),
-            "database": os.getenv("DB_NAME"),       
-            "user": os.getenv("DB_USER"),      
-            "password": os.getenv("DB_PASS"),       
-            "client_encoding": "utf8",
-            "sslmode": "require"
-        }
+        db_params = parametros_conexao()
         
         # Validação para garantir que todas as variáveis foram carregadas
         if not all(db_params.values()):
@@ -121,13 +457,23 @@ def setup_database():
         with psycopg2.connect(**db_params) as conn:
             with conn.cursor() as cur:
                 print("🚀 Executando o script de setup do banco de dados...")
-                cur.execute(SQL_SETUP_SCRIPT)
+                definicao_anterior = definicao_dia_operacao(cur)
+                cur.execute(montar_script_setup(particionada))
+                rollup_refeito = reconstruir_rollup_se_fuso_mudou(cur, definicao_anterior)
+                ja_particionada = tabela_particionada(cur)
                 
                 print("\n✅ Script executado com sucesso!")
                 print("   - Tipos ENUM verificados/criados.")
                 print("   - Tabela 'clientes' verificada/criada.")
-                print("   - Tabela 'operacoes_logisticas' verificada/criada.")
+                print("   - Tabela 'operacoes_logisticas' verificada/criada"
+                      f"{' (particionada por mês)' if ja_particionada else ''}.")
+                if particionada and not ja_particionada:
+                    print("   ⚠️  A tabela já existia sem particionamento. Use migrar_particionamento.py para convertê-la.")
                 print("   - Índices de performance verificados/criados.")
+                print("   - Tabela de agregados 'operacoes_rollup_diario' e seus triggers verificados/criados.")
+                if rollup_refeito:
+                    print(f"   - Rollup recalculado com os dias no fuso '{FUSO_HORARIO}'.")
+                print("   - Aviso de alteração (NOTIFY 'operacoes_alteradas') verificado/criado.")
                 print("\n✨ Seu banco de dados está pronto para ser usado! ✨")
 
     except psycopg2.OperationalError as e:
@@ -139,4 +485,7 @@ def setup_database():
         print(f"   Detalhes: {e}")
 
 if __name__ == '__main__':
-    setup_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cria (ou completa) a estrutura do banco de dados.")
+    parser.add_argument("--particionada", action="store_true",
+                        help="Cria 'operacoes_logisticas' particionada por mês em 'data_emissao'.")
+    setup_database(particionada=parser.parse_args().particionada)
\ No newline at end of file
@@ -0,0 +1,128 @@
+# =============================================================================
+# SCRIPT DE MIGRAÇÃO: 'operacoes_logisticas' SIMPLES -> PARTICIONADA POR MÊS
+#
+# Converte uma 'operacoes_logisticas' já existente (e com dados) para o layout
+# particionado criado por `criar_tabelas.py --particionada`:
+# 1. Renomeia a tabela atual (e seus índices) para 'operacoes_logisticas_antiga'.
+# 2. Cria a nova tabela particionada, com os mesmos índices, triggers e NOTIFY.
+# 3. Cria as partições mensais de todo o período existente (e os próximos meses).
+# 4. Copia as operações, mantendo os ids, e ajusta a sequência de ids.
+# 5. Confere a contagem, remove a tabela antiga (a menos que `--manter-antiga`)
+#    e atualiza as estatísticas (ANALYZE).
+#
+# Tudo acontece em UMA transação: em caso de erro, nada muda. Durante a cópia a
+# tabela fica bloqueada para escrita e leitura, então rode fora do horário de uso.
+# O rollup do dashboard não é recalculado: os dados copiados são os mesmos.
+#
+# Uso:
+#   python migrar_particionamento.py [--manter-antiga]
+# =============================================================================
+import argparse
+
+import psycopg2
+
+from criar_tabelas import (
+    definicao_dia_operacao, montar_script_setup, parametros_conexao, reconstruir_rollup_se_fuso_mudou,
+    tabela_particionada,
+)
+
+TABELA_ANTIGA = 'operacoes_logisticas_antiga'
+TRIGGERS = ('trg_rollup_insert', 'trg_rollup_update', 'trg_rollup_delete', 'trg_rollup_truncate', 'trg_notificar_operacoes')
+
+
+def migrar(manter_antiga=False):
+    """
+    Função principal: executa a migração completa em uma única transação.
+    """
+    try:
+        with psycopg2.connect(**parametros_conexao()) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('operacoes_logisticas') IS NOT NULL;")
+                if not cur.fetchone()[0]:
+                    print("❌ A tabela 'operacoes_logisticas' não existe. Rode criar_tabelas.py --particionada.")
+                    return
+                if tabela_particionada(cur):
+                    print("✅ A tabela 'operacoes_logisticas' já é particionada. Nada a fazer.")
+                    return
+
+                # --- 1. Tira a tabela atual do caminho ---
+                print("🔒 Bloqueando e renomeando a tabela atual...")
+                cur.execute("LOCK TABLE operacoes_logisticas IN ACCESS EXCLUSIVE MODE;")
+                cur.execute(f"ALTER TABLE operacoes_logisticas RENAME TO {TABELA_ANTIGA};")
+                # Os nomes de índices (inclusive os da chave primária e do UNIQUE) são globais no schema:
+                # renomeá-los libera os nomes para a nova tabela.
+                cur.execute("""
+                    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE i.indrelid = CAST(%s AS regclass);
+                """, (TABELA_ANTIGA,))
+                for (indice,) in cur.fetchall():
+                    cur.execute(f'ALTER INDEX "{indice}" RENAME TO "{indice[:56]}_antiga";')
+                # Os triggers da tabela antiga não devem mais mexer no rollup nem avisar o dashboard.
+                for trigger in TRIGGERS:
+                    cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {TABELA_ANTIGA};")
+
+                # --- 2. Cria a tabela particionada (mesmo script do criar_tabelas.py) ---
+                print("🏗️  Criando a tabela particionada, índices e triggers...")
+                definicao_anterior = definicao_dia_operacao(cur)
+                cur.execute(montar_script_setup(particionada=True))
+
+                # --- 3. Partições de todo o período existente ---
+                cur.execute(f"SELECT CAST(MIN(data_emissao) AS DATE) FROM {TABELA_ANTIGA};")
+                inicio = cur.fetchone()[0]
+                if inicio:
+                    cur.execute("SELECT criar_particoes_operacoes(%s);", (inicio,))
+                    print(f"📅 {cur.fetchone()[0]} partições mensais criadas a partir de {inicio:%m/%Y}.")
+
+                # --- 4. Copia as operações ---
+                # O trigger de inserção fica desligado: o rollup já contém exatamente estas operações.
+                print("🚚 Copiando as operações...")
+                cur.execute(f"""
+                    SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position)
+                    FROM information_schema.columns
+                    WHERE table_schema = current_schema() AND table_name = '{TABELA_ANTIGA}';
+                """)
+                colunas = cur.fetchone()[0]
+                cur.execute("ALTER TABLE operacoes_logisticas DISABLE TRIGGER trg_rollup_insert;")
+                cur.execute(f"INSERT INTO operacoes_logisticas ({colunas}) SELECT {colunas} FROM {TABELA_ANTIGA};")
+                copiadas = cur.rowcount
+                cur.execute("ALTER TABLE operacoes_logisticas ENABLE TRIGGER trg_rollup_insert;")
+                # ...exceto se o fuso dos dias do rollup mudou com o script acima: aí ele é refeito.
+                if reconstruir_rollup_se_fuso_mudou(cur, definicao_anterior):
+                    print("📊 Rollup recalculado no fuso configurado.")
+                # Os novos ids continuam de onde a tabela antiga parou.
+                cur.execute("""
+                    SELECT setval(pg_get_serial_sequence('operacoes_logisticas', 'id'),
+                                  GREATEST((SELECT MAX(id) FROM operacoes_logisticas), 1));
+                """)
+
+                # --- 5. Conferência e limpeza ---
+                cur.execute(f"SELECT COUNT(*) FROM {TABELA_ANTIGA};")
+                originais = cur.fetchone()[0]
+                if originais != copiadas:
+                    raise RuntimeError(f"Contagem divergente: {originais} na tabela antiga, {copiadas} copiadas.")
+                if not manter_antiga:
+                    cur.execute(f"DROP TABLE {TABELA_ANTIGA};")
+                print(f"{copiadas} operações migradas.")
+
+        # ANALYZE fora da transação da migração, já com a nova tabela em uso.
+        with psycopg2.connect(**parametros_conexao()) as conn:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE operacoes_logisticas;")
+        print("\n✅ Migração concluída! 'operacoes_logisticas' agora é particionada por mês.")
+        if manter_antiga:
+            print(f"   A tabela original foi mantida como '{TABELA_ANTIGA}'.")
+
+    except psycopg2.OperationalError as e:
+        print(f"\n❌ ERRO DE CONEXÃO: Não foi possível conectar ao banco de dados.")
+        print(f"   Detalhes: {e}")
+    except (psycopg2.Error, RuntimeError) as e:
+        print(f"\n❌ A migração falhou e foi desfeita:")
+        print(f"   Detalhes: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converte 'operacoes_logisticas' para o layout particionado por mês.")
+    parser.add_argument("--manter-antiga", action="store_true",
+                        help=f"Mantém a tabela original como '{TABELA_ANTIGA}' em vez de removê-la.")
+    migrar(manter_antiga=parser.parse_args().manter_antiga)
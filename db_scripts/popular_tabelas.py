@@ -6,12 +6,44 @@
 #
 # O script usa a biblioteca Faker para gerar dados realistas e os insere em
 # massa para melhor performance. 
+#
+# As operações são geradas sob demanda (generator) e enviadas ao COPY em blocos
+# de tamanho fixo, então o uso de memória é constante: é possível gerar dezenas
+# de milhões de linhas para testes de carga.
+#
+# As operações são divididas em blocos de tamanho fixo, cada um com sua própria
+# semente derivada de `--seed`. Com `--processos N`, os blocos são distribuídos
+# entre N processos, cada um com sua conexão e seus COPYs; para uma mesma seed
+# (no mesmo dia) o conjunto de dados gerado é o mesmo, com 1 ou N processos.
+#
+# Há dois geradores de operações (`--gerador`):
+# - "numpy" (padrão): gera cada coluna do bloco inteiro de uma vez com NumPy e
+#   usa o Faker só para pequenos conjuntos de textos (nomes). Ordem de grandeza
+#   mais rápido.
+# - "faker": o gerador original, linha a linha com `random` e Faker.
+#
+# Com `--carga-em-massa`, os índices não únicos de 'operacoes_logisticas' são
+# removidos antes do COPY e recriados em paralelo depois, e o rollup do dashboard
+# é reconstruído de uma vez no final (em vez de mantido pelo trigger).
+# Ao final, as estatísticas do planejador são atualizadas com `ANALYZE`.
+#
+# Uso:
+#   python popular_tabelas.py                      # 250.000 operações (padrão)
+#   python popular_tabelas.py --operacoes 10000000 --processos 8 --seed 42 --carga-em-massa
 # =============================================================================
+import argparse
+import itertools
+import multiprocessing
 import os
+import time
 from pathlib import Path
 import random
+import string
+import numpy as np
 import psycopg2
+import psycopg2.extras
 import io
+from concurrent.futures import ThreadPoolExecutor
 from faker import Faker
 from dotenv import load_dotenv
 from decimal import Decimal
@@ -24,6 +56,14 @@ load_dotenv(BASE_DIR / "backend" / ".env")
 # --- CONFIGURAÇÕES ---
 NUMERO_DE_CLIENTES = 120
 NUMERO_DE_OPERACOES = 250000 
+# Quantidade de caracteres lida do gerador a cada envio de dados do COPY ao banco.
+TAMANHO_BLOCO_COPY = 256 * 1024
+# A cada quantas operações o progresso é impresso (além do final).
+INTERVALO_PROGRESSO = 100000
+# Operações por bloco: a unidade de semente (determinismo) e de trabalho de cada processo.
+TAMANHO_BLOCO_OPERACOES = 50000
+# Quantidade de nomes pré-gerados pelo Faker para as observações do gerador NumPy.
+TAMANHO_POOL_NOMES = 500
 
 # Inicializa o Faker para gerar dados em Português do Brasil
 fake = Faker('pt_BR')
@@ -41,6 +81,7 @@ LOCAIS_BRASIL = [
 # Listas de opções para os campos de operação
 TIPOS_OPERACAO = ['TRANSPORTE', 'ARMAZENAGEM']
 STATUS_OPERACAO = ['SOLICITADO', 'AGUARDANDO_COLETA', 'EM_TRANSITO', 'ARMAZENADO', 'ENTREGUE', 'CANCELADO']
+PESOS_STATUS = [10, 10, 30, 10, 35, 5]
 NATUREZA_CARGA = ['Eletrônicos', 'Peças Automotivas', 'Alimentos Não Perecíveis', 'Têxteis', 'Cosméticos', 'Móveis', 'Farmacêuticos']
 OBSERVACOES_TEMPLATES = [
     "Entregar em horário comercial.", "Cuidado: Carga frágil.",
@@ -50,110 +91,416 @@ OBSERVACOES_TEMPLATES = [
 ]
 
 
-def popular_banco():
+COLUNAS_OPERACOES = (
+    'codigo_operacao', 'tipo', 'status', 'cliente_id', 'data_emissao', 'data_previsao_entrega', 
+    'data_entrega_realizada', 'uf_coleta', 'cidade_coleta', 'uf_destino', 'cidade_destino', 
+    'peso_kg', 'quantidade_volumes', 'valor_mercadoria', 'natureza_carga', 'valor_frete', 
+    'valor_seguro', 'codigo_rastreio', 'observacoes'
+)
+
+
+class IteradorComoArquivo(io.TextIOBase):
     """
-    Função principal para conectar ao banco e popular as tabelas.
+    Adapta um iterador de linhas de texto para a interface de arquivo esperada pelo
+    `copy_from` do psycopg2. A cada `read(size)` consome apenas as linhas necessárias
+    para preencher o bloco, então nunca há mais do que um bloco em memória.
     """
-    try:
-        db_params = {
-            "host": os.getenv("DB_HOST"),
-            "port": os.getenv("DB_PORT"),
-            "database": os.getenv("DB_NAME"),       
-            "user": os.getenv("DB_USER"),      
-            "password": os.getenv("DB_PASS"),       
-            "client_encoding": "utf8",
-            "sslmode": "require"
-        }
+
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._resto = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        partes, tamanho = [self._resto], len(self._resto)
+        while size is None or size < 0 or tamanho < size:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            partes.append(linha)
+            tamanho += len(linha)
+        dados = "".join(partes)
+        if size is None or size < 0:
+            self._resto = ""
+            return dados
+        self._resto = dados[size:]
+        return dados[:size]
+
+
+def conectar():
+    """Abre uma conexão com o banco usando as variáveis do .env."""
+    db_params = {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "database": os.getenv("DB_NAME"),       
+        "user": os.getenv("DB_USER"),      
+        "password": os.getenv("DB_PASS"),       
+        "client_encoding": "utf8",
+        "sslmode": os.getenv("DB_SSLMODE", "require")
+    }
+    return psycopg2.connect(**db_params)
+
+
+def gerar_clientes(quantidade):
+    """Gera os dados de `quantidade` clientes (PF e PJ)."""
+    clientes = []
+    for _ in range(quantidade):
+        # Decide aleatoriamente (80% de chance de ser PJ)
+        if random.choices(['PJ', 'PF'], weights=[80, 20], k=1)[0] == 'PJ':
+            nome = fake.company()
+            documento = fake.cnpj()
+            email = f"contato@{nome.lower().replace(' ', '').replace(',', '')[:15]}.com"
+        else:
+            nome = fake.name()
+            documento = fake.cpf()
+            email = f"{nome.lower().replace(' ', '.')}@{fake.free_email_domain()}"
+        
+        telefone = fake.phone_number()
+        clientes.append((nome, documento, email, telefone))
+    return clientes
+
+
+def semear(seed, chave):
+    """Reinicia os geradores aleatórios (random e Faker) a partir da seed e de uma chave (ex: o bloco)."""
+    semente = f"{seed}-{chave}"
+    random.seed(semente)
+    fake.seed_instance(semente)
+
+
+def gerar_operacoes(id_clientes, quantidade, inicio=0, referencia=None):
+    """
+    Gera (sob demanda) as tuplas das operações `inicio` até `inicio + quantidade - 1`,
+    na ordem de `COLUNAS_OPERACOES`, com datas de emissão nos 2 anos anteriores a `referencia`.
+    """
+    referencia = referencia or datetime.now()
+    for i in range(inicio, inicio + quantidade):
+        cliente_id = random.choice(id_clientes)
+        origem = random.choice(LOCAIS_BRASIL)
+        destino = random.choice([loc for loc in LOCAIS_BRASIL if loc != origem])
+        
+        status = random.choices(STATUS_OPERACAO, weights=PESOS_STATUS, k=1)[0]
+        data_emissao = fake.date_time_between(start_date=referencia - timedelta(days=730), end_date=referencia, tzinfo=None)
+        data_previsao_entrega = data_emissao + timedelta(days=random.randint(2, 15))
+        data_entrega_realizada = None
+        if status == 'ENTREGUE':
+            data_entrega_realizada = data_previsao_entrega + timedelta(days=random.randint(-2, 1))
+
+        valor_mercadoria = Decimal(str(round(random.uniform(500.00, 50000.00), 2)))
+        valor_frete = valor_mercadoria * Decimal(str(random.uniform(0.05, 0.15)))
+        valor_seguro = valor_mercadoria * Decimal(str(random.uniform(0.003, 0.015)))
+        
+        observacao_template = random.choice(OBSERVACOES_TEMPLATES)
+        observacao = observacao_template.format(nome=fake.first_name()) if observacao_template and '{nome}' in observacao_template else observacao_template
         
-        with psycopg2.connect(**db_params) as conn:
+        yield (
+            f"OP-{data_emissao.year}-{i+1:06d}", random.choice(TIPOS_OPERACAO), status, cliente_id, data_emissao,
+            data_previsao_entrega.date(), data_entrega_realizada, origem[1], origem[0], destino[1], destino[0],
+            Decimal(str(round(random.uniform(5.5, 2000.0), 3))), random.randint(1, 50),
+            valor_mercadoria, random.choice(NATUREZA_CARGA),
+            valor_frete.quantize(Decimal('0.01')), 
+            valor_seguro.quantize(Decimal('0.01')), 
+            fake.bothify(text='??#########??').upper(),
+            observacao
+        )
+
+
+def dividir_em_blocos(total, tamanho=TAMANHO_BLOCO_OPERACOES):
+    """Divide o intervalo de operações em blocos `(inicio, quantidade)` de tamanho fixo."""
+    return [(inicio, min(tamanho, total - inicio)) for inicio in range(0, total, tamanho)]
+
+
+def gerar_bloco(id_clientes, bloco, seed, referencia):
+    """Gera as operações de um bloco com a semente própria dele (o resultado não depende de quem o gera)."""
+    inicio, quantidade = bloco
+    semear(seed, inicio)
+    yield from gerar_operacoes(id_clientes, quantidade, inicio, referencia)
+
+
+_pool_nomes = {}
+
+def _nomes(seed):
+    # Pequeno conjunto de nomes do Faker (gerado uma vez por processo e por seed) sorteado pelo NumPy.
+    if seed not in _pool_nomes:
+        semear(seed, "nomes")
+        _pool_nomes[seed] = [fake.first_name() for _ in range(TAMANHO_POOL_NOMES)]
+    return _pool_nomes[seed]
+
+
+def _como_texto(valores):
+    return valores.astype(str)
+
+
+def gerar_linhas_numpy(id_clientes, bloco, seed, referencia):
+    """
+    Gera as linhas do COPY de um bloco de forma vetorizada: cada coluna é sorteada para o bloco
+    inteiro de uma vez (um `default_rng` por bloco, derivado da seed) e as linhas são apenas
+    a junção dos textos já formatados. Mesma distribuição do gerador "faker".
+    """
+    inicio, quantidade = bloco
+    rng = np.random.default_rng([seed, inicio])
+    n = quantidade
+
+    # Cliente, origem e destino (o destino é sorteado entre os demais locais, nunca igual à origem).
+    clientes = rng.choice(np.asarray(id_clientes), n)
+    ufs = np.array([uf for _, uf in LOCAIS_BRASIL])
+    cidades = np.array([cidade for cidade, _ in LOCAIS_BRASIL])
+    origem = rng.integers(0, len(LOCAIS_BRASIL), n)
+    destino = (origem + rng.integers(1, len(LOCAIS_BRASIL), n)) % len(LOCAIS_BRASIL)
+
+    # Status com os mesmos pesos do gerador linha a linha.
+    pesos = np.asarray(PESOS_STATUS, dtype=float)
+    status = rng.choice(len(STATUS_OPERACAO), n, p=pesos / pesos.sum())
+    entregue = status == STATUS_OPERACAO.index('ENTREGUE')
+
+    # Datas: emissão nos 2 anos anteriores à referência, previsão de 2 a 15 dias depois e,
+    # para as entregues, entrega realizada entre 2 dias antes e 1 dia depois da previsão.
+    fim = np.datetime64(referencia, 's')
+    emissao = fim - np.timedelta64(730, 'D') + rng.integers(0, 730 * 86400, n).astype('timedelta64[s]')
+    previsao = emissao + rng.integers(2, 16, n).astype('timedelta64[D]')
+    realizada = previsao + rng.integers(-2, 2, n).astype('timedelta64[D]')
+
+    # Valores monetários e de carga.
+    valor_mercadoria = np.round(rng.uniform(500.00, 50000.00, n), 2)
+    valor_frete = np.round(valor_mercadoria * rng.uniform(0.05, 0.15, n), 2)
+    valor_seguro = np.round(valor_mercadoria * rng.uniform(0.003, 0.015, n), 2)
+    peso = np.round(rng.uniform(5.5, 2000.0, n), 3)
+    volumes = rng.integers(1, 51, n)
+
+    # Código de rastreio no formato '??#########??' (letras maiúsculas e dígitos).
+    letras = np.array(list(string.ascii_uppercase))
+    digitos = np.array(list(string.digits))
+    rastreio = np.concatenate([
+        letras[rng.integers(0, 26, (n, 2))],
+        digitos[rng.integers(0, 10, (n, 9))],
+        letras[rng.integers(0, 26, (n, 2))],
+    ], axis=1).view('<U13').ravel()
+
+    # Observações: os modelos com `{nome}` recebem um nome do pool gerado pelo Faker.
+    modelos = rng.integers(0, len(OBSERVACOES_TEMPLATES), n)
+    nomes = rng.integers(0, TAMANHO_POOL_NOMES, n)
+    observacoes = np.asarray([_valor_copy(modelo) for modelo in OBSERVACOES_TEMPLATES])[modelos]
+    for i, modelo in enumerate(OBSERVACOES_TEMPLATES):
+        if modelo and '{nome}' in modelo:
+            preenchidos = np.asarray([_valor_copy(modelo.format(nome=nome)) for nome in _nomes(seed)])
+            observacoes = np.where(modelos == i, preenchidos[nomes], observacoes)
+
+    anos = _como_texto(emissao.astype('datetime64[Y]'))
+    sequencias = np.char.zfill(_como_texto(np.arange(inicio + 1, inicio + n + 1)), 6)
+    colunas = [
+        np.char.add(np.char.add(np.char.add('OP-', anos), '-'), sequencias),
+        np.asarray(TIPOS_OPERACAO)[rng.integers(0, len(TIPOS_OPERACAO), n)],
+        np.asarray(STATUS_OPERACAO)[status],
+        _como_texto(clientes),
+        np.datetime_as_string(emissao, unit='s'),
+        np.datetime_as_string(previsao.astype('datetime64[D]')),
+        np.where(entregue, np.datetime_as_string(realizada, unit='s'), '\\N'),
+        ufs[origem], cidades[origem], ufs[destino], cidades[destino],
+        _como_texto(peso), _como_texto(volumes), _como_texto(valor_mercadoria),
+        np.asarray(NATUREZA_CARGA)[rng.integers(0, len(NATUREZA_CARGA), n)],
+        _como_texto(valor_frete), _como_texto(valor_seguro),
+        rastreio,
+        observacoes,
+    ]
+    colunas = [c.tolist() for c in colunas]
+    for campos in zip(*colunas):
+        yield '\t'.join(campos) + '\n'
+
+
+def linhas_do_bloco(id_clientes, bloco, seed, referencia, gerador="numpy"):
+    """Retorna as linhas do COPY de um bloco com o gerador escolhido ("numpy" ou "faker")."""
+    if gerador == "numpy":
+        return gerar_linhas_numpy(id_clientes, bloco, seed, referencia)
+    return map(formatar_linha_copy, gerar_bloco(id_clientes, bloco, seed, referencia))
+
+
+def _valor_copy(valor):
+    # Formato texto do COPY: NULL é `\N` e barras, tabs e quebras de linha não podem aparecer crus.
+    if valor is None:
+        return '\\N'
+    return str(valor).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ').replace('\r', ' ')
+
+
+def formatar_linha_copy(operacao):
+    """Converte a tupla de uma operação em uma linha do COPY (formato texto)."""
+    return '\t'.join(_valor_copy(v) for v in operacao) + '\n'
+
+
+def com_progresso(linhas, total, intervalo_progresso=INTERVALO_PROGRESSO):
+    """Repassa as linhas do COPY, imprimindo o progresso a cada `intervalo_progresso` linhas."""
+    inicio = time.monotonic()
+    geradas = 0
+    for linha in linhas:
+        yield linha
+        geradas += 1
+        if intervalo_progresso and (geradas % intervalo_progresso == 0 or geradas == total):
+            decorrido = time.monotonic() - inicio
+            print(f"  {geradas}/{total} operações ({geradas / total:.0%}) - {geradas / max(decorrido, 1e-9):.0f} linhas/s", flush=True)
+
+
+def _carregar_blocos(args):
+    """
+    Trabalho de um processo: abre sua PRÓPRIA conexão e envia cada bloco em um COPY
+    (com commit por bloco). Retorna quantas operações inseriu.
+    """
+    blocos, id_clientes, seed, referencia, gerador = args
+    inseridas = 0
+    conn = conectar()
+    try:
+        with conn.cursor() as cur:
+            for bloco in blocos:
+                inicio, quantidade = bloco
+                linhas = linhas_do_bloco(id_clientes, bloco, seed, referencia, gerador)
+                cur.copy_from(IteradorComoArquivo(linhas), 'operacoes_logisticas', columns=COLUNAS_OPERACOES, sep='\t', size=TAMANHO_BLOCO_COPY)
+                conn.commit()
+                inseridas += cur.rowcount
+                print(f"  [processo {os.getpid()}] operações {inicio + 1} a {inicio + quantidade} inseridas.", flush=True)
+    finally:
+        conn.close()
+    return inseridas
+
+
+def _indices_nao_unicos(cur, tabela='operacoes_logisticas'):
+    """Retorna `(nome, definição)` dos índices da tabela que não garantem unicidade (nem chave primária)."""
+    cur.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = CAST(%s AS regclass) AND NOT i.indisunique AND NOT i.indisprimary
+        ORDER BY c.relname;
+    """, (tabela,))
+    return cur.fetchall()
+
+
+def _recriar_indices(indices, paralelismo):
+    """
+    Recria os índices em paralelo, um por conexão: vários `CREATE INDEX` na mesma tabela
+    podem rodar ao mesmo tempo (e cada um ainda pode usar os workers paralelos do PostgreSQL).
+    `IF NOT EXISTS` torna a operação segura para ser repetida.
+    """
+    def recriar(indice):
+        nome, definicao = indice
+        conn = conectar()
+        try:
+            conn.autocommit = True
             with conn.cursor() as cur:
-                print("Conexão bem-sucedida. Iniciando a população do banco de dados...")
+                inicio = time.monotonic()
+                # Em tabelas particionadas, a definição vem como `ON ONLY` (só o índice "pai", sem as partições).
+                definicao = definicao.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1).replace(" ON ONLY ", " ON ", 1)
+                cur.execute(definicao)
+            print(f"  Índice {nome} recriado em {time.monotonic() - inicio:.1f}s.", flush=True)
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(paralelismo, len(indices)))) as executor:
+        list(executor.map(recriar, indices))
+
+
+def popular_banco(numero_de_operacoes=NUMERO_DE_OPERACOES, numero_de_clientes=NUMERO_DE_CLIENTES,
+                  processos=1, seed=None, gerador="numpy", carga_em_massa=False):
+    """
+    Função principal para conectar ao banco e popular as tabelas.
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+    # Datas relativas ao início do dia, para que a mesma seed gere os mesmos dados durante todo o dia.
+    referencia = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    paralelo = processos > 1
+    # Vários COPYs simultâneos disputariam (e poderiam travar) as mesmas linhas do rollup no trigger
+    # de inserção; na carga em massa, recalcular tudo no final também é mais barato.
+    adiar_rollup = paralelo or carga_em_massa
+    try:
+        conn = conectar()
+        try:
+            with conn, conn.cursor() as cur:
+                print(f"Conexão bem-sucedida. Iniciando a população do banco de dados (seed {seed}, gerador {gerador})...")
 
                 # --- 1. Limpar tabelas ---
                 print("Limpando dados existentes...")
                 cur.execute("TRUNCATE TABLE clientes RESTART IDENTITY CASCADE;")
 
                 # --- 2. Gerar e Inserir Clientes (COM LÓGICA DE PF/PJ) ---
-                print(f"Gerando {NUMERO_DE_CLIENTES} clientes (PF e PJ)...")
-                clientes_para_inserir = []
-                # <--- ALTERADO: Lógica para gerar PF e PJ ---
-                for _ in range(NUMERO_DE_CLIENTES):
-                    # Decide aleatoriamente (80% de chance de ser PJ)
-                    if random.choices(['PJ', 'PF'], weights=[80, 20], k=1)[0] == 'PJ':
-                        nome = fake.company()
-                        documento = fake.cnpj()
-                        email = f"contato@{nome.lower().replace(' ', '').replace(',', '')[:15]}.com"
-                    else:
-                        nome = fake.name()
-                        documento = fake.cpf()
-                        email = f"{nome.lower().replace(' ', '.')}@{fake.free_email_domain()}"
-                    
-                    telefone = fake.phone_number()
-                    clientes_para_inserir.append((nome, documento, email, telefone))
+                print(f"Gerando {numero_de_clientes} clientes (PF e PJ)...")
+                semear(seed, "clientes")
+                clientes_para_inserir = gerar_clientes(numero_de_clientes)
                 
+                # Um único INSERT com todos os clientes; os ids voltam na ordem de inserção.
                 print("Inserindo clientes no banco de dados...")
-                sql_insert_clientes = "INSERT INTO clientes (nome_razao_social, cnpj_cpf, email_contato, telefone_contato) VALUES (%s, %s, %s, %s) RETURNING id;"
-                
-                id_clientes = []
-                for record in clientes_para_inserir:
-                    cur.execute(sql_insert_clientes, record)
-                    id_clientes.append(cur.fetchone()[0])
+                sql_insert_clientes = "INSERT INTO clientes (nome_razao_social, cnpj_cpf, email_contato, telefone_contato) VALUES %s RETURNING id;"
+                id_clientes = [linha[0] for linha in psycopg2.extras.execute_values(
+                    cur, sql_insert_clientes, clientes_para_inserir, page_size=len(clientes_para_inserir), fetch=True
+                )]
                 
                 print(f"{len(id_clientes)} clientes inseridos com sucesso.")
 
-                # --- 3. Gerar Operações Logísticas (em memória) ---
-                print(f"Gerando {NUMERO_DE_OPERACOES} operações logísticas...")
-                operacoes_para_inserir = []
-                for i in range(NUMERO_DE_OPERACOES):
-                    cliente_id = random.choice(id_clientes)
-                    origem = random.choice(LOCAIS_BRASIL)
-                    destino = random.choice([loc for loc in LOCAIS_BRASIL if loc != origem])
-                    
-                    status = random.choices(STATUS_OPERACAO, weights=[10, 10, 30, 10, 35, 5], k=1)[0]
-                    data_emissao = fake.date_time_between(start_date='-2y', end_date='now', tzinfo=None)
-                    data_previsao_entrega = data_emissao + timedelta(days=random.randint(2, 15))
-                    data_entrega_realizada = None
-                    if status == 'ENTREGUE':
-                        data_entrega_realizada = data_previsao_entrega + timedelta(days=random.randint(-2, 1))
-
-                    valor_mercadoria = Decimal(str(round(random.uniform(500.00, 50000.00), 2)))
-                    valor_frete = valor_mercadoria * Decimal(str(random.uniform(0.05, 0.15)))
-                    valor_seguro = valor_mercadoria * Decimal(str(random.uniform(0.003, 0.015)))
-                    
-                    observacao_template = random.choice(OBSERVACOES_TEMPLATES)
-                    observacao = observacao_template.format(nome=fake.first_name()) if observacao_template and '{nome}' in observacao_template else observacao_template
-                    
-                    operacao = (
-                        f"OP-{data_emissao.year}-{i+1:06d}", random.choice(TIPOS_OPERACAO), status, cliente_id, data_emissao,
-                        data_previsao_entrega.date(), data_entrega_realizada, origem[1], origem[0], destino[1], destino[0],
-                        Decimal(str(round(random.uniform(5.5, 2000.0), 3))), random.randint(1, 50),
-                        valor_mercadoria, random.choice(NATUREZA_CARGA),
-                        valor_frete.quantize(Decimal('0.01')), 
-                        valor_seguro.quantize(Decimal('0.01')), 
-                        fake.bothify(text='??#########??').upper(),
-                        observacao
-                    )
-                    operacoes_para_inserir.append(operacao)
-                
-                # --- 4. Inserir Operações Logísticas (em massa com COPY) ---
-                print("Inserindo operações no banco de dados com COPY...")
-                buffer = io.StringIO()
-                for operacao in operacoes_para_inserir:
-                    linha = '\t'.join(str(v).replace('\t', ' ') if v is not None else '\\N' for v in operacao)
-                    buffer.write(linha + '\n')
-                
-                buffer.seek(0)
-                
-                colunas = (
-                    'codigo_operacao', 'tipo', 'status', 'cliente_id', 'data_emissao', 'data_previsao_entrega', 
-                    'data_entrega_realizada', 'uf_coleta', 'cidade_coleta', 'uf_destino', 'cidade_destino', 
-                    'peso_kg', 'quantidade_volumes', 'valor_mercadoria', 'natureza_carga', 'valor_frete', 
-                    'valor_seguro', 'codigo_rastreio', 'observacoes'
-                )
-                cur.copy_from(buffer, 'operacoes_logisticas', columns=colunas, sep='\t')
-                
-                print(f"{cur.rowcount} operações inseridas com sucesso.")
-                print("\n✅ População do banco de dados concluída!")
+                # Com 'operacoes_logisticas' particionada, cria antes as partições mensais do período gerado
+                # (sem elas, as linhas iriam todas para a partição padrão). Em tabelas simples, não faz nada.
+                cur.execute("SELECT to_regproc('criar_particoes_operacoes') IS NOT NULL;")
+                if cur.fetchone()[0]:
+                    cur.execute("SELECT criar_particoes_operacoes(%s);", (referencia.date() - timedelta(days=731),))
+
+                if adiar_rollup:
+                    cur.execute("ALTER TABLE operacoes_logisticas DISABLE TRIGGER trg_rollup_insert;")
+
+                indices = []
+                if carga_em_massa:
+                    # Índices não únicos são removidos durante o COPY e recriados depois (construir um
+                    # índice de uma vez é bem mais barato que atualizá-lo linha a linha). Os únicos e a
+                    # chave primária permanecem, pois garantem a integridade dos dados.
+                    indices = _indices_nao_unicos(cur)
+                    for nome, _ in indices:
+                        cur.execute(f'DROP INDEX IF EXISTS "{nome}";')
+                    print(f"Carga em massa: {len(indices)} índices removidos até o fim do COPY.")
+
+            # --- 3. Gerar e Inserir Operações Logísticas (em fluxo, com COPY) ---
+            blocos = dividir_em_blocos(numero_de_operacoes)
+            try:
+                if not paralelo:
+                    # Nenhuma lista com todas as operações é montada: o COPY lê blocos de
+                    # `TAMANHO_BLOCO_COPY` caracteres e cada bloco gera só as linhas que cabem nele.
+                    print(f"Gerando e inserindo {numero_de_operacoes} operações logísticas com COPY...")
+                    with conn, conn.cursor() as cur:
+                        linhas = itertools.chain.from_iterable(
+                            linhas_do_bloco(id_clientes, bloco, seed, referencia, gerador) for bloco in blocos
+                        )
+                        arquivo = IteradorComoArquivo(com_progresso(linhas, numero_de_operacoes))
+                        # Sem carga em massa, o COPY dispara UMA vez o trigger de instrução que atualiza
+                        # 'operacoes_rollup_diario' (o TRUNCATE acima também já o esvaziou).
+                        cur.copy_from(arquivo, 'operacoes_logisticas', columns=COLUNAS_OPERACOES, sep='\t', size=TAMANHO_BLOCO_COPY)
+                        inseridas = cur.rowcount
+                else:
+                    print(f"Gerando e inserindo {numero_de_operacoes} operações logísticas com {processos} processos "
+                          f"({len(blocos)} blocos de até {TAMANHO_BLOCO_OPERACOES})...")
+                    # Os blocos são distribuídos em rodízio: cada processo recebe uma fatia e usa uma única conexão.
+                    tarefas = [(blocos[i::processos], id_clientes, seed, referencia, gerador) for i in range(processos)]
+                    with multiprocessing.Pool(processos) as pool:
+                        inseridas = sum(pool.map(_carregar_blocos, tarefas))
+            finally:
+                # Executado mesmo após falhas, para nunca deixar a tabela sem índices ou sem o trigger.
+                if indices:
+                    print(f"Recriando {len(indices)} índices em paralelo...")
+                    _recriar_indices(indices, paralelismo=max(processos, os.cpu_count() or 1))
+                if adiar_rollup:
+                    # Religa o trigger e recalcula o rollup de uma vez a partir da tabela.
+                    with conn, conn.cursor() as cur:
+                        cur.execute("ALTER TABLE operacoes_logisticas ENABLE TRIGGER trg_rollup_insert;")
+                        cur.execute("SELECT reconstruir_operacoes_rollup();")
+            print(f"{inseridas} operações inseridas com sucesso.")
+            if adiar_rollup:
+                print("Agregados do dashboard (operacoes_rollup_diario) reconstruídos.")
+            else:
+                print("Agregados do dashboard (operacoes_rollup_diario) atualizados pelos triggers.")
+
+            # --- 4. Estatísticas do planejador ---
+            # Sem isso, o dashboard e o chat começariam com planos escolhidos para tabelas vazias.
+            print("Atualizando as estatísticas do planejador (ANALYZE)...")
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE clientes, operacoes_logisticas, operacoes_rollup_diario;")
+            print("\n✅ População do banco de dados concluída!")
+        finally:
+            conn.close()
 
     except psycopg2.OperationalError as e:
         print(f"\n❌ ERRO DE CONEXÃO: Não foi possível conectar ao banco de dados.")
@@ -161,5 +508,28 @@ def popular_banco():
         print(f"\n❌ Ocorreu um erro inesperado: {e}")
 
 
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Popula o banco com dados de teste (APAGA os dados existentes).")
+    parser.add_argument("-n", "--operacoes", type=int, default=NUMERO_DE_OPERACOES,
+                        help=f"Quantidade de operações logísticas a gerar (padrão: {NUMERO_DE_OPERACOES}).")
+    parser.add_argument("--clientes", type=int, default=NUMERO_DE_CLIENTES,
+                        help=f"Quantidade de clientes a gerar (padrão: {NUMERO_DE_CLIENTES}).")
+    parser.add_argument("-p", "--processos", type=int, default=1,
+                        help="Processos geradores em paralelo, cada um com sua conexão (padrão: 1).")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Semente para gerar sempre o mesmo conjunto de dados (padrão: aleatória, exibida no início).")
+    parser.add_argument("--gerador", choices=("numpy", "faker"), default="numpy",
+                        help="Gerador das operações: vetorizado com NumPy (padrão) ou linha a linha com Faker.")
+    parser.add_argument("--carga-em-massa", action="store_true",
+                        help="Remove os índices não únicos durante o COPY, recria-os em paralelo e reconstrói o rollup no final.")
+    args = parser.parse_args()
+    if args.operacoes < 1 or args.clientes < 1 or args.processos < 1:
+        parser.error("--operacoes, --clientes e --processos devem ser maiores que zero.")
+    return args
+
+
 if __name__ == '__main__':
-    popular_banco()
\ No newline at end of file
+    args = _argumentos()
+    popular_banco(numero_de_operacoes=args.operacoes, numero_de_clientes=args.clientes,
+                  processos=args.processos, seed=args.seed, gerador=args.gerador,
+                  carga_em_massa=args.carga_em_massa)
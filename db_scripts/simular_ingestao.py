@@ -0,0 +1,233 @@
+# =============================================================================
+# SIMULADOR DE INGESTÃO CONTÍNUA (CARGA DE ESCRITA)
+#
+# Complementa o `popular_tabelas.py` (carga única) simulando o sistema em
+# produção: novas operações chegam continuamente e as existentes avançam no
+# ciclo de vida, enquanto o dashboard e o chat são usados.
+#
+# A cada intervalo, o simulador:
+# 1. Insere novas operações (status 'SOLICITADO', emitidas agora) em um único INSERT.
+# 2. Avança o status de operações sorteadas em um único UPDATE:
+#    SOLICITADO -> AGUARDANDO_COLETA -> EM_TRANSITO -> EM_ROTA_DE_ENTREGA -> ENTREGUE
+#    (ARMAZENADO -> EM_ROTA_DE_ENTREGA; uma pequena parte das iniciais é CANCELADA).
+#
+# Cada instrução dispara os triggers do rollup e o NOTIFY do dashboard, como
+# em produção. Periodicamente são impressas as taxas efetivas, a latência das
+# escritas e, com `--api`, o quanto o dashboard está atrasado em relação ao banco.
+#
+# Uso:
+#   python simular_ingestao.py --insercoes-por-segundo 20 --atualizacoes-por-segundo 50
+#   python simular_ingestao.py --duracao 300 --api http://localhost:8000
+# =============================================================================
+import argparse
+import json
+import random
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+import psycopg2.extras
+
+from popular_tabelas import COLUNAS_OPERACOES, conectar, gerar_operacoes
+
+# --- CONFIGURAÇÕES ---
+INSERCOES_POR_SEGUNDO = 5
+ATUALIZACOES_POR_SEGUNDO = 10
+INTERVALO_SEGUNDOS = 1.0
+INTERVALO_RELATORIO_SEGUNDOS = 10
+# Chance de uma operação ainda não coletada ser cancelada em vez de avançar.
+PROBABILIDADE_CANCELAMENTO = 0.03
+
+# Ciclo de vida de uma operação: status atual -> próximo status.
+PROXIMO_STATUS = {
+    'SOLICITADO': 'AGUARDANDO_COLETA',
+    'AGUARDANDO_COLETA': 'EM_TRANSITO',
+    'EM_TRANSITO': 'EM_ROTA_DE_ENTREGA',
+    'ARMAZENADO': 'EM_ROTA_DE_ENTREGA',
+    'EM_ROTA_DE_ENTREGA': 'ENTREGUE',
+}
+CANCELAVEIS = ('SOLICITADO', 'AGUARDANDO_COLETA')
+
+
+def _sql_avancar_status():
+    # O CASE é montado a partir de `PROXIMO_STATUS` (constantes do script, nunca entrada externa).
+    proximos = " ".join(f"WHEN '{atual}' THEN '{proximo}'" for atual, proximo in PROXIMO_STATUS.items())
+    ativos = ", ".join(f"'{status}'" for status in PROXIMO_STATUS)
+    cancelaveis = ", ".join(f"'{status}'" for status in CANCELAVEIS)
+    return f"""
+        WITH candidatas AS (
+            SELECT id, status FROM operacoes_logisticas
+            WHERE id = ANY(%(ids)s) AND status IN ({ativos})
+            LIMIT %(quantidade)s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE operacoes_logisticas o
+        SET status = CAST(CASE
+                WHEN c.status IN ({cancelaveis}) AND random() < %(cancelamento)s THEN 'CANCELADO'
+                ELSE CASE c.status {proximos} END
+            END AS status_operacao),
+            data_entrega_realizada = CASE WHEN c.status = 'EM_ROTA_DE_ENTREGA' THEN NOW() ELSE o.data_entrega_realizada END
+        FROM candidatas c
+        WHERE o.id = c.id;
+    """
+
+SQL_AVANCAR_STATUS = _sql_avancar_status()
+
+
+def inserir_operacoes(cur, id_clientes, quantidade):
+    """Insere `quantidade` novas operações recém-solicitadas e retorna os ids gerados."""
+    agora = datetime.now(timezone.utc)
+    novas = []
+    for operacao in gerar_operacoes(id_clientes, quantidade, referencia=agora.replace(tzinfo=None)):
+        operacao = list(operacao)
+        operacao[COLUNAS_OPERACOES.index('codigo_operacao')] = f"SIM-{uuid.uuid4().hex[:16].upper()}"
+        operacao[COLUNAS_OPERACOES.index('status')] = 'SOLICITADO'
+        operacao[COLUNAS_OPERACOES.index('data_emissao')] = agora
+        operacao[COLUNAS_OPERACOES.index('data_previsao_entrega')] = (agora + timedelta(days=random.randint(2, 15))).date()
+        operacao[COLUNAS_OPERACOES.index('data_entrega_realizada')] = None
+        novas.append(tuple(operacao))
+    sql = f"INSERT INTO operacoes_logisticas ({', '.join(COLUNAS_OPERACOES)}) VALUES %s RETURNING id;"
+    return [linha[0] for linha in psycopg2.extras.execute_values(cur, sql, novas, page_size=len(novas), fetch=True)]
+
+
+def avancar_status(cur, quantidade, id_min, id_max):
+    """
+    Avança até `quantidade` operações sorteadas uniformemente entre `id_min` e `id_max`
+    (buscas pela chave primária, sem varrer a tabela). Retorna quantas foram atualizadas.
+    """
+    # Sorteia mais ids do que o necessário: parte deles já está em um status final.
+    ids = [random.randint(id_min, id_max) for _ in range(quantidade * 3)]
+    cur.execute(SQL_AVANCAR_STATUS, {"ids": ids, "quantidade": quantidade, "cancelamento": PROBABILIDADE_CANCELAMENTO})
+    return cur.rowcount
+
+
+def consultar_dashboard(api):
+    """Retorna `(total_operacoes, tempo_de_resposta_ms)` dos KPIs do dashboard, ou `None` em caso de falha."""
+    inicio = time.monotonic()
+    try:
+        with urllib.request.urlopen(f"{api.rstrip('/')}/api/dashboard/kpis", timeout=10) as resposta:
+            kpis = json.load(resposta)
+        return kpis.get('total_operacoes', 0), (time.monotonic() - inicio) * 1000
+    except Exception as e:
+        print(f"  (dashboard indisponível: {e})")
+        return None
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def simular(insercoes_por_segundo=INSERCOES_POR_SEGUNDO, atualizacoes_por_segundo=ATUALIZACOES_POR_SEGUNDO,
+            duracao=None, intervalo=INTERVALO_SEGUNDOS, intervalo_relatorio=INTERVALO_RELATORIO_SEGUNDOS, api=None):
+    """
+    Executa a simulação até `duracao` segundos (ou até Ctrl+C), mantendo as taxas pedidas.
+    """
+    conn = conectar()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT id FROM clientes;")
+            id_clientes = [linha[0] for linha in cur.fetchall()]
+            cur.execute("SELECT COALESCE(MIN(id), 1), COALESCE(MAX(id), 1) FROM operacoes_logisticas;")
+            id_min, id_max = cur.fetchone()
+        if not id_clientes:
+            print("❌ Nenhum cliente cadastrado. Rode o popular_tabelas.py antes.")
+            return
+
+        print(f"Simulando {insercoes_por_segundo} inserções/s e {atualizacoes_por_segundo} atualizações/s "
+              f"(Ctrl+C para encerrar)...")
+        inicio = ultimo_relatorio = time.monotonic()
+        totais = {"inseridas": 0, "atualizadas": 0}
+        janela = {"inseridas": 0, "atualizadas": 0, "latencia_insert": [], "latencia_update": []}
+        try:
+            while duracao is None or time.monotonic() - inicio < duracao:
+                ciclo = time.monotonic()
+                decorrido = ciclo - inicio
+                # Quanto deveria ter sido feito até agora: atrasos de um ciclo são compensados no seguinte.
+                inserir = int(insercoes_por_segundo * decorrido) - totais["inseridas"]
+                atualizar = int(atualizacoes_por_segundo * decorrido) - totais["atualizadas"]
+
+                if inserir > 0:
+                    t = time.monotonic()
+                    with conn, conn.cursor() as cur:
+                        ids = inserir_operacoes(cur, id_clientes, inserir)
+                    janela["latencia_insert"].append((time.monotonic() - t) * 1000)
+                    id_max = max([id_max, *ids])
+                    totais["inseridas"] += len(ids)
+                    janela["inseridas"] += len(ids)
+                if atualizar > 0:
+                    t = time.monotonic()
+                    with conn, conn.cursor() as cur:
+                        atualizadas = avancar_status(cur, atualizar, id_min, id_max)
+                    janela["latencia_update"].append((time.monotonic() - t) * 1000)
+                    # Conta o que foi pedido (e não só o que foi atualizado) para não acumular atraso
+                    # quando restam poucas operações ativas.
+                    totais["atualizadas"] += atualizar
+                    janela["atualizadas"] += atualizadas
+
+                agora = time.monotonic()
+                if agora - ultimo_relatorio >= intervalo_relatorio:
+                    _relatorio(conn, janela, agora - ultimo_relatorio, api)
+                    janela = {"inseridas": 0, "atualizadas": 0, "latencia_insert": [], "latencia_update": []}
+                    ultimo_relatorio = agora
+                time.sleep(max(0.0, intervalo - (time.monotonic() - ciclo)))
+        except KeyboardInterrupt:
+            print("\nEncerrando a simulação...")
+
+        print(f"\n✅ Simulação concluída: {totais['inseridas']} operações inseridas em "
+              f"{time.monotonic() - inicio:.0f}s.")
+    finally:
+        conn.close()
+
+
+def _relatorio(conn, janela, segundos, api):
+    print(f"[{datetime.now():%H:%M:%S}] "
+          f"{janela['inseridas'] / segundos:.1f} inserções/s, {janela['atualizadas'] / segundos:.1f} atualizações/s | "
+          f"INSERT p50 {_percentil(janela['latencia_insert'], 0.5):.1f}ms p95 {_percentil(janela['latencia_insert'], 0.95):.1f}ms | "
+          f"UPDATE p50 {_percentil(janela['latencia_update'], 0.5):.1f}ms p95 {_percentil(janela['latencia_update'], 0.95):.1f}ms",
+          flush=True)
+    if not api:
+        return
+    dashboard = consultar_dashboard(api)
+    if dashboard is None:
+        return
+    total_dashboard, tempo_ms = dashboard
+    # O total no banco vem do rollup (mantido pelos triggers), sem contar a tabela inteira.
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(SUM(total_operacoes), 0) FROM operacoes_rollup_diario;")
+        total_banco = cur.fetchone()[0]
+    print(f"  dashboard: {total_dashboard} operações (banco: {total_banco}, atraso: {total_banco - total_dashboard}) "
+          f"em {tempo_ms:.0f}ms", flush=True)
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Simula a chegada contínua de operações e a evolução dos status.")
+    parser.add_argument("-i", "--insercoes-por-segundo", type=float, default=INSERCOES_POR_SEGUNDO,
+                        help=f"Novas operações por segundo (padrão: {INSERCOES_POR_SEGUNDO}).")
+    parser.add_argument("-a", "--atualizacoes-por-segundo", type=float, default=ATUALIZACOES_POR_SEGUNDO,
+                        help=f"Mudanças de status por segundo (padrão: {ATUALIZACOES_POR_SEGUNDO}).")
+    parser.add_argument("-d", "--duracao", type=float, default=None,
+                        help="Duração em segundos (padrão: até Ctrl+C).")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_SEGUNDOS,
+                        help=f"Segundos entre cada lote de escritas (padrão: {INTERVALO_SEGUNDOS}).")
+    parser.add_argument("--relatorio", type=float, default=INTERVALO_RELATORIO_SEGUNDOS,
+                        help=f"Segundos entre relatórios (padrão: {INTERVALO_RELATORIO_SEGUNDOS}).")
+    parser.add_argument("--api", default=None,
+                        help="URL da API (ex: http://localhost:8000) para medir o atraso do dashboard.")
+    args = parser.parse_args()
+    if args.insercoes_por_segundo < 0 or args.atualizacoes_por_segundo < 0 or args.intervalo <= 0:
+        parser.error("As taxas não podem ser negativas e o intervalo deve ser maior que zero.")
+    return args
+
+
+if __name__ == '__main__':
+    args = _argumentos()
+    try:
+        simular(args.insercoes_por_segundo, args.atualizacoes_por_segundo, args.duracao,
+                args.intervalo, args.relatorio, args.api)
+    except psycopg2.OperationalError as e:
+        print(f"\n❌ ERRO DE CONEXÃO: Não foi possível conectar ao banco de dados: {e}")
@@ -108,6 +108,9 @@ function Chat() {
       setMessages((prev) => [...prev, botMessage]);
 
     } catch (error) {
+      // HTTP 409: a pergunta foi substituída por outra mais recente da mesma sessão.
+      // A resposta da pergunta mais recente chegará normalmente, então nada é exibido.
+      if (error.response?.status === 409) return;
       // Em caso de erro na comunicação com a API, loga o erro e exibe uma mensagem amigável.
       console.error("Error fetching bot response:", error);
       const errorMessage = { sender: 'bot', content: { type: 'text', content: 'Desculpe, não consegui me conectar ao servidor.' } };
@@ -12,20 +12,31 @@
 // 1. useDataFetching (Hook Customizado):
 //    - Um hook React reutilizável que encapsula toda a lógica de busca de dados da API.
 //    - Gerencia os estados de carregamento (loading), erro e os dados recebidos.
-//    - Implementa um mecanismo de "polling" que atualiza os dados automaticamente a cada
-//      15 segundos, criando um dashboard "ao vivo".
+//    - Implementa um mecanismo de "polling" que atualiza os dados automaticamente a cada
+//      15 segundos, criando um dashboard "ao vivo".
+//    - Usa GET condicional: reenvia o último `ETag` recebido em `If-None-Match`; se nada
+//      mudou, a API responde `304` sem corpo e os dados atuais são mantidos.
+//    - É o plano B: só é usado se o stream de atualizações (abaixo) não estiver disponível.
+//
+// 1.1. useDashboardStream (Hook Customizado):
+//    - Assina `/stream` (Server-Sent Events). O servidor envia todos os widgets ao conectar
+//      e, depois, apenas os que mudaram; o hook mescla cada atualização nos dados atuais.
+//    - Se o navegador não suportar `EventSource` ou a conexão falhar antes de receber dados,
+//      sinaliza `failed` e o Dashboard volta para o polling.
 //
 // 2. KpiGrid (Componente de Apresentação):
-//    - Um componente dedicado a buscar e exibir a grade de KPIs no topo da página.
+//    - Um componente dedicado a exibir a grade de KPIs no topo da página.
 //
 // 3. ChartWrapper (Componente Container/Wrapper):
-//    - Um invólucro genérico para cada gráfico. Ele utiliza o hook `useDataFetching` para
-//      buscar os dados do gráfico e lida com a exibição dos estados de carregamento,
-//      erro ou dados vazios. Isso mantém o componente principal do Dashboard limpo.
+//    - Um invólucro genérico para cada gráfico. Ele recebe os dados do gráfico e lida
+//      com a exibição dos estados de carregamento, erro ou dados vazios. Isso mantém o
+//      componente principal do Dashboard limpo.
 //
 // 4. Dashboard (Componente Principal da Página):
-//    - Monta o layout completo da página, incluindo o cabeçalho, a grade de KPIs e
-//      múltiplas instâncias do `ChartWrapper` para renderizar cada gráfico específico.
+//    - Recebe TODOS os widgets pelo stream (ou, no plano B, de uma vez no endpoint
+//      `/summary`, uma única requisição por ciclo de polling) e distribui os dados.
+//    - Monta o layout completo da página, incluindo o cabeçalho, a grade de KPIs e
+//      múltiplas instâncias do `ChartWrapper` para renderizar cada gráfico específico.
 //
 // =================================================================================================
 // =================================================================================================
@@ -42,16 +53,20 @@ import './Dashboard.css';
 // --- Hook Customizado para Busca de Dados com Polling ---
 
 // Este hook encapsula a lógica de buscar dados de um endpoint da API de forma reutilizável.
-const useDataFetching = (endpoint) => {
+// Com `enabled = false`, nenhuma requisição é feita (usado quando o stream está ativo).
+const useDataFetching = (endpoint, enabled = true) => {
   // Estados para armazenar os dados, o status de carregamento e possíveis erros.
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   // `useRef` para guardar o ID do timer do polling, permitindo limpá-lo depois.
   const timeoutIdRef = useRef(null);
+  // `useRef` para guardar o último ETag recebido (enviado de volta em `If-None-Match`).
+  const etagRef = useRef(null);
 
   // `useEffect` gerencia o ciclo de vida da busca de dados.
   useEffect(() => {
+    if (!enabled) return;
     let isMounted = true; // Flag para evitar atualizações de estado se o componente for desmontado.
     const abortController = new AbortController(); // Permite cancelar a requisição se o componente for desmontado.
 
@@ -61,9 +76,17 @@ const useDataFetching = (endpoint) => {
       if (!data) setLoading(true); 
       
       try {
-        const response = await axios.get(`http://localhost:8000/api/dashboard/${endpoint}`, { signal: abortController.signal });
+        const response = await axios.get(`http://localhost:8000/api/dashboard/${endpoint}`, {
+          signal: abortController.signal,
+          headers: etagRef.current ? { 'If-None-Match': etagRef.current } : {},
+          // `304 Not Modified` não é erro: apenas indica que os dados em tela continuam atuais.
+          validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+        });
         if (isMounted) {
-          setData(response.data); // Armazena os dados no estado.
+          if (response.status !== 304) {
+            etagRef.current = response.headers['etag'] || null;
+            setData(response.data); // Armazena os dados no estado.
+          }
           setError(null); // Limpa qualquer erro anterior.
         }
       } catch (err) {
@@ -87,17 +110,52 @@ const useDataFetching = (endpoint) => {
       abortController.abort(); // Cancela qualquer requisição em andamento.
       clearTimeout(timeoutIdRef.current); // Cancela o próximo polling agendado para evitar memory leaks.
     };
-  }, [endpoint]); // Roda o efeito novamente se o endpoint mudar.
+  }, [endpoint, enabled]); // Roda o efeito novamente se o endpoint mudar ou o polling for ativado.
 
   // O hook retorna seu estado para o componente que o utiliza.
   return { data, loading, error };
 };
 
+// --- Hook Customizado para Atualizações em Tempo Real (SSE) ---
+
+// Mantém uma conexão `EventSource` aberta e mescla os widgets alterados enviados pelo servidor.
+const useDashboardStream = (endpoint) => {
+  const [data, setData] = useState(null);
+  const [loading, setLoading] = useState(true);
+  // Sem suporte a `EventSource`, o stream já começa como "falhou" e o polling assume.
+  const [failed, setFailed] = useState(typeof EventSource === 'undefined');
+
+  useEffect(() => {
+    if (failed) return;
+    let received = false; // Indica se ao menos uma atualização chegou por esta conexão.
+    const source = new EventSource(`http://localhost:8000/api/dashboard/${endpoint}`);
+
+    source.addEventListener('widgets', (event) => {
+      received = true;
+      const changed = JSON.parse(event.data);
+      setData((current) => ({ ...(current || {}), ...changed })); // Só os widgets alterados são substituídos.
+      setLoading(false);
+    });
+
+    source.onerror = () => {
+      // Após receber dados, o `EventSource` reconecta sozinho. Se a conexão foi encerrada de vez
+      // ou nunca funcionou, desistimos do stream e voltamos para o polling.
+      if (source.readyState === EventSource.CLOSED || !received) {
+        source.close();
+        setFailed(true);
+      }
+    };
+
+    // Função de limpeza: fecha a conexão quando o componente é desmontado.
+    return () => source.close();
+  }, [endpoint, failed]);
+
+  return { data, loading, error: null, failed };
+};
+
 // --- Componente para a Grade de KPIs ---
 
-const KpiGrid = () => {
-  // Utiliza o hook customizado para buscar os dados do endpoint 'kpis'.
-  const { data: kpis, loading, error } = useDataFetching('kpis');
+const KpiGrid = ({ kpis, loading, error }) => {
   
   // Função auxiliar para formatar os valores dos KPIs, lidando com o estado de carregamento.
   const formatValue = (value, isCurrency = false) => {
@@ -121,11 +179,9 @@ const KpiGrid = () => {
 
 // --- Componente Wrapper para Gráficos ---
 
-// Este componente encapsula a lógica de busca e estado para um gráfico individual.
-const ChartWrapper = ({ title, endpoint, children }) => {
-  const { data, loading, error } = useDataFetching(endpoint);
-
-  // Renderização condicional com base no estado do hook de busca.
+// Este componente encapsula a exibição de estado para um gráfico individual.
+const ChartWrapper = ({ title, data, loading, error, children }) => {
+  // Renderização condicional com base no estado da busca.
   if (loading) return <div className="chart-section loading"><h2>{title}</h2><div className="dashboard-state">Carregando...</div></div>;
   if (error) return <div className="chart-section error"><h2>{title}</h2><div className="dashboard-state">{error}</div></div>;
   if (!Array.isArray(data) || data.length === 0) return <div className="chart-section empty"><h2>{title}</h2><div className="dashboard-state">Nenhum dado encontrado.</div></div>;
@@ -138,6 +194,13 @@ const ChartWrapper = ({ title, endpoint, children }) => {
 // --- Componente Principal do Dashboard ---
 
 function Dashboard() {
+  // Recebe os widgets pelo stream; se ele falhar, busca todos em uma única requisição ao endpoint de resumo.
+  const stream = useDashboardStream('stream');
+  const polling = useDataFetching('summary', stream.failed);
+  const { data: summary, loading, error } = stream.failed ? polling : stream;
+  // Propriedades comuns de estado repassadas a cada gráfico.
+  const fetchState = { loading, error };
+
   // Paleta de cores e funções auxiliares de formatação para os gráficos.
   const COLORS = ['#5e72e4', '#2dce89', '#ff8d4e', '#f5365c', '#11cdef'];
   const abbreviateStatus = (statusName) => ({ 'SOLICITADO': 'Solicitado', 'AGUARDANDO_COLETA': 'Aguard. Coleta', 'EM_TRANSITO': 'Em Trânsito', 'ARMAZENADO': 'Armazenado', 'EM_ROTA_DE_ENTREGA': 'Em Entrega', 'ENTREGUE': 'Entregue', 'CANCELADO': 'Cancelado' }[statusName] || statusName);
@@ -156,10 +219,10 @@ function Dashboard() {
   return (
     <div className="dashboard">
       <header className="dashboard-header"><h1>Dashboard de Logística</h1><p>Visão geral das operações.</p></header>
-      <KpiGrid />
+      <KpiGrid kpis={summary?.kpis} {...fetchState} />
       <div className="charts-grid">
         {/* Gráfico 1: Operações por Status */}
-        <ChartWrapper title="Operações por Status" endpoint="operacoes_por_status">
+        <ChartWrapper title="Operações por Status" data={summary?.operacoes_por_status} {...fetchState}>
           {(data) => (
             <ResponsiveContainer width="100%" height={400}>
               <BarChart data={data.map(item => ({ ...item, name: abbreviateStatus(item.name) }))}>
@@ -175,7 +238,7 @@ function Dashboard() {
         </ChartWrapper>
 
         {/* Gráfico 2: Top 10 Estados por Frete */}
-        <ChartWrapper title="Top 10 Estados por Valor de Frete" endpoint="valor_frete_por_uf">
+        <ChartWrapper title="Top 10 Estados por Valor de Frete" data={summary?.valor_frete_por_uf} {...fetchState}>
           {(data) => (
             <ResponsiveContainer width="100%" height={400}>
               <BarChart data={data}>
@@ -189,7 +252,7 @@ function Dashboard() {
         </ChartWrapper>
 
         {/* Gráfico 3: Operações criadas nos últimos 30 dias */}
-        <ChartWrapper title="Operações Criadas (Últimos 30 dias)" endpoint="operacoes_por_dia">
+        <ChartWrapper title="Operações Criadas (Últimos 30 dias)" data={summary?.operacoes_por_dia} {...fetchState}>
           {(data) => (
             <ResponsiveContainer width="100%" height={400}>
               <LineChart data={data}>
@@ -205,7 +268,7 @@ function Dashboard() {
         </ChartWrapper>
         
         {/* Gráfico 4: Top 5 Clientes por Valor */}
-        <ChartWrapper title="Top 5 Clientes por Valor de Mercadoria" endpoint="top_clientes_por_valor">
+        <ChartWrapper title="Top 5 Clientes por Valor de Mercadoria" data={summary?.top_clientes_por_valor} {...fetchState}>
           {(data) => (
             <ResponsiveContainer width="100%" height={400}>
               <PieChart>